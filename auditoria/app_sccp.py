@@ -20,10 +20,25 @@ app.secret_key = os.environ.get('SECRET_KEY', 'super_secret_key_gov_mode')
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ROLES_FILE = os.path.join(BASE_DIR, 'config', 'roles.json')
 LOGS_FILE = os.path.join(BASE_DIR, 'data', 'auditoria_logs.json')
+ARCHIVO_DIR = os.path.join(BASE_DIR, 'data', 'archivo')
 
 # --- DB SECURE SINGLETON ---
 from utils.db_store import get_db
+from utils.paginacion import paginar, SIGUIENTE
+from utils.archivo import Archivo, AlmacenEscalonado
 db = get_db(LOGS_FILE)
+# Store caliente + archivo histórico (python -m utils.archivo archivar ...)
+historico = AlmacenEscalonado(db, Archivo(ARCHIVO_DIR))
+
+def pagina_actual(store=None, **filtros):
+    """Página keyset según ?cursor=&dir=&size= (los filtros se empujan al store)"""
+    return paginar(
+        store or db,
+        cursor=request.args.get('cursor'),
+        direccion=request.args.get('dir', SIGUIENTE),
+        size=request.args.get('size'),
+        **filtros
+    )
 
 def load_roles():
     try:
@@ -100,9 +115,9 @@ def logout():
 @login_required
 @role_required(['GESTOR_ERRORES', 'GERENCIAL', 'EJECUTIVO', 'MESA_DEL_USUARIO']) # Fix roles later, allowing audit for MVP
 def panel_sistema():
-    all_logs = db.read()
     # Filter: Solo mostrar lo que el sistema "vio"
-    return render_template('panel_1_sistema.html', logs=all_logs)
+    pagina = pagina_actual()
+    return render_template('panel_1_sistema.html', logs=pagina.items, pagina=pagina)
 
 # PANEL 2: AUDITORÍA HUMANA (DECISIÓN)
 # EL LUGAR DE LA VERDAD. Donde se confirma o se marca FP/FN.
@@ -116,6 +131,8 @@ def panel_auditoria_decision():
         auditor = session['user']
 
         nota_auditor = request.form.get('nota', '').strip()
+        # Versión que vio el auditor: si otro la cambió, la decisión se rechaza
+        version = request.form.get('version', type=int)
 
         def update_logic(log):
             log['estado'] = 'AUDITADO_HUMANO'
@@ -129,7 +146,7 @@ def panel_auditoria_decision():
                 log['feedback_humano'] = accion
                 log['nota_auditor'] = nota_auditor
         
-        success = db.update_record(msg_id, update_logic)
+        success = db.update_record(msg_id, update_logic, accion=accion, version=version)
         if not success:
             flash("Error: El mensaje fue modificado por otro auditor.", "error")
         else:
@@ -138,9 +155,9 @@ def panel_auditoria_decision():
         return redirect(url_for('panel_auditoria_decision'))
 
     # Show only pending items
-    logs = db.read()
-    pending_logs = [l for l in logs if l.get('estado') == 'PRE_ANALIZADO']
-    return render_template('panel_2_v2.html', logs=pending_logs)
+    pagina = pagina_actual(estado='PRE_ANALIZADO')
+    total = db.count(estado='PRE_ANALIZADO')
+    return render_template('panel_2_v2.html', logs=pagina.items, pagina=pagina, total=total)
 
 # PANEL 3: ERRORES DEL SISTEMA (APRENDIZAJE)
 # Cementerio de FP/FN para ajuste de reglas.
@@ -148,9 +165,8 @@ def panel_auditoria_decision():
 @login_required
 @role_required(['GESTOR_ERRORES', 'GERENCIAL'])
 def panel_errores_sistema():
-    logs = db.read()
-    errors = [l for l in logs if l['estado'] == 'ERROR_DE_SISTEMA']
-    return render_template('panel_3_errores.html', logs=errors)
+    pagina = pagina_actual(historico, estado='ERROR_DE_SISTEMA')
+    return render_template('panel_3_errores.html', logs=pagina.items, pagina=pagina)
 
 # PANEL 4: FEEDBACK A OPERADORES
 # Lo único que ve la Mesa. Solo 'CONFIRMADO'. Nunca FP/FN.
@@ -158,25 +174,27 @@ def panel_errores_sistema():
 @login_required
 @role_required(['MESA_DEL_USUARIO', 'GESTOR_ERRORES']) # Dev admin access too
 def panel_operador_feedback():
-    logs = db.read()
     # Solo mensajes donde el humano dijo "SÍ, el sistema tiene razón"
-    public_logs = [l for l in logs if l.get('feedback_humano') == 'CONFIRMADO']
-    return render_template('panel_4_operador.html', logs=public_logs)
+    pagina = pagina_actual(historico, feedback='CONFIRMADO')
+    return render_template('panel_4_operador.html', logs=pagina.items, pagina=pagina)
 
 # PANEL 5: TABLERO GERENCIAL (KPIs)
 @app.route('/gerencia/dashboard')
 @login_required
 @role_required(['GERENCIAL', 'EJECUTIVO', 'GESTOR_ERRORES'])
 def panel_gerencial():
-    return render_template('panel_5_gerencial.html')
+    # Contadores incrementales del store: no depende del tamaño del historial
+    return render_template('panel_5_gerencial.html', kpis=historico.kpis())
 
 # PANEL 6: TRAZABILIDAD
 @app.route('/trazabilidad')
 @login_required
 @role_required(['GERENCIAL', 'EJECUTIVO', 'GESTOR_ERRORES'])
 def panel_trazabilidad():
-    logs = db.read()
-    return render_template('panel_6_trazabilidad.html', logs=logs)
+    pagina = pagina_actual(historico)
+    # Trail de decisiones (journal) solo de los registros de esta página
+    historial = historico.historial(log.get('id') for log in pagina.items)
+    return render_template('panel_6_trazabilidad.html', logs=pagina.items, pagina=pagina, historial=historial)
 
 print("=== SCCP GOVERNANCE MODE v2.0 STARTED ===")
 
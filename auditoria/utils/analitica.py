@@ -0,0 +1,151 @@
+
+import json
+import os
+
+import pandas as pd
+
+from .paginacion import FORMATOS_TS
+
+# Analítica vectorizada sobre el log de auditoría (o el dataset de release).
+# Un DataFrame tipado: columnas de baja cardinalidad como 'category',
+# timestamps como datetime64. Cada reporte es una sola pasada de pandas.
+
+COLUMNAS_CATEGORICAS = ('linea', 'operador', 'estado', 'resultado_sistema', 'feedback_humano', 'auditor')
+COLUMNAS_TEXTO = ('id', 'motivo')
+
+# Estados / resultados que cuentan como rechazo en cada fuente
+RECHAZOS = {'RECHAZADO', 'INCORRECTO'}
+
+def _parsear_fechas(serie):
+    """Prueba cada formato conocido de forma vectorizada; lo no reconocido queda NaT"""
+    serie = serie.astype('string')
+    resultado = pd.Series(pd.NaT, index=serie.index, dtype='datetime64[ns]')
+    for fmt in FORMATOS_TS:
+        faltantes = resultado.isna()
+        if not faltantes.any():
+            break
+        resultado[faltantes] = pd.to_datetime(serie[faltantes], format=fmt, errors='coerce')
+    return resultado
+
+def cargar(fuente):
+    """
+    fuente: store con read() (get_db) o path a un JSON (lista de registros).
+    Normaliza ambos formatos:
+      - log de auditoría: 'resultado_sistema' + 'detalle_sistema' (motivos separados por '|')
+      - dataset de release: 'estado' APROBADO/RECHAZADO + 'motivo'
+    """
+    if hasattr(fuente, 'read'):
+        registros = fuente.read()
+    else:
+        with open(fuente, 'r', encoding='utf-8') as f:
+            registros = json.load(f)
+
+    df = pd.DataFrame.from_records(registros)
+    if df.empty:
+        df = pd.DataFrame(columns=['id', 'timestamp'])
+
+    if 'motivo' not in df.columns:
+        df['motivo'] = df.get('detalle_sistema')
+    df['motivo'] = df['motivo'].replace('-', None)
+
+    resultado = df['resultado_sistema'] if 'resultado_sistema' in df.columns else df.get('estado')
+    df['rechazado'] = resultado.isin(RECHAZOS) if resultado is not None else False
+
+    df['timestamp'] = _parsear_fechas(df['timestamp'])
+    if 'fecha_auditoria' in df.columns:
+        df['fecha_auditoria'] = _parsear_fechas(df['fecha_auditoria'])
+    else:
+        df['fecha_auditoria'] = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+
+    for col in COLUMNAS_CATEGORICAS:
+        df[col] = (df[col] if col in df.columns else pd.Series(None, index=df.index, dtype='object')).astype('category')
+    for col in COLUMNAS_TEXTO:
+        df[col] = df[col].astype('string')
+
+    columnas = ['id', 'timestamp', 'fecha_auditoria', 'rechazado', 'motivo', *COLUMNAS_CATEGORICAS]
+    return df[columnas]
+
+# ============================================================================
+# REPORTES
+# ============================================================================
+
+def motivos_rechazo_por_linea(df):
+    """Motivos de rechazo (un mensaje puede tener varios, separados por '|') x línea"""
+    rechazos = df.loc[df['rechazado'] & df['motivo'].notna(), ['linea', 'motivo']]
+    motivos = rechazos.assign(motivo=rechazos['motivo'].str.split('|')).explode('motivo')
+    motivos['motivo'] = motivos['motivo'].str.strip()
+    motivos = motivos[motivos['motivo'] != '']
+    return (motivos.groupby(['linea', 'motivo'], observed=True).size()
+            .rename('cantidad').reset_index()
+            .sort_values(['linea', 'cantidad'], ascending=[True, False], ignore_index=True))
+
+def volumen_por_hora(df):
+    """Mensajes por hora del día (filas) y línea (columnas)"""
+    con_hora = df[df['timestamp'].notna()]
+    return pd.crosstab(con_hora['timestamp'].dt.hour.rename('hora'), con_hora['linea'])
+
+def tasa_error_por_operador(df):
+    """Mensajes, rechazos y tasa de rechazo (%) por operador"""
+    por_operador = df[df['operador'].notna()].groupby('operador', observed=True)['rechazado']
+    reporte = por_operador.agg(mensajes='size', rechazados='sum')
+    reporte['tasa_rechazo'] = (100.0 * reporte['rechazados'] / reporte['mensajes']).round(1)
+    return reporte.sort_values('tasa_rechazo', ascending=False).reset_index()
+
+def tiempo_hasta_auditoria(df):
+    """Distribución (minutos) entre la captura y la decisión humana, por línea"""
+    minutos = (df['fecha_auditoria'] - df['timestamp']).dt.total_seconds() / 60.0
+    auditados = df.assign(minutos=minutos)[minutos.notna()]
+    reporte = auditados.groupby('linea', observed=True)['minutos'].describe(percentiles=[.5, .9, .99])
+    return reporte.rename_axis('linea').reset_index()
+
+REPORTES = {
+    'motivos_rechazo_por_linea': motivos_rechazo_por_linea,
+    'volumen_por_hora': volumen_por_hora,
+    'tasa_error_por_operador': tasa_error_por_operador,
+    'tiempo_hasta_auditoria': tiempo_hasta_auditoria,
+}
+
+def generar_reportes(df):
+    return {nombre: reporte(df) for nombre, reporte in REPORTES.items()}
+
+def exportar(reportes, directorio, formato='csv'):
+    """
+    Un archivo por reporte. 'parquet' usa pyarrow (requirements.txt) o
+    fastparquet: sin ninguno de los dos se exporta CSV.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    archivos = []
+    for nombre, reporte in reportes.items():
+        # volumen_por_hora tiene la hora en el índice
+        tabla = (reporte.reset_index() if reporte.index.name else reporte).rename(columns=str)
+        if formato == 'parquet':
+            destino = os.path.join(directorio, f"{nombre}.parquet")
+            try:
+                tabla.to_parquet(destino, index=False)
+                archivos.append(destino)
+                continue
+            except ImportError:
+                print("⚠️ Parquet no disponible (instalar pyarrow): se exporta CSV.")
+                formato = 'csv'
+        destino = os.path.join(directorio, f"{nombre}.csv")
+        tabla.to_csv(destino, index=False, encoding='utf-8')
+        archivos.append(destino)
+    return archivos
+
+
+if __name__ == '__main__':
+    # Desde auditoria/: python -m utils.analitica releases/v1.0/data/dataset_170_casos.json --salida reportes
+    import argparse
+    parser = argparse.ArgumentParser(description="Reportes vectorizados del log de auditoría")
+    parser.add_argument('fuente', nargs='?', default=os.path.join('data', 'auditoria_logs.json'),
+                        help="JSON del log o del dataset de release")
+    parser.add_argument('--salida', default='reportes', help="Directorio de salida")
+    parser.add_argument('--formato', choices=('csv', 'parquet'), default='csv')
+    args = parser.parse_args()
+
+    reportes = generar_reportes(cargar(args.fuente))
+    for nombre, reporte in reportes.items():
+        print(f"\n=== {nombre} ===")
+        print(reporte.to_string())
+    for archivo in exportar(reportes, args.salida, args.formato):
+        print(f"💾 {archivo}")
@@ -0,0 +1,375 @@
+
+import bisect
+import datetime
+import gzip
+import heapq
+import itertools
+import json
+import os
+
+from .kpis import KPIs
+from .paginacion import clave_orden, ts_orden
+
+# Archivo histórico (tier frío) del log de auditoría.
+# Los registros cerrados salen del store "caliente" a particiones por día:
+#   archivo/dia=YYYY-MM-DD/part-<timestamp>_<pid>.parquet
+# Las columnas de baja cardinalidad se guardan como categóricas (dictionary
+# encoding en Parquet). Sin pyarrow/fastparquet se usa JSONL comprimido
+# con la misma estructura de particiones.
+
+ESTADOS_CERRADOS = ('AUDITADO_HUMANO', 'ERROR_DE_SISTEMA')
+
+# DATA_DICTIONARY.md (linea / estado / motivo / auditor) + campos del log de auditoría
+COLUMNAS_DICCIONARIO = ('linea', 'estado', 'motivo', 'auditor', 'operador',
+                        'feedback_humano', 'resultado_sistema', 'regla_sistema')
+
+MANIFIESTO = 'manifiesto.json'
+
+# Columna interna de las partes Parquet: claves que faltaban en cada registro
+# (el DataFrame rellena con nulos las columnas que un registro no tenía)
+COLUMNA_AUSENTES = '_ausentes'
+
+def parquet_disponible():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        pass
+    try:
+        import fastparquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def cerrado_antes_de(dias, ahora=None):
+    """Predicado: estado cerrado y decisión (o captura) hace más de 'dias' días"""
+    limite = ((ahora or datetime.datetime.now()) - datetime.timedelta(days=dias)).strftime('%Y-%m-%d %H:%M:%S')
+
+    def predicado(item):
+        if item.get('estado') not in ESTADOS_CERRADOS:
+            return False
+        referencia = ts_orden(item.get('fecha_auditoria')) or ts_orden(item.get('timestamp'))
+        return bool(referencia) and referencia < limite
+    return predicado
+
+class Archivo:
+    """
+    Tier histórico: particiones inmutables por día + manifiesto (particiones, KPIs
+    y lotes pendientes de confirmar, que los lectores ignoran).
+    Misma interfaz de lectura que los stores (query / count / read / contadores).
+    """
+    def __init__(self, directorio, formato=None):
+        self.directorio = os.path.abspath(directorio)
+        self.formato = formato or ('parquet' if parquet_disponible() else 'jsonl.gz')
+        self._manifiesto = (None, {'particiones': {}, 'kpis': []})
+        self._cache = {}
+
+    # --- Manifiesto -----------------------------------------------------
+
+    def _path_manifiesto(self):
+        return os.path.join(self.directorio, MANIFIESTO)
+
+    def manifiesto(self):
+        try:
+            st = os.stat(self._path_manifiesto())
+        except FileNotFoundError:
+            return {'particiones': {}, 'kpis': []}
+        firma = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if firma != self._manifiesto[0]:
+            with open(self._path_manifiesto(), 'r', encoding='utf-8') as f:
+                self._manifiesto = (firma, json.load(f))
+        return self._manifiesto[1]
+
+    def _guardar_manifiesto(self, manifiesto):
+        tmp = f"{self._path_manifiesto()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path_manifiesto())
+
+    # --- Escritura ------------------------------------------------------
+
+    def escribir(self, registros):
+        """
+        Escribe registros como un lote pendiente (una parte nueva por día) y retorna
+        su id. Las partes de un lote pendiente no son visibles para los lectores hasta
+        confirmar(): se escriben dentro de extraer(), antes de que el store borre, y
+        si el borrado no se completa el lote se descarta en lugar de duplicar tiers.
+        Un solo writer a la vez (se llama bajo el lock del store en extraer()).
+        """
+        por_dia = {}
+        for item in registros:
+            por_dia.setdefault(ts_orden(item.get('timestamp'))[:10], []).append(item)
+
+        sello = f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{os.getpid()}"
+        particiones = {}
+        for dia, items in por_dia.items():
+            relativo = os.path.join(f"dia={dia or 'sin_fecha'}", f"part-{sello}.{self.formato}")
+            self._escribir_parte(os.path.join(self.directorio, relativo), items)
+            particiones[dia] = [relativo]
+
+        manifiesto = self.manifiesto()
+        kpis = KPIs.desde_registros(registros)
+        self._guardar_manifiesto({
+            **manifiesto,
+            'formato': self.formato,
+            'pendientes': {**manifiesto.get('pendientes', {}), sello: {
+                'particiones': particiones,
+                'ids': [str(item.get('id', '')) for item in registros],
+                'kpis': [[dim, valor, n] for (dim, valor), n in kpis.conteos.items()]
+            }}
+        })
+        return sello
+
+    def pendientes(self):
+        """{lote: {'particiones', 'ids', 'kpis'}} escritos y todavía no confirmados"""
+        return dict(self.manifiesto().get('pendientes', {}))
+
+    def confirmar(self, lote):
+        """Publica un lote pendiente: sus partes y KPIs pasan a ser visibles"""
+        manifiesto = self.manifiesto()
+        pendientes = dict(manifiesto.get('pendientes', {}))
+        datos = pendientes.pop(lote)
+        particiones = {dia: list(partes) for dia, partes in manifiesto['particiones'].items()}
+        for dia, partes in datos['particiones'].items():
+            particiones.setdefault(dia, []).extend(partes)
+        kpis = KPIs({(dim, valor): n for dim, valor, n in manifiesto['kpis']})
+        kpis.conteos.update({(dim, valor): n for dim, valor, n in datos['kpis']})
+        self._guardar_manifiesto({
+            **manifiesto,
+            'particiones': particiones,
+            'pendientes': pendientes,
+            'kpis': [[dim, valor, n] for (dim, valor), n in kpis.conteos.items()]
+        })
+        print(f"📦 {len(datos['ids'])} registros archivados en {len(datos['particiones'])} particiones ({self.formato})")
+
+    def descartar(self, lote):
+        """Borra las partes de un lote pendiente (sus registros siguen en el store)"""
+        manifiesto = self.manifiesto()
+        pendientes = dict(manifiesto.get('pendientes', {}))
+        datos = pendientes.pop(lote)
+        self._guardar_manifiesto({**manifiesto, 'pendientes': pendientes})
+        for partes in datos['particiones'].values():
+            for parte in partes:
+                try:
+                    os.remove(os.path.join(self.directorio, parte))
+                except FileNotFoundError:
+                    pass
+        print(f"🗑️ Lote {lote} descartado ({len(datos['ids'])} registros siguen en el store)")
+
+    def _escribir_parte(self, path, items):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        if path.endswith('.parquet'):
+            import pandas as pd
+            df = pd.DataFrame.from_records(items)
+            columnas = list(df.columns)
+            for col in columnas:
+                # Enteros con huecos (ej: 'version') como Int64: sin esto vuelven como float
+                valores = [item.get(col) for item in items]
+                presentes = [v for v in valores if v is not None]
+                if presentes and all(type(v) is int for v in presentes):
+                    df[col] = pd.array(valores, dtype='Int64')
+            df[COLUMNA_AUSENTES] = ['|'.join(col for col in columnas if col not in item) for item in items]
+            for col in COLUMNAS_DICCIONARIO + (COLUMNA_AUSENTES,):
+                if col in df.columns:
+                    df[col] = df[col].astype('category')
+            df.to_parquet(tmp, index=False)
+        else:
+            with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+                for item in items:
+                    f.write(json.dumps(item, ensure_ascii=False) + '\n')
+        os.replace(tmp, path)
+
+    # --- Lectura --------------------------------------------------------
+
+    def _leer_parte(self, path):
+        if path.endswith('.parquet'):
+            import pandas as pd
+            df = pd.read_parquet(path)
+            ausentes = df.pop(COLUMNA_AUSENTES) if COLUMNA_AUSENTES in df.columns else ()
+            df = df.astype(object).where(df.notna(), None)
+            registros = df.to_dict('records')
+            # Las claves que el registro no tenía vuelven como None: se quitan
+            for item, faltan in zip(registros, ausentes):
+                if faltan:
+                    for col in faltan.split('|'):
+                        del item[col]
+            return registros
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return [json.loads(linea) for linea in f if linea.strip()]
+
+    def _dia(self, dia):
+        """(claves, items) ascendentes de un día (las partes son inmutables: se cachean)"""
+        partes = tuple(self.manifiesto()['particiones'].get(dia, ()))
+        cacheado = self._cache.get(dia)
+        if cacheado is None or cacheado[0] != partes:
+            items = [item for parte in partes for item in self._leer_parte(os.path.join(self.directorio, parte))]
+            pares = sorted(((clave_orden(item), item) for item in items), key=lambda par: par[0])
+            cacheado = (partes, [c for c, _ in pares], [i for _, i in pares])
+            self._cache[dia] = cacheado
+        return cacheado[1], cacheado[2]
+
+    def read(self):
+        """Copia de cada registro (los de _dia() están cacheados y se comparten)"""
+        return [dict(item) for dia in sorted(self.manifiesto()['particiones']) for item in self._dia(dia)[1]]
+
+    def query(self, estado=None, feedback=None, linea=None, limit=None, offset=0, after=None, before=None):
+        """
+        Misma semántica que DatabaseManager.query: orden (timestamp DESC, id DESC).
+        Solo se leen las particiones del rango del cursor. Con 'before' el offset
+        se cuenta desde el cursor (igual que SQLite).
+        """
+        def _coincide(item):
+            return ((estado is None or item.get('estado') == estado)
+                    and (feedback is None or item.get('feedback_humano') == feedback)
+                    and (linea is None or item.get('linea') == linea))
+
+        dias = sorted(self.manifiesto()['particiones'])
+        fin = offset + limit if limit is not None else None
+        if before is not None:
+            # Los más cercanos al cursor: recorrido ascendente desde el día del cursor
+            cercanos = []
+            for dia in dias[bisect.bisect_left(dias, before[0][:10]):]:
+                claves, items = self._dia(dia)
+                for i in range(bisect.bisect_right(claves, tuple(before)), len(items)):
+                    if _coincide(items[i]):
+                        cercanos.append(items[i])
+                if fin is not None and len(cercanos) >= fin:
+                    break
+            cercanos = cercanos[offset:fin]
+            cercanos.reverse()
+            return cercanos
+
+        if after is not None:
+            dias = dias[:bisect.bisect_right(dias, after[0][:10])]
+
+        def _candidatos():
+            for dia in reversed(dias):
+                claves, items = self._dia(dia)
+                hi = bisect.bisect_left(claves, tuple(after)) if after is not None else len(items)
+                for i in range(hi - 1, -1, -1):
+                    if _coincide(items[i]):
+                        yield items[i]
+
+        return list(itertools.islice(_candidatos(), offset, fin))
+
+    def contadores(self):
+        return KPIs({(dim, valor): n for dim, valor, n in self.manifiesto()['kpis']})
+
+    def count(self, estado=None, feedback=None, linea=None):
+        if linea is None and (estado is None or feedback is None):
+            conteos = self.contadores().conteos
+            if estado is not None:
+                return conteos[('estado', estado)]
+            if feedback is not None:
+                return conteos[('feedback_humano', feedback)]
+            return conteos[('total', 'registros')]
+        return len(self.query(estado=estado, feedback=feedback, linea=linea))
+
+class AlmacenEscalonado:
+    """
+    Store caliente + Archivo histórico detrás de la interfaz de los stores.
+    Las lecturas combinan ambos tiers; las escrituras van solo al store caliente
+    (lo archivado está cerrado).
+    """
+    def __init__(self, store, archivo):
+        self.store = store
+        self.archivo = archivo
+
+    def read(self):
+        return self.store.read() + self.archivo.read()
+
+    def query(self, estado=None, feedback=None, linea=None, limit=None, offset=0, after=None, before=None):
+        filtros = dict(estado=estado, feedback=feedback, linea=linea)
+        fin = offset + limit if limit is not None else None
+        if before is not None:
+            # Ascendente desde el cursor: el offset salta los más cercanos (como SQLite)
+            cercanos = sorted(
+                self.store.query(before=before, limit=fin, **filtros) + self.archivo.query(before=before, limit=fin, **filtros),
+                key=clave_orden
+            )[offset:fin]
+            cercanos.reverse()
+            return cercanos
+        # Cada tier ya viene ordenado DESC: merge de las dos listas
+        calientes = self.store.query(after=after, limit=fin, **filtros)
+        historicos = self.archivo.query(after=after, limit=fin, **filtros)
+        return list(itertools.islice(heapq.merge(calientes, historicos, key=clave_orden, reverse=True), offset, fin))
+
+    def count(self, estado=None, feedback=None, linea=None):
+        return self.store.count(estado, feedback, linea) + self.archivo.count(estado, feedback, linea)
+
+    def contadores(self):
+        return KPIs(self.store.contadores().conteos + self.archivo.contadores().conteos)
+
+    def kpis(self):
+        return self.contadores().resumen()
+
+    def historial(self, ids=None):
+        # El trail de decisiones no se archiva: vive con el store caliente
+        return self.store.historial(ids)
+
+    def update_record(self, record_id, update_func, accion=None, version=None):
+        return self.store.update_record(record_id, update_func, accion=accion, version=version)
+
+    def archivar(self, dias):
+        """
+        Mueve al archivo los registros cerrados hace más de 'dias' días.
+        El lote se confirma recién cuando el store ya los borró: si algo falla
+        en el medio, ningún registro queda visible en los dos tiers.
+        """
+        self.recuperar()
+        lotes = []
+        try:
+            extraidos = self.store.extraer(cerrado_antes_de(dias),
+                                           lambda registros: lotes.append(self.archivo.escribir(registros)))
+        except Exception:
+            for lote in lotes:
+                self.archivo.descartar(lote)
+            raise
+        for lote in lotes:
+            self.archivo.confirmar(lote)
+        return extraidos
+
+    def recuperar(self):
+        """
+        Lotes pendientes de un archivado interrumpido: si el store ya no tiene sus
+        registros el borrado se completó y se confirman; si no, se descartan.
+        """
+        pendientes = self.archivo.pendientes()
+        if not pendientes:
+            return
+        calientes = {str(item.get('id', '')) for item in self.store.read()}
+        for lote, datos in pendientes.items():
+            if calientes.isdisjoint(datos['ids']):
+                self.archivo.confirmar(lote)
+            else:
+                self.archivo.descartar(lote)
+
+
+if __name__ == '__main__':
+    # Desde auditoria/:
+    #   python -m utils.archivo archivar data/auditoria_logs.json --dias 30
+    #   python -m utils.archivo convertir releases/v1.0/data/dataset_170_casos.json data/archivo_v1.0
+    import argparse
+    from .db_store import get_db
+
+    parser = argparse.ArgumentParser(description="Archivo histórico del log de auditoría")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    p_archivar = sub.add_parser('archivar', help="Mover registros cerrados del store al archivo")
+    p_archivar.add_argument('log', help="JSON del log (el backend sale de SCCP_DB_BACKEND)")
+    p_archivar.add_argument('--dias', type=int, default=30)
+    p_archivar.add_argument('--destino', help="Directorio del archivo (default: data/archivo junto al log)")
+    p_convertir = sub.add_parser('convertir', help="Convertir un dataset JSON completo a particiones")
+    p_convertir.add_argument('dataset')
+    p_convertir.add_argument('destino')
+    args = parser.parse_args()
+
+    if args.comando == 'archivar':
+        destino = args.destino or os.path.join(os.path.dirname(os.path.abspath(args.log)), 'archivo')
+        AlmacenEscalonado(get_db(args.log), Archivo(destino)).archivar(args.dias)
+    else:
+        with open(args.dataset, 'r', encoding='utf-8') as f:
+            archivo = Archivo(args.destino)
+            archivo.confirmar(archivo.escribir(json.load(f)))
@@ -0,0 +1,173 @@
+
+import atexit
+import datetime
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+
+MODOS = ('completo', 'gzip', 'incremental')
+
+class BackupManager:
+    """
+    Backups fuera del camino crítico de update_record.
+
+    - El writer solo encola (O(1)); un thread de fondo hace la copia.
+    - Ráfagas de decisiones se agrupan: como máximo un backup cada 'intervalo' segundos.
+    - Anillo de 'max_backups' snapshots: los más viejos se borran.
+    - modo 'completo': copia del JSON; 'gzip': copia comprimida;
+      'incremental': change-log append-only (una línea JSON por registro modificado)
+      sobre un snapshot base gzip que se renueva cada 'base_cada' cambios.
+    - journal_path: journal de decisiones aún no compactadas; se copia junto a cada snapshot.
+    """
+    def __init__(self, db_path, backup_dir=None, max_backups=5, modo='completo', intervalo=2.0, base_cada=200,
+                 journal_path=None):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de backup inválido: {modo} (opciones: {', '.join(MODOS)})")
+        self.db_path = os.path.abspath(db_path)
+        self.journal_path = os.path.abspath(journal_path) if journal_path else None
+        self.backup_dir = backup_dir or os.path.join(os.path.dirname(self.db_path), 'backups')
+        self.prefijo = os.path.splitext(os.path.basename(self.db_path))[0]
+        self.max_backups = max(1, max_backups)
+        self.modo = modo
+        self.intervalo = intervalo
+        self.base_cada = max(1, base_cada)
+
+        self._pendientes = []
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._base = None
+        self._changelog = None
+        self._cambios_en_base = 0
+        self._thread = None
+
+    # --- API del writer -------------------------------------------------
+
+    def registrar(self, record_id, item):
+        """Llamado por update_record tras el commit. No hace I/O."""
+        cambio = {
+            'ts': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f'),
+            'id': str(record_id),
+            'registro': item if self.modo == 'incremental' else None
+        }
+        with self._cond:
+            self._pendientes.append(cambio)
+            self._cond.notify()
+        self._iniciar_thread()
+
+    def flush(self):
+        """Procesa lo pendiente de forma sincrónica (shutdown / tests)"""
+        with self._cond:
+            cambios, self._pendientes = self._pendientes, []
+        if cambios:
+            self._procesar(cambios)
+
+    # --- Thread de fondo ------------------------------------------------
+
+    def _iniciar_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name='sccp-backups', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pendientes:
+                    self._cond.wait()
+            # Agrupar ráfagas: esperar antes de tomar lo pendiente
+            time.sleep(self.intervalo)
+            with self._cond:
+                cambios, self._pendientes = self._pendientes, []
+            try:
+                self._procesar(cambios)
+            except Exception as e:
+                print(f"❌ BACKUP FAILED: {e}")
+
+    def _procesar(self, cambios):
+        with self._io_lock:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            if self.modo == 'incremental':
+                self._procesar_incremental(cambios)
+            else:
+                self._snapshot(comprimir=self.modo == 'gzip')
+            self._rotar()
+
+    # --- Snapshots ------------------------------------------------------
+
+    def _nombre(self, extension):
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return os.path.join(self.backup_dir, f"{self.prefijo}_{timestamp}_{os.getpid()}{extension}")
+
+    def _snapshot(self, comprimir):
+        """Copia del último commit (el archivo abierto no cambia aunque un writer haga os.replace)"""
+        if not os.path.exists(self.db_path): return None
+        destino = self._nombre('.json.gz' if comprimir else '.json')
+        tmp = f"{destino}.tmp"
+        # El journal se abre antes que el JSON: si se compacta en el medio, el JSON
+        # copiado ya incluye esas decisiones (reaplicarlas es idempotente)
+        journal = None
+        if self.journal_path and os.path.exists(self.journal_path):
+            journal = open(self.journal_path, 'rb')
+        try:
+            with open(self.db_path, 'rb') as origen:
+                if comprimir:
+                    with gzip.open(tmp, 'wb') as f:
+                        shutil.copyfileobj(origen, f)
+                else:
+                    with open(tmp, 'wb') as f:
+                        shutil.copyfileobj(origen, f)
+            if journal is not None:
+                with open(self._base_de(destino) + '.journal.jsonl', 'wb') as f:
+                    shutil.copyfileobj(journal, f)
+        finally:
+            if journal is not None:
+                journal.close()
+        os.replace(tmp, destino)
+        return destino
+
+    @staticmethod
+    def _base_de(snapshot):
+        return snapshot[:-len('.json.gz')] if snapshot.endswith('.gz') else snapshot[:-len('.json')]
+
+    def _procesar_incremental(self, cambios):
+        base_vigente = self._base is not None and os.path.exists(self._base)
+        if not base_vigente or self._cambios_en_base >= self.base_cada:
+            # El snapshot base ya incluye estos cambios (se toma después del commit)
+            base = self._snapshot(comprimir=True)
+            if base is None: return
+            self._base = base
+            self._changelog = self._base_de(base) + '.changes.jsonl'
+            self._cambios_en_base = 0
+            open(self._changelog, 'a', encoding='utf-8').close()
+            return
+        with open(self._changelog, 'a', encoding='utf-8') as f:
+            for cambio in cambios:
+                f.write(json.dumps(cambio, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._cambios_en_base += len(cambios)
+
+    def listar(self):
+        """Snapshots existentes, del más viejo al más nuevo"""
+        patrones = (f"{self.prefijo}_*.json", f"{self.prefijo}_*.json.gz")
+        archivos = [p for patron in patrones for p in glob.glob(os.path.join(self.backup_dir, patron))]
+        return sorted(archivos, key=os.path.basename)
+
+    def _rotar(self):
+        """Anillo de N snapshots (con su change-log y journal, si existen)"""
+        snapshots = self.listar()
+        for viejo in snapshots[:-self.max_backups]:
+            base = self._base_de(viejo)
+            for path in (viejo, base + '.changes.jsonl', base + '.journal.jsonl'):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass # Otro worker ya lo rotó
@@ -1,100 +1,440 @@
 
 import json
 import os
-import shutil
 import time
+import bisect
+import copy
 import datetime
+import itertools
 from filelock import FileLock
 
+from .backups import BackupManager
+from .journal import Journal, leer_trail
+from .kpis import KPIs
+from .paginacion import clave_orden
+
+# Decisiones en el journal antes de compactarlas en el snapshot JSON
+COMPACTAR_CADA = 500
+
+# Reintentos de update_record sin versión esperada cuando otro writer gana la carrera
+CAS_REINTENTOS = 3
+
+def version_de(item):
+    """Versión del registro (los registros previos a las versiones cuentan como 0)"""
+    try:
+        return int(item.get('version') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+# Reintentos de os.replace ante PermissionError (Windows con lectores abiertos)
+REPLACE_REINTENTOS = 5
+
+class _Snapshot:
+    """
+    Versión parseada del log + journal aplicado + índices secundarios (se construyen al primer uso).
+    firma: (firma del JSON, inode del journal); offset: bytes del journal ya aplicados.
+    """
+    def __init__(self, firma, data, offset=0, n_journal=0):
+        self.firma = firma
+        self.data = data
+        self.offset = offset
+        self.n_journal = n_journal
+        self._posiciones = None
+        self._orden = None
+        self._indices = {}
+        self._kpis = None
+
+    def posiciones(self):
+        """ID -> posición en data (el primero, como el recorrido original)"""
+        if self._posiciones is None:
+            self._posiciones = {}
+            for i, item in enumerate(self.data):
+                self._posiciones.setdefault(str(item.get('id', '')), i)
+        return self._posiciones
+
+    def buscar(self, record_id):
+        i = self.posiciones().get(str(record_id))
+        return None if i is None else self.data[i]
+
+    def kpis(self):
+        """KPIs del snapshot (scan completo solo si no vienen persistidos ni derivados)"""
+        if self._kpis is None:
+            self._kpis = KPIs.desde_registros(self.data)
+        return self._kpis
+
+    def aplicar(self, entradas, firma, offset):
+        """
+        Nuevo snapshot con las entradas del journal aplicadas (copia solo los registros tocados).
+        Si los KPIs ya estaban calculados, se actualizan por delta en vez de recalcularse.
+        """
+        data = list(self.data)
+        posiciones = self.posiciones()
+        kpis = self._kpis.copia() if self._kpis is not None else None
+        for entrada in entradas:
+            i = posiciones.get(str(entrada.get('id')))
+            if i is None:
+                continue
+            item = dict(data[i])
+            item.update(entrada.get('cambios', {}))
+            if kpis is not None:
+                kpis.aplicar(data[i], item)
+            data[i] = item
+        snap = _Snapshot(firma, data, offset, self.n_journal + len(entradas))
+        snap._posiciones = posiciones
+        snap._kpis = kpis
+        return snap
+
+    def orden(self):
+        """(claves, items) en orden ascendente de (ts_orden, id)"""
+        if self._orden is None:
+            pares = sorted(((clave_orden(item), item) for item in self.data), key=lambda par: par[0])
+            self._orden = ([c for c, _ in pares], [i for _, i in pares])
+        return self._orden
+
+    def indice(self, campo, valor):
+        """(claves, items) ascendentes de los registros con item[campo] == valor"""
+        if campo not in self._indices:
+            grupos = {}
+            for clave, item in zip(*self.orden()):
+                claves, items = grupos.setdefault(item.get(campo), ([], []))
+                claves.append(clave)
+                items.append(item)
+            self._indices[campo] = grupos
+        return self._indices[campo].get(valor, ([], []))
+
 class DatabaseManager:
-    def __init__(self, db_path):
+    def __init__(self, db_path, backups=None, compactar_cada=COMPACTAR_CADA):
         self.db_path = os.path.abspath(db_path)
         self.lock_path = f"{self.db_path}.lock"
-        self.lock = FileLock(self.lock_path, timeout=10) # 10s wait before crash
+        self.lock = FileLock(self.lock_path, timeout=10) # 10s wait before crash (solo writers)
+        # Journal de decisiones + trail (journal ya compactado) junto al JSON
+        base = os.path.splitext(self.db_path)[0]
+        self.journal = Journal(f"{base}.journal.jsonl")
+        self.trail_path = f"{base}.trail.jsonl"
+        self.kpis_path = f"{base}.kpis.json"
+        self.compactar_cada = max(1, compactar_cada)
+        # Backups asíncronos con rotación (ver utils/backups.py)
+        self.backups = backups if backups is not None else BackupManager(self.db_path, journal_path=self.journal.path)
+        self._snap = None
+        self._trail = (None, {})
+        self.cache_hits = 0
+        self.cache_misses = 0
         self._ensure_db_exists()
 
     def _ensure_db_exists(self):
         if not os.path.exists(self.db_path):
             with open(self.db_path, 'w', encoding='utf-8') as f:
                 json.dump([], f)
+        if not os.path.exists(self.journal.path):
+            # Crear el journal vacío evita una recarga completa en la primera decisión
+            open(self.journal.path, 'ab').close()
 
-    def _create_backup(self):
-        """Rotación simple de backups (ultimo 5 cambios)"""
-        if not os.path.exists(self.db_path): return
-        
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_dir = os.path.join(os.path.dirname(self.db_path), 'backups')
-        os.makedirs(backup_dir, exist_ok=True)
-        
-        backup_file = os.path.join(backup_dir, f"auditoria_logs_{timestamp}.json")
-        shutil.copy2(self.db_path, backup_file)
-        
-        # Rotación (limpieza) opcional future work
-        # print(f"Backup creado: {backup_file}")
+    @staticmethod
+    def _firma(st):
+        # os.replace cambia el inode: detecta commits aunque mtime/size coincidan
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _snapshot(self):
+        """
+        Snapshot en memoria del último commit (JSON + journal), validado con dos stat por request.
+        - JSON y journal sin cambios: cache hit.
+        - Solo creció el journal: se aplican las líneas nuevas (sin re-parsear el JSON).
+        - Compactación u otro cambio del JSON: recarga completa.
+        """
+        try:
+            firma_json = self._firma(os.stat(self.db_path))
+        except FileNotFoundError:
+            return _Snapshot(None, [])
+        inodo, tam = self.journal.stat()
+
+        snap = self._snap
+        if snap is not None and snap.firma == (firma_json, inodo):
+            if tam == snap.offset:
+                self.cache_hits += 1
+                return snap
+            f = self.journal.abrir()
+            if f is not None:
+                with f:
+                    entradas, offset = Journal.leer(f, snap.offset)
+                if offset != snap.offset:
+                    snap = snap.aplicar(entradas, snap.firma, offset)
+                    self._snap = snap
+            self.cache_hits += 1
+            return snap
+
+        self.cache_misses += 1
+        # El journal se abre ANTES que el JSON: si una compactación ocurre en el medio,
+        # el JSON nuevo ya contiene esas decisiones y reaplicarlas no cambia nada.
+        f_journal = self.journal.abrir()
+        try:
+            with open(self.db_path, 'r', encoding='utf-8') as f:
+                # fstat del archivo efectivamente leído (pudo ser reemplazado tras el stat)
+                firma_json = self._firma(os.fstat(f.fileno()))
+                data = json.load(f)
+            entradas, offset = Journal.leer(f_journal)
+            inodo = os.fstat(f_journal.fileno()).st_ino if f_journal else None
+        except FileNotFoundError:
+            return _Snapshot(None, [])
+        except json.JSONDecodeError:
+            print("❌ ERROR: DB corrupta durante lectura.")
+            data, entradas, offset = [], [], 0
+        finally:
+            if f_journal is not None:
+                f_journal.close()
+        firma = (firma_json, inodo)
+        base = _Snapshot(firma, data, offset)
+        # KPIs persistidos en la última compactación (evitan el scan si el JSON no cambió)
+        base._kpis = KPIs.cargar(self.kpis_path, firma_json)
+        snap = base.aplicar(entradas, firma, offset) if entradas else base
+        self._snap = snap
+        return snap
 
     def read(self):
-        """Lectura con lock compartido (en este caso usamos lock exclusivo por simplicidad P0)"""
-        with self.lock:
-            if not os.path.exists(self.db_path): return []
-            try:
-                with open(self.db_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                print("❌ ERROR: DB corrupta durante lectura.")
-                return []
+        """
+        Lectura sin lock: snapshot del último commit (JSON + decisiones del journal).
+        Los writers escriben a .tmp y hacen os.replace atómico, así que un lector
+        siempre abre una versión completa (la anterior o la nueva) y nunca espera
+        al writer ni a otros lectores.
+        Devuelve una lista nueva con una copia de cada registro (como el backend SQLite):
+        el snapshot es compartido con los demás lectores y no se toca.
+        """
+        return [dict(item) for item in self._snapshot().data]
+
+    def query(self, estado=None, feedback=None, linea=None, limit=None, offset=0, after=None, before=None):
+        """
+        Registros filtrados (None = sin filtro), ordenados por (timestamp DESC, id DESC).
+        feedback filtra por 'feedback_humano'.
+        after/before: clave keyset (ts_orden, id); devuelve los registros que siguen
+        (o los inmediatamente anteriores) a esa clave. limit/offset recortan el resultado;
+        con 'before' el offset se cuenta desde el cursor (igual que SQLite).
+        Usa los índices secundarios del snapshot (por estado / feedback_humano).
+        """
+        snap = self._snapshot()
+        if estado is not None:
+            claves, items = snap.indice('estado', estado)
+        elif feedback is not None:
+            claves, items = snap.indice('feedback_humano', feedback)
+        else:
+            claves, items = snap.orden()
+
+        lo, hi = 0, len(claves)
+        if after is not None:
+            hi = bisect.bisect_left(claves, tuple(after), lo, hi)
+        if before is not None:
+            lo = bisect.bisect_right(claves, tuple(before), lo, hi)
+
+        def _coincide(item):
+            return ((estado is None or item.get('estado') == estado)
+                    and (feedback is None or item.get('feedback_humano') == feedback)
+                    and (linea is None or item.get('linea') == linea))
+
+        fin = offset + limit if limit is not None else None
+        if before is not None:
+            # Con 'before' interesan los más cercanos al cursor: recorrido ascendente
+            # desde el cursor y se invierte al final
+            cercanos = (items[i] for i in range(lo, hi) if _coincide(items[i]))
+            resultado = list(itertools.islice(cercanos, offset, fin))
+            resultado.reverse()
+            return resultado
+        # Recorrido descendente (los índices están en orden ascendente)
+        candidatos = (items[i] for i in range(hi - 1, lo - 1, -1) if _coincide(items[i]))
+        return list(itertools.islice(candidatos, offset, fin))
+
+    def count(self, estado=None, feedback=None, linea=None):
+        snap = self._snapshot()
+        if linea is None and (estado is None or feedback is None):
+            if estado is not None:
+                return len(snap.indice('estado', estado)[0])
+            if feedback is not None:
+                return len(snap.indice('feedback_humano', feedback)[0])
+            return len(snap.data)
+        return len(self.query(estado=estado, feedback=feedback, linea=linea))
 
     def atomic_write(self, data):
         """Escritura atómica real: write tmp -> fsync -> rename"""
         # IMPORTANTE: El lock debe obtenerse ANTES de leer y mantenerse hasta DESPUES de escribir
         # Si esta funcion se usa sola, asume que 'data' ya tiene lo que queres.
         # Pero para Read-Modify-Write, el caller debe manejar el lock context.
-        pass # Helper interno
+        tmp_path = f"{self.db_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno()) # Force write to disk
+
+        # En Windows os.replace falla si un lector tiene el archivo abierto justo en ese
+        # instante (no hay lock de lectura que lo evite): reintentar unos milisegundos.
+        for intento in range(REPLACE_REINTENTOS):
+            try:
+                os.replace(tmp_path, self.db_path)
+                return
+            except PermissionError:
+                if intento == REPLACE_REINTENTOS - 1:
+                    raise
+                time.sleep(0.01 * (intento + 1))
 
-    def update_record(self, record_id, update_func):
+    def update_record(self, record_id, update_func, accion=None, version=None):
         """
-        Transacción Atómica: Read -> Modify -> Write
+        Compare-and-swap optimista: Read (sin lock) -> Modify -> [lock] Check versión + Append
         record_id: ID del item a buscar
         update_func: función lambda que recibe el item y lo modifica (in-place)
+        accion: nombre de la decisión para el trail (CONFIRMAR, FALSO_POSITIVO, ...)
+        version: versión que vio el cliente (formulario). Si el registro cambió desde
+                 entonces, se rechaza. Sin version, se reintenta contra la versión vigente.
+        Cada decisión aceptada incrementa 'version'. El lock solo cubre el chequeo y el
+        append de una línea: decisiones sobre mensajes distintos casi no compiten.
         """
         start = time.time()
         try:
-            with self.lock:
-                # 1. Backup Pre-Write
-                self._create_backup()
-
-                # 2. Read
-                with open(self.db_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # 3. Modify
-                modified = False
-                for item in data:
-                    if str(item.get('id', '')) == str(record_id):
-                        update_func(item)
-                        modified = True
-                        break
-                
-                if not modified:
+            for _ in range(CAS_REINTENTOS):
+                # 1. Read: snapshot vigente (JSON + journal), sin lock
+                actual = self._snapshot().buscar(record_id)
+                if actual is None:
                     print(f"⚠️ Warning: Record {record_id} not found for update.")
                     return False
+                esperada = version_de(actual)
+                if version is not None and int(version) != esperada:
+                    print(f"⚠️ Conflict: Record {record_id} v{esperada} (el cliente vio v{version}).")
+                    return False
 
-                # 4. Atomic Write (Write tmp -> Rename)
-                tmp_path = f"{self.db_path}.tmp"
-                with open(tmp_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=2)
-                    f.flush()
-                    os.fsync(f.fileno()) # Force write to disk
-                
-                os.replace(tmp_path, self.db_path)
-                
-                duration = (time.time() - start) * 1000
-                print(f"✅ TX Success: ID {record_id} updated via Lock ({duration:.2f}ms)")
-                return True
+                # 2. Modify (sobre una copia: el snapshot es compartido con los lectores)
+                modified = copy.deepcopy(actual)
+                update_func(modified)
+                modified['version'] = esperada + 1
+                cambios = {k: v for k, v in modified.items() if k not in actual or actual[k] != v}
+
+                with self.lock:
+                    # 3. Compare: nadie escribió este registro desde la lectura
+                    vigente = self._snapshot().buscar(record_id)
+                    if vigente is None or version_de(vigente) != esperada:
+                        if version is not None:
+                            print(f"⚠️ Conflict: Record {record_id} modificado por otro writer.")
+                            return False
+                        continue # Sin versión del cliente: reintentar sobre lo nuevo
+
+                    # 4. Swap: append + fsync de la decisión
+                    self.journal.append({
+                        'id': str(record_id),
+                        'accion': accion,
+                        'auditor': modified.get('auditor'),
+                        'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                        'nota': modified.get('nota_auditor'),
+                        'cambios': cambios
+                    })
+
+                    # 5. Compactación periódica del journal en el JSON
+                    if self._snapshot().n_journal >= self.compactar_cada:
+                        self._compactar()
+                break
+            else:
+                print(f"⚠️ Conflict: Record {record_id} sin éxito tras {CAS_REINTENTOS} intentos.")
+                return False
+
+            # 6. Backup post-commit: solo se encola, el thread de backups hace la copia
+            self.backups.registrar(record_id, modified)
+            duration = (time.time() - start) * 1000
+            print(f"✅ TX Success: ID {record_id} updated to v{modified['version']} ({duration:.2f}ms)")
+            return True
                 
         except Exception as e:
             print(f"❌ TX FAILED: {e}")
             return False
 
+    def compactar(self):
+        """Vuelca el journal en el JSON (atomic_write) y lo pasa al trail"""
+        with self.lock:
+            return self._compactar()
+
+    def _compactar(self):
+        # El caller tiene el lock: nadie agrega decisiones mientras tanto
+        snap = self._snapshot()
+        if snap.n_journal == 0:
+            return 0
+        self._reescribir(snap.data, snap.kpis())
+        print(f"🗜️ Journal compactado: {snap.n_journal} decisiones")
+        return snap.n_journal
+
+    def _reescribir(self, data, kpis):
+        """JSON nuevo + KPIs persistidos + journal al trail. El caller tiene el lock."""
+        # Si se cae entre estos pasos, las decisiones quedan en el JSON y en el journal:
+        # reaplicarlas es idempotente (solo asignan campos).
+        self.atomic_write(data)
+        kpis.guardar(self.kpis_path, self._firma(os.stat(self.db_path)))
+        self.journal.archivar(self.trail_path)
+
+    def extraer(self, predicado, destino):
+        """
+        Saca del store los registros que cumplen 'predicado' (ej: archivado histórico).
+        destino(registros) se llama con el lock tomado y ANTES de borrarlos: si falla,
+        no se borra nada. Retorna la cantidad extraída.
+        """
+        with self.lock:
+            snap = self._snapshot()
+            salen, quedan = [], []
+            for item in snap.data:
+                (salen if predicado(item) else quedan).append(item)
+            if not salen:
+                return 0
+            destino(salen)
+            kpis = snap.kpis().copia()
+            for item in salen:
+                kpis.aplicar(item, None)
+            self._reescribir(quedan, kpis)
+        print(f"📦 {len(salen)} registros extraídos del store")
+        return len(salen)
+
+    def contadores(self):
+        """KPIs crudos (utils/kpis.KPIs) del snapshot vigente"""
+        return self._snapshot().kpis()
+
+    def kpis(self):
+        """Resumen de KPIs del Panel 5 (contadores mantenidos por decisión, sin scan por request)"""
+        return self.contadores().resumen()
+
+    def historial(self, ids=None):
+        """
+        Trail de decisiones por ID (trail compactado + journal vigente), en orden de registro.
+        ids: iterable de IDs a incluir (None = todos).
+        """
+        try:
+            st = os.stat(self.trail_path)
+            firma = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            firma = None
+        if firma != self._trail[0]:
+            agrupado = {}
+            for entrada in leer_trail(self.trail_path) if firma else []:
+                agrupado.setdefault(str(entrada.get('id')), []).append(entrada)
+            self._trail = (firma, agrupado)
+        compactado = self._trail[1]
+
+        pendientes = {}
+        for entrada in leer_trail(self.journal.path):
+            pendientes.setdefault(str(entrada.get('id')), []).append(entrada)
+
+        claves = set(compactado) | set(pendientes) if ids is None else {str(i) for i in ids}
+        return {k: compactado.get(k, []) + pendientes.get(k, []) for k in claves
+                if k in compactado or k in pendientes}
+
 # Singleton Factory
-def get_db(path):
-    return DatabaseManager(path)
+def get_db(path, backend=None):
+    """
+    backend: 'json' (default) o 'sqlite'. Se puede fijar con la variable SCCP_DB_BACKEND.
+    En 'sqlite' la base vive junto al JSON (.sqlite3) y el JSON se migra una sola vez.
+    Backups (solo 'json'): SCCP_BACKUP_MAX (default 5), SCCP_BACKUP_MODO
+    ('completo' | 'gzip' | 'incremental') y SCCP_BACKUP_INTERVALO (segundos, default 2).
+    Journal (solo 'json'): SCCP_JOURNAL_COMPACTAR decisiones antes de compactar (default 500).
+    """
+    backend = (backend or os.environ.get('SCCP_DB_BACKEND', 'json')).lower()
+    if backend == 'sqlite':
+        from .sqlite_store import SQLiteDatabaseManager
+        sqlite_path = os.path.splitext(path)[0] + '.sqlite3'
+        return SQLiteDatabaseManager(sqlite_path, json_path=path)
+    backups = BackupManager(
+        path,
+        journal_path=os.path.splitext(os.path.abspath(path))[0] + '.journal.jsonl',
+        max_backups=int(os.environ.get('SCCP_BACKUP_MAX', 5)),
+        modo=os.environ.get('SCCP_BACKUP_MODO', 'completo').lower(),
+        intervalo=float(os.environ.get('SCCP_BACKUP_INTERVALO', 2.0))
+    )
+    compactar_cada = int(os.environ.get('SCCP_JOURNAL_COMPACTAR', COMPACTAR_CADA))
+    return DatabaseManager(path, backups=backups, compactar_cada=compactar_cada)
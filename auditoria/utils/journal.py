@@ -0,0 +1,85 @@
+
+import json
+import os
+import shutil
+
+class Journal:
+    """
+    Journal append-only de decisiones de auditoría (una línea JSON por decisión).
+
+    - append(): O(1) bytes + fsync. El caller debe tener el lock de writers.
+    - leer(): lectura incremental desde un offset; solo líneas completas.
+    - archivar(): tras compactar, el contenido pasa al trail (historial permanente)
+      y el journal se reemplaza por uno vacío (nuevo inode -> los lectores recargan).
+    """
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+
+    def stat(self):
+        """(inode, tamaño) o (None, 0) si todavía no existe"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None, 0
+        return st.st_ino, st.st_size
+
+    def abrir(self):
+        """Handle de lectura (o None). Mantiene el inode aunque se archive después."""
+        try:
+            return open(self.path, 'rb')
+        except FileNotFoundError:
+            return None
+
+    def append(self, entrada):
+        linea = (json.dumps(entrada, ensure_ascii=False) + '\n').encode('utf-8')
+        with open(self.path, 'a+b') as f:
+            if f.tell() > 0:
+                # Una caída a mitad de escritura deja una línea cortada: no pegarle la nueva
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    linea = b'\n' + linea
+            f.write(linea)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def leer(f, offset=0):
+        """
+        Entradas desde 'offset' hasta la última línea completa.
+        Retorna (entradas, nuevo_offset). Una línea a medio escribir queda para la próxima lectura.
+        """
+        if f is None:
+            return [], 0
+        f.seek(offset)
+        bloque = f.read()
+        fin = bloque.rfind(b'\n') + 1
+        entradas = []
+        for linea in bloque[:fin].splitlines():
+            if not linea.strip():
+                continue
+            try:
+                entradas.append(json.loads(linea))
+            except json.JSONDecodeError:
+                print("⚠️ Warning: línea corrupta en el journal, se ignora.")
+        return entradas, offset + fin
+
+    def archivar(self, trail_path):
+        """Mueve el journal al trail y lo deja vacío. El caller debe tener el lock."""
+        f = self.abrir()
+        if f is None:
+            return
+        with f, open(trail_path, 'ab') as destino:
+            shutil.copyfileobj(f, destino)
+            destino.flush()
+            os.fsync(destino.fileno())
+        tmp = f"{self.path}.tmp"
+        open(tmp, 'wb').close()
+        os.replace(tmp, self.path)
+
+def leer_trail(path):
+    """Todas las entradas de un archivo JSONL (trail o journal)"""
+    try:
+        with open(path, 'rb') as f:
+            return Journal.leer(f)[0]
+    except FileNotFoundError:
+        return []
@@ -0,0 +1,115 @@
+
+import datetime
+import json
+import os
+from collections import Counter
+
+# KPIs del Panel 5 como contadores por dimensión.
+# Todos dependen solo del estado actual de cada registro, así que:
+#   - reconstruir desde cero (scan completo) y
+#   - actualizar por decisión (restar el registro anterior, sumar el nuevo)
+# dan exactamente el mismo resultado. Una decisión cuesta O(dimensiones).
+
+DIMENSIONES = {
+    'total': lambda item: 'registros',
+    'estado': lambda item: item.get('estado'),
+    'feedback_humano': lambda item: item.get('feedback_humano'),
+    'linea': lambda item: item.get('linea'),
+    'operador': lambda item: item.get('operador'),
+    'auditor': lambda item: item.get('auditor'),
+    'dia_auditoria': lambda item: (item.get('fecha_auditoria') or '')[:10] or None,
+}
+
+TOP_N = 10
+
+def claves(item):
+    """(dimension, valor) que aporta un registro (los valores vacíos no cuentan)"""
+    for dimension, extraer in DIMENSIONES.items():
+        valor = extraer(item)
+        if valor is not None and valor != '':
+            yield dimension, str(valor)
+
+def delta(anterior, nuevo):
+    """Cambio neto de contadores entre dos versiones de un registro (sin ceros)"""
+    cambios = Counter()
+    if anterior is not None:
+        cambios.subtract(claves(anterior))
+    if nuevo is not None:
+        cambios.update(claves(nuevo))
+    return {clave: n for clave, n in cambios.items() if n}
+
+class KPIs:
+    def __init__(self, conteos=None):
+        # (dimension, valor) -> cantidad de registros
+        self.conteos = Counter(conteos or {})
+
+    @classmethod
+    def desde_registros(cls, items):
+        """Scan completo (solo al arrancar sin KPIs persistidos)"""
+        kpis = cls()
+        for item in items:
+            kpis.conteos.update(claves(item))
+        return kpis
+
+    def copia(self):
+        return KPIs(self.conteos)
+
+    def aplicar(self, anterior, nuevo):
+        for clave, n in delta(anterior, nuevo).items():
+            self.conteos[clave] += n
+            if not self.conteos[clave]:
+                del self.conteos[clave]
+
+    def dimension(self, nombre):
+        return Counter({valor: n for (dim, valor), n in self.conteos.items() if dim == nombre})
+
+    def resumen(self, hoy=None):
+        """Datos listos para panel_5_gerencial.html"""
+        hoy = hoy or datetime.date.today().strftime('%Y-%m-%d')
+        por_estado = self.dimension('estado')
+        por_feedback = self.dimension('feedback_humano')
+        decididos = sum(por_feedback.values())
+
+        def tasa(n):
+            return round(100.0 * n / decididos, 1) if decididos else None
+
+        return {
+            'total': self.conteos[('total', 'registros')],
+            'pendientes': por_estado.get('PRE_ANALIZADO', 0),
+            'decididos': decididos,
+            'precision': tasa(por_feedback.get('CONFIRMADO', 0)),
+            'falsos_positivos': por_feedback.get('FALSO_POSITIVO', 0),
+            'falsos_negativos': por_feedback.get('FALSO_NEGATIVO', 0),
+            'tasa_fp': tasa(por_feedback.get('FALSO_POSITIVO', 0)),
+            'tasa_fn': tasa(por_feedback.get('FALSO_NEGATIVO', 0)),
+            'auditados_hoy': self.conteos[('dia_auditoria', hoy)],
+            'por_estado': por_estado.most_common(),
+            'por_feedback': por_feedback.most_common(),
+            'por_linea': self.dimension('linea').most_common(TOP_N),
+            'por_operador': self.dimension('operador').most_common(TOP_N),
+            'por_auditor': self.dimension('auditor').most_common(TOP_N),
+        }
+
+    # --- Persistencia (backend JSON) -----------------------------------
+
+    def guardar(self, path, firma):
+        """firma: del JSON compactado al que corresponden estos contadores"""
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({
+                'firma': list(firma),
+                'conteos': [[dim, valor, n] for (dim, valor), n in self.conteos.items()]
+            }, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def cargar(cls, path, firma):
+        """KPIs persistidos si corresponden a 'firma'; None si faltan o están desactualizados"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                guardado = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if tuple(guardado.get('firma', ())) != tuple(firma):
+            return None
+        return cls({(dim, valor): n for dim, valor, n in guardado['conteos']})
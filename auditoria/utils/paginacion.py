@@ -0,0 +1,83 @@
+
+import base64
+import datetime
+import json
+from collections import namedtuple
+
+# Paginación keyset: orden fijo (timestamp DESC, id DESC).
+# El cursor es la clave (ts_orden, id) del último/primer registro visto,
+# así cada página es una búsqueda por rango y no un OFFSET que recorre todo.
+
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 200
+
+SIGUIENTE = 'siguiente'
+ANTERIOR = 'anterior'
+
+Pagina = namedtuple('Pagina', ['items', 'cursor_siguiente', 'cursor_anterior', 'size'])
+
+# Formatos de timestamp presentes en logs y datasets
+FORMATOS_TS = ('%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M')
+
+def ts_orden(timestamp):
+    """Timestamp normalizado a 'YYYY-MM-DD HH:MM:SS' (ordenable como texto). '' si no se reconoce."""
+    if not timestamp:
+        return ''
+    for fmt in FORMATOS_TS:
+        try:
+            return datetime.datetime.strptime(str(timestamp), fmt).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+    return ''
+
+def clave_orden(item):
+    return (ts_orden(item.get('timestamp')), str(item.get('id', '')))
+
+def encode_cursor(clave):
+    if clave is None:
+        return None
+    raw = json.dumps(list(clave), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor):
+    """Cursor opaco -> (ts_orden, id). Un cursor inválido se trata como 'sin cursor'."""
+    if not cursor:
+        return None
+    try:
+        ts, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (str(ts), str(record_id))
+    except Exception:
+        return None
+
+def normalizar_size(size):
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        return PAGE_SIZE_DEFAULT
+    return max(1, min(size, PAGE_SIZE_MAX))
+
+def paginar(store, cursor=None, direccion=SIGUIENTE, size=PAGE_SIZE_DEFAULT, **filtros):
+    """
+    Página keyset sobre cualquier store con query(..., after=, before=, limit=).
+    Se pide un registro extra para saber si hay más páginas en esa dirección.
+    """
+    size = normalizar_size(size)
+    clave = decode_cursor(cursor)
+
+    if direccion == ANTERIOR and clave:
+        items = store.query(before=clave, limit=size + 1, **filtros)
+        if not items:
+            # No queda nada antes del cursor (ej: registros archivados): volver al inicio
+            return paginar(store, None, SIGUIENTE, size, **filtros)
+        hay_anterior = len(items) > size
+        items = items[-size:]
+        hay_siguiente = True
+    else:
+        items = store.query(after=clave, limit=size + 1, **filtros)
+        hay_siguiente = len(items) > size
+        items = items[:size]
+        hay_anterior = clave is not None
+
+    cursor_siguiente = encode_cursor(clave_orden(items[-1])) if items and hay_siguiente else None
+    cursor_anterior = encode_cursor(clave_orden(items[0])) if items and hay_anterior else None
+    return Pagina(items, cursor_siguiente, cursor_anterior, size)
@@ -0,0 +1,46 @@
+
+import os
+import sys
+import time
+
+# Re-validación incremental del log de auditoría con las reglas vigentes del
+# validador (ver versiones_reglas.py en la raíz del repo). Solo se corre el
+# validador completo sobre los registros cuyo resultado puede cambiar; al
+# resto se le actualizan las versiones. Cada escritura queda en el trail
+# de decisiones con accion='REVALIDACION'.
+
+# El validador vive en la raíz del repo (mismo ajuste de path que app_sccp.py)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from versiones_reglas import VersionesVigentes, revalidar  # noqa: E402
+
+
+if __name__ == '__main__':
+    # Desde auditoria/: python -m utils.revalidacion data/auditoria_logs.json [--simular] [--catalogo] [--excel X]
+    import argparse
+    from .db_store import get_db
+
+    parser = argparse.ArgumentParser(description="Re-validación incremental del log de auditoría")
+    parser.add_argument('log', help="JSON del log (el backend sale de SCCP_DB_BACKEND)")
+    parser.add_argument('--simular', action='store_true', help="Solo contar qué se re-validaría, sin escribir")
+    parser.add_argument('--catalogo', action='store_true', help="Listar la huella de cada regla vigente")
+    parser.add_argument('--excel', default=None,
+                        help="Matriz de contingencias (default: Contingencias.xlsx junto al validador)")
+    args = parser.parse_args()
+
+    vigentes = VersionesVigentes(args.excel)
+    if args.catalogo:
+        for grupo, huellas in vigentes.catalogo.items():
+            print(f"[{grupo}] {vigentes.base[grupo]}")
+            for regla, valor in huellas.items():
+                print(f"  {valor}  {regla}")
+
+    inicio = time.time()
+    try:
+        resumen = revalidar(get_db(args.log), simular=args.simular, vigentes=vigentes)
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"🔁 {resumen['REVALIDAR']} re-validados ({resumen['cambiaron']} cambiaron de resultado), "
+          f"{resumen['SELLAR']} sin impacto, {resumen['AL_DIA']} al día, {resumen['errores']} errores "
+          f"en {time.time() - inicio:.1f}s" + (" [simulación]" if args.simular else ""))
@@ -0,0 +1,381 @@
+
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .db_store import CAS_REINTENTOS, version_de
+from .kpis import KPIs, delta
+from .paginacion import ts_orden
+
+# Columnas "calientes" que se extraen del registro para indexar.
+# El registro completo se guarda tal cual en 'data' (JSON).
+COLUMNAS_INDEXADAS = ('estado', 'feedback_humano', 'linea', 'timestamp')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS registros (
+    id TEXT PRIMARY KEY,
+    estado TEXT,
+    feedback_humano TEXT,
+    linea TEXT,
+    timestamp TEXT,
+    data TEXT NOT NULL,
+    ts_orden TEXT NOT NULL DEFAULT '',
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+-- Trail append-only de decisiones (mismo formato que el journal del backend JSON)
+CREATE TABLE IF NOT EXISTS decisiones (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL,
+    accion TEXT,
+    auditor TEXT,
+    timestamp TEXT,
+    nota TEXT,
+    cambios TEXT NOT NULL
+);
+
+-- Contadores del Panel 5, mantenidos en la misma TX que cada UPDATE (ver utils/kpis.py)
+CREATE TABLE IF NOT EXISTS kpis (
+    dimension TEXT NOT NULL,
+    valor TEXT NOT NULL,
+    cuenta INTEGER NOT NULL,
+    PRIMARY KEY (dimension, valor)
+);
+
+-- Marcas de operaciones de una sola vez (ej: 'migracion_json')
+CREATE TABLE IF NOT EXISTS meta (
+    clave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL
+);
+"""
+
+MARCAR = "INSERT OR REPLACE INTO meta (clave, valor) VALUES (?, ?)"
+
+SUMAR_KPI = (
+    "INSERT INTO kpis (dimension, valor, cuenta) VALUES (?, ?, ?) "
+    "ON CONFLICT(dimension, valor) DO UPDATE SET cuenta = cuenta + excluded.cuenta"
+)
+
+# ts_orden: timestamp normalizado (YYYY-MM-DD HH:MM:SS) para la paginación keyset
+INDICES = """
+CREATE INDEX IF NOT EXISTS idx_registros_estado ON registros(estado);
+CREATE INDEX IF NOT EXISTS idx_registros_feedback ON registros(feedback_humano);
+CREATE INDEX IF NOT EXISTS idx_registros_linea ON registros(linea);
+CREATE INDEX IF NOT EXISTS idx_registros_orden ON registros(ts_orden, id);
+CREATE INDEX IF NOT EXISTS idx_registros_estado_orden ON registros(estado, ts_orden, id);
+CREATE INDEX IF NOT EXISTS idx_registros_feedback_orden ON registros(feedback_humano, ts_orden, id);
+CREATE INDEX IF NOT EXISTS idx_decisiones_id ON decisiones(id, seq);
+"""
+
+class SQLiteDatabaseManager:
+    """
+    Misma interfaz que DatabaseManager (read / update_record) sobre SQLite en modo WAL.
+    Una decisión de auditoría es un UPDATE por clave primaria, no un rewrite del archivo.
+    """
+    def __init__(self, db_path, json_path=None):
+        self.db_path = os.path.abspath(db_path)
+        self.json_path = os.path.abspath(json_path) if json_path else None
+        self._local = threading.local()
+        self._ensure_db_exists()
+
+    def _conn(self):
+        """Una conexión por thread (sqlite3 no comparte conexiones entre threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _ensure_db_exists(self):
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        self._migrar_schema(conn)
+        conn.executescript(INDICES)
+        if self.json_path:
+            self.migrate_from_json(self.json_path)
+        self._inicializar_kpis(conn)
+
+    def _inicializar_kpis(self, conn):
+        """Bases creadas antes de los KPIs: un único scan para poblar la tabla"""
+        if conn.execute("SELECT 1 FROM kpis LIMIT 1").fetchone():
+            return
+        if not conn.execute("SELECT 1 FROM registros LIMIT 1").fetchone():
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not conn.execute("SELECT 1 FROM kpis LIMIT 1").fetchone():
+                kpis = KPIs.desde_registros(self.read())
+                conn.executemany(SUMAR_KPI, [(dim, valor, n) for (dim, valor), n in kpis.conteos.items()])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _migrar_schema(self, conn):
+        """Bases creadas con un schema anterior: agregar y completar ts_orden (paginación) y version (CAS)"""
+        columnas = {row[1] for row in conn.execute("PRAGMA table_info(registros)")}
+        if 'ts_orden' in columnas and 'version' in columnas:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if 'ts_orden' not in columnas:
+                conn.execute("ALTER TABLE registros ADD COLUMN ts_orden TEXT NOT NULL DEFAULT ''")
+                filas = conn.execute("SELECT id, timestamp FROM registros").fetchall()
+                conn.executemany(
+                    "UPDATE registros SET ts_orden = ? WHERE id = ?",
+                    [(ts_orden(ts), record_id) for record_id, ts in filas]
+                )
+            if 'version' not in columnas:
+                # Los registros previos no tienen 'version' en data: DEFAULT 0 coincide con version_de()
+                conn.execute("ALTER TABLE registros ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _fila(item):
+        return (
+            str(item.get('id', '')),
+            *(item.get(col) for col in COLUMNAS_INDEXADAS),
+            json.dumps(item, ensure_ascii=False),
+            ts_orden(item.get('timestamp')),
+            version_de(item)
+        )
+
+    @staticmethod
+    def _marcada(conn, clave):
+        return conn.execute("SELECT 1 FROM meta WHERE clave = ?", (clave,)).fetchone() is not None
+
+    def migrate_from_json(self, json_path):
+        """
+        Migración one-shot: queda marcada en 'meta' en la misma TX que los INSERT.
+        No alcanza con ver la tabla vacía: el archivado (extraer) puede vaciarla.
+        Mantiene el orden del archivo (rowid) para que read() devuelva lo mismo.
+        """
+        conn = self._conn()
+        if self._marcada(conn, 'migracion_json'):
+            return 0
+        if not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except json.JSONDecodeError:
+            print(f"❌ ERROR: JSON corrupto, migración cancelada: {json_path}")
+            return 0
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Doble chequeo dentro de la TX (otro worker pudo migrar primero)
+            if self._marcada(conn, 'migracion_json'):
+                conn.execute("ROLLBACK")
+                return 0
+            # Base en uso de antes de la marca (con registros o KPIs): ya se migró
+            if (conn.execute("SELECT 1 FROM registros LIMIT 1").fetchone()
+                    or conn.execute("SELECT 1 FROM kpis LIMIT 1").fetchone()):
+                conn.execute(MARCAR, ('migracion_json', 'previa'))
+                conn.execute("COMMIT")
+                return 0
+            cur = conn.executemany(
+                "INSERT OR IGNORE INTO registros (id, estado, feedback_humano, linea, timestamp, data, ts_orden, version) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._fila(item) for item in data]
+            )
+            # read() dentro de la TX ve lo recién insertado (sin los IDs duplicados)
+            kpis = KPIs.desde_registros(self.read())
+            conn.executemany(SUMAR_KPI, [(dim, valor, n) for (dim, valor), n in kpis.conteos.items()])
+            conn.execute(MARCAR, ('migracion_json', f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {json_path}"))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        migrados = cur.rowcount
+        if migrados != len(data):
+            print(f"⚠️ Warning: {len(data) - migrados} registros con ID duplicado no migrados.")
+        print(f"✅ Migración JSON -> SQLite: {migrados} registros")
+        return migrados
+
+    def read(self):
+        """Lectura completa en el orden original (snapshot consistente gracias a WAL)"""
+        rows = self._conn().execute("SELECT data FROM registros ORDER BY rowid").fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    @staticmethod
+    def _where(estado, feedback, linea):
+        condiciones, params = [], []
+        for columna, valor in (('estado', estado), ('feedback_humano', feedback), ('linea', linea)):
+            if valor is not None:
+                condiciones.append(f"{columna} = ?")
+                params.append(valor)
+        return condiciones, params
+
+    def query(self, estado=None, feedback=None, linea=None, limit=None, offset=0, after=None, before=None):
+        """
+        Filtros empujados a SQLite (usa los índices de estado / feedback_humano / linea).
+        Orden: (timestamp DESC, id DESC). feedback filtra por 'feedback_humano'.
+        after/before: clave keyset (ts_orden, id) -> búsqueda por rango sobre el índice.
+        Con 'before' el offset se cuenta desde el cursor.
+        """
+        condiciones, params = self._where(estado, feedback, linea)
+        orden = "DESC"
+        if after is not None:
+            condiciones.append("(ts_orden, id) < (?, ?)")
+            params += list(after)
+        if before is not None:
+            # Los más cercanos al cursor: se recorre en ASC y se invierte al final
+            condiciones.append("(ts_orden, id) > (?, ?)")
+            params += list(before)
+            orden = "ASC"
+
+        sql = "SELECT data FROM registros"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        sql += f" ORDER BY ts_orden {orden}, id {orden} LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+
+        rows = self._conn().execute(sql, params).fetchall()
+        if orden == "ASC":
+            rows.reverse()
+        return [json.loads(data) for (data,) in rows]
+
+    def count(self, estado=None, feedback=None, linea=None):
+        condiciones, params = self._where(estado, feedback, linea)
+        sql = "SELECT COUNT(*) FROM registros"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        return self._conn().execute(sql, params).fetchone()[0]
+
+    def update_record(self, record_id, update_func, accion=None, version=None):
+        """
+        Compare-and-swap: SELECT por PK (sin TX) -> Modify -> UPDATE ... WHERE id AND version
+        record_id: ID del item a buscar
+        update_func: función lambda que recibe el item y lo modifica (in-place)
+        accion: nombre de la decisión para el trail (CONFIRMAR, FALSO_POSITIVO, ...)
+        version: versión que vio el cliente (formulario). Si el registro cambió desde
+                 entonces, se rechaza. Sin version, se reintenta contra la versión vigente.
+        """
+        start = time.time()
+        conn = self._conn()
+        try:
+            for _ in range(CAS_REINTENTOS):
+                row = conn.execute(
+                    "SELECT data, version FROM registros WHERE id = ?", (str(record_id),)
+                ).fetchone()
+                if not row:
+                    print(f"⚠️ Warning: Record {record_id} not found for update.")
+                    return False
+                esperada = row[1]
+                if version is not None and int(version) != esperada:
+                    print(f"⚠️ Conflict: Record {record_id} v{esperada} (el cliente vio v{version}).")
+                    return False
+
+                item = json.loads(row[0])
+                anterior = dict(item)
+                update_func(item)
+                item['version'] = esperada + 1
+                cambios = {k: v for k, v in item.items() if k not in anterior or anterior[k] != v}
+
+                _, *valores = self._fila(item)
+                # La TX de escritura solo cubre el UPDATE condicional y el trail
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    cur = conn.execute(
+                        "UPDATE registros SET estado = ?, feedback_humano = ?, linea = ?, timestamp = ?, data = ?, "
+                        "ts_orden = ?, version = ? WHERE id = ? AND version = ?",
+                        (*valores, str(record_id), esperada)
+                    )
+                    if cur.rowcount == 0:
+                        conn.execute("ROLLBACK")
+                        if version is not None:
+                            print(f"⚠️ Conflict: Record {record_id} modificado por otro writer.")
+                            return False
+                        continue # Sin versión del cliente: reintentar sobre lo nuevo
+                    conn.execute(
+                        "INSERT INTO decisiones (id, accion, auditor, timestamp, nota, cambios) VALUES (?, ?, ?, ?, ?, ?)",
+                        (str(record_id), accion, item.get('auditor'),
+                         datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                         item.get('nota_auditor'), json.dumps(cambios, ensure_ascii=False))
+                    )
+                    conn.executemany(SUMAR_KPI, [(dim, valor, n) for (dim, valor), n in delta(anterior, item).items()])
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                break
+            else:
+                print(f"⚠️ Conflict: Record {record_id} sin éxito tras {CAS_REINTENTOS} intentos.")
+                return False
+
+            duration = (time.time() - start) * 1000
+            print(f"✅ TX Success: ID {record_id} updated to v{item['version']} via SQLite ({duration:.2f}ms)")
+            return True
+
+        except Exception as e:
+            print(f"❌ TX FAILED: {e}")
+            return False
+
+    def extraer(self, predicado, destino):
+        """
+        Saca del store los registros que cumplen 'predicado' (ej: archivado histórico).
+        destino(registros) se llama dentro de la TX y ANTES del DELETE: si falla, ROLLBACK.
+        Retorna la cantidad extraída.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            salen = [item for item in (json.loads(data) for (data,) in
+                     conn.execute("SELECT data FROM registros ORDER BY rowid")) if predicado(item)]
+            if not salen:
+                conn.execute("ROLLBACK")
+                return 0
+            destino(salen)
+            conn.executemany("DELETE FROM registros WHERE id = ?", [(str(item.get('id', '')),) for item in salen])
+            for item in salen:
+                conn.executemany(SUMAR_KPI, [(dim, valor, n) for (dim, valor), n in delta(item, None).items()])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        print(f"📦 {len(salen)} registros extraídos del store")
+        return len(salen)
+
+    def contadores(self):
+        """KPIs crudos (utils/kpis.KPIs) desde la tabla de contadores"""
+        filas = self._conn().execute("SELECT dimension, valor, cuenta FROM kpis WHERE cuenta != 0")
+        return KPIs({(dim, valor): n for dim, valor, n in filas})
+
+    def kpis(self):
+        """Resumen de KPIs del Panel 5 (lectura de la tabla de contadores, sin scan)"""
+        return self.contadores().resumen()
+
+    def historial(self, ids=None):
+        """Trail de decisiones por ID, en orden de registro. ids: IDs a incluir (None = todos)."""
+        sql = "SELECT id, accion, auditor, timestamp, nota, cambios FROM decisiones"
+        params = []
+        if ids is not None:
+            params = [str(i) for i in ids]
+            if not params:
+                return {}
+            sql += f" WHERE id IN ({', '.join('?' * len(params))})"
+        sql += " ORDER BY seq"
+        agrupado = {}
+        for record_id, accion, auditor, timestamp, nota, cambios in self._conn().execute(sql, params):
+            agrupado.setdefault(record_id, []).append({
+                'id': record_id, 'accion': accion, 'auditor': auditor,
+                'timestamp': timestamp, 'nota': nota, 'cambios': json.loads(cambios)
+            })
+        return agrupado
+
+
+if __name__ == '__main__':
+    # Migración manual (desde auditoria/): python -m utils.sqlite_store data/auditoria_logs.json [destino.sqlite3]
+    import sys
+    origen = sys.argv[1]
+    destino = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(origen)[0] + '.sqlite3'
+    SQLiteDatabaseManager(destino, json_path=origen)
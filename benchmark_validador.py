@@ -0,0 +1,221 @@
+"""
+Benchmark del Validador SOFSE - Sistema ROCA v3.0
+
+Mide por separado cada etapa del pipeline sobre los textos reales de
+auditoria/data/auditoria_logs.json más el corpus sintético de
+generador_corpus.py (semilla fija):
+  - detectar_tipo_mensaje
+  - validar_componentes
+  - validar_tiempo_respuesta
+  - calcular_scores
+  - validar_mensaje_ROCA (end-to-end)
+
+Reporta p50 / p95 / p99 (µs) y mensajes/segundo, y compara contra un
+baseline guardado: si una etapa empeora más que la tolerancia, sale con
+código 1 (para cortar el release ante una regla nueva lenta).
+
+Uso:
+    python benchmark_validador.py                      # medir y comparar
+    python benchmark_validador.py --guardar-baseline   # fijar baseline
+    python benchmark_validador.py --sinteticos 5000 --tolerancia 0.3
+
+El baseline depende de la máquina: guardarlo en la misma donde se compara.
+"""
+
+import argparse
+import json
+import os
+import platform
+import time
+
+import validador_mensajes as vm
+from generador_corpus import generar_mensajes
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGS_AUDITORIA = os.path.join(BASE_DIR, 'auditoria', 'data', 'auditoria_logs.json')
+BASELINE_DEFAULT = os.path.join(BASE_DIR, 'benchmark_baseline.json')
+
+ETAPAS = (
+    'detectar_tipo_mensaje',
+    'validar_componentes',
+    'validar_tiempo_respuesta',
+    'calcular_scores',
+    'validar_mensaje_ROCA',
+)
+
+# Métricas que se comparan contra el baseline (más alto = peor)
+METRICAS_COMPARADAS = ('p50', 'p95')
+
+# =================================================================
+#                    CORPUS
+# =================================================================
+
+def mensajes_auditoria(path=LOGS_AUDITORIA):
+    """Textos reales del log de auditoría en el formato del validador"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        logs = json.load(f)
+    return [{
+        'numero_mensaje': log.get('id'),
+        'operador': log.get('operador'),
+        'fecha_hora': log.get('timestamp'),
+        'linea': log.get('linea'),
+        'contenido': log.get('texto', '')
+    } for log in logs]
+
+def mensajes_sinteticos(cantidad, semilla=7):
+    """Corpus sintético de generador_corpus.py (mismo resultado para la misma semilla)"""
+    return list(generar_mensajes(cantidad, semilla))
+
+# =================================================================
+#                    MEDICIÓN
+# =================================================================
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    i = min(len(ordenados) - 1, max(0, int(round(p / 100.0 * (len(ordenados) - 1)))))
+    return ordenados[i]
+
+def _resumir(muestras_ns):
+    ordenados = sorted(muestras_ns)
+    total_s = sum(ordenados) / 1e9
+    return {
+        'n': len(ordenados),
+        'p50': round(_percentil(ordenados, 50) / 1000.0, 2),
+        'p95': round(_percentil(ordenados, 95) / 1000.0, 2),
+        'p99': round(_percentil(ordenados, 99) / 1000.0, 2),
+        'msgs_seg': round(len(ordenados) / total_s, 1) if total_s else 0.0
+    }
+
+def medir(mensajes, contingencias, repeticiones=3):
+    """
+    Cada etapa se mide con sus propias entradas (las salidas de la etapa anterior
+    se calculan fuera del cronómetro). Una pasada previa de warm-up llena cachés
+    (config, corrector) como en producción.
+    """
+    reloj = time.perf_counter_ns
+    muestras = {etapa: [] for etapa in ETAPAS}
+
+    # Entradas de cada etapa (y warm-up)
+    entradas = []
+    for mensaje in mensajes:
+        componentes = vm.validar_componentes(mensaje, contingencias)[0]
+        timing = vm.validar_tiempo_respuesta(mensaje, componentes)
+        vm.calcular_scores(componentes, timing, mensaje)
+        vm.validar_mensaje_ROCA(mensaje, contingencias)
+        entradas.append((mensaje, componentes, timing))
+
+    for _ in range(repeticiones):
+        for mensaje, componentes, timing in entradas:
+            contenido = mensaje.get('contenido', '')
+
+            t0 = reloj()
+            vm.detectar_tipo_mensaje(contenido)
+            t1 = reloj()
+            vm.validar_componentes(mensaje, contingencias)
+            t2 = reloj()
+            vm.validar_tiempo_respuesta(mensaje, componentes)
+            t3 = reloj()
+            vm.calcular_scores(componentes, timing, mensaje)
+            t4 = reloj()
+            vm.validar_mensaje_ROCA(mensaje, contingencias)
+            t5 = reloj()
+
+            muestras['detectar_tipo_mensaje'].append(t1 - t0)
+            muestras['validar_componentes'].append(t2 - t1)
+            muestras['validar_tiempo_respuesta'].append(t3 - t2)
+            muestras['calcular_scores'].append(t4 - t3)
+            muestras['validar_mensaje_ROCA'].append(t5 - t4)
+
+    return {etapa: _resumir(valores) for etapa, valores in muestras.items()}
+
+# =================================================================
+#                    BASELINE
+# =================================================================
+
+def guardar_baseline(resultados, meta, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'etapas': resultados}, f, ensure_ascii=False, indent=2)
+
+def cargar_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def comparar(resultados, baseline, tolerancia):
+    """Lista de (etapa, métrica, baseline, actual, variación) que superan la tolerancia"""
+    regresiones = []
+    for etapa, actual in resultados.items():
+        previo = baseline.get('etapas', {}).get(etapa)
+        if not previo:
+            continue
+        for metrica in METRICAS_COMPARADAS:
+            if previo.get(metrica) and actual[metrica] > previo[metrica] * (1 + tolerancia):
+                variacion = actual[metrica] / previo[metrica] - 1
+                regresiones.append((etapa, metrica, previo[metrica], actual[metrica], variacion))
+    return regresiones
+
+def imprimir(resultados, baseline=None):
+    print(f"{'ETAPA':<28}{'p50 µs':>10}{'p95 µs':>10}{'p99 µs':>10}{'msgs/s':>12}{'Δp50':>9}")
+    print("-" * 79)
+    for etapa, r in resultados.items():
+        delta = ''
+        previo = (baseline or {}).get('etapas', {}).get(etapa)
+        if previo and previo.get('p50'):
+            delta = f"{(r['p50'] / previo['p50'] - 1) * 100:+.0f}%"
+        print(f"{etapa:<28}{r['p50']:>10.1f}{r['p95']:>10.1f}{r['p99']:>10.1f}{r['msgs_seg']:>12.1f}{delta:>9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark por etapa de validar_mensaje_ROCA")
+    parser.add_argument('--sinteticos', type=int, default=1000, help="Mensajes sintéticos a sumar al corpus real")
+    parser.add_argument('--semilla', type=int, default=7)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--sin-corrector', action='store_true', help="Desactivar el corrector ortográfico")
+    parser.add_argument('--excel', default=vm.ARCHIVO_CONTINGENCIAS, help="Matriz de contingencias")
+    parser.add_argument('--baseline', default=BASELINE_DEFAULT)
+    parser.add_argument('--guardar-baseline', action='store_true')
+    parser.add_argument('--tolerancia', type=float, default=0.20, help="Empeoramiento admitido (0.20 = 20%%)")
+    args = parser.parse_args()
+
+    if args.sin_corrector:
+        vm.CORRECTOR_DISPONIBLE = False
+    contingencias = vm.cargar_indice_contingencias(args.excel)
+    if contingencias is None:
+        print(f"⚠️ Sin matriz de contingencias ({args.excel}): se mide sin búsqueda de contingencias")
+
+    mensajes = mensajes_auditoria() + mensajes_sinteticos(args.sinteticos, args.semilla)
+    print(f"📊 Corpus: {len(mensajes)} mensajes x {args.repeticiones} repeticiones")
+    resultados = medir(mensajes, contingencias, args.repeticiones)
+
+    meta = {
+        'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'maquina': platform.node(),
+        'mensajes': len(mensajes),
+        'corrector': vm.CORRECTOR_DISPONIBLE,
+        'contingencias': contingencias is not None
+    }
+
+    if args.guardar_baseline:
+        imprimir(resultados)
+        guardar_baseline(resultados, meta, args.baseline)
+        print(f"💾 Baseline guardado en {args.baseline}")
+        raise SystemExit(0)
+
+    baseline = cargar_baseline(args.baseline)
+    imprimir(resultados, baseline)
+    if baseline is None:
+        print(f"ℹ️ Sin baseline ({args.baseline}): correr con --guardar-baseline para fijarlo")
+        raise SystemExit(0)
+
+    regresiones = comparar(resultados, baseline, args.tolerancia)
+    if regresiones:
+        print(f"\n❌ REGRESIÓN DE PERFORMANCE (tolerancia {args.tolerancia:.0%}):")
+        for etapa, metrica, previo, actual, variacion in regresiones:
+            print(f"   {etapa} {metrica}: {previo:.1f} µs -> {actual:.1f} µs ({variacion:+.0%})")
+        raise SystemExit(1)
+    print(f"\n✅ Sin regresiones contra el baseline del {baseline.get('meta', {}).get('fecha', '?')}")
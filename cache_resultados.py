@@ -0,0 +1,99 @@
+"""
+Caché de Resultados SOFSE - LRU con vencimiento por contenido
+
+Guarda la parte del resultado que no depende de la hora de envío
+(validar_componentes: componentes, código de estructura, contingencia y
+estado), indexada por un hash del contenido normalizado, la línea y la
+versión de las reglas. Los operadores mandan textos casi idénticos todo el
+día y los reintentos reenvían el mismo mensaje: un acierto cuesta un hash y
+una búsqueda en lugar de regex + corrector ortográfico.
+
+La clave es el contenido: dos mensajes con el mismo texto (tras normalizar
+espacios) en la misma línea y con las mismas reglas comparten entrada aunque
+cambien número, operador o fecha_hora.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# Separador entre las partes de la clave (no aparece en los mensajes)
+_SEPARADOR = '\x1f'
+
+
+def clave_contenido(*partes):
+    """Hash hex de las partes (contenido normalizado, línea, versión de reglas, ...)"""
+    texto = _SEPARADOR.join('' if parte is None else str(parte) for parte in partes)
+    return hashlib.blake2b(texto.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class CacheResultados:
+    """
+    LRU acotada por cantidad de entradas, con vencimiento opcional.
+    max_entradas: tope de entradas (se desaloja la usada hace más tiempo)
+    ttl: segundos de vida de cada entrada (None = sin vencimiento)
+    Segura para usar desde varios threads (la app web atiende en paralelo).
+    """
+
+    def __init__(self, max_entradas=10000, ttl=None):
+        self.max_entradas = max(1, max_entradas)
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self._reiniciar_contadores()
+
+    def _reiniciar_contadores(self):
+        self.aciertos = 0
+        self.fallos = 0
+        self.vencidas = 0
+        self.desalojadas = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obtener(self, clave):
+        """Valor guardado para la clave, o None si no está o venció"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            valor, vence = entrada
+            if vence is not None and time.monotonic() >= vence:
+                del self._entradas[clave]
+                self.vencidas += 1
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        vence = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entradas[clave] = (valor, vence)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.desalojadas += 1
+
+    def limpiar(self):
+        """Vacía la caché y reinicia los contadores"""
+        with self._lock:
+            self._entradas.clear()
+            self._reiniciar_contadores()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else 0.0,
+                'vencidas': self.vencidas,
+                'desalojadas': self.desalojadas,
+                'entradas': len(self._entradas),
+                'max_entradas': self.max_entradas,
+                'ttl': self.ttl
+            }
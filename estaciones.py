@@ -0,0 +1,168 @@
+"""
+Nomenclador de Estaciones SOFSE - Trie por tokens
+
+Compila una sola vez (por versión del config de la línea) la lista de
+estaciones conocidas en un trie cuyas aristas son tokens del tokenizador
+(palabras, números y símbolos sueltos). Un solo recorrido del mensaje
+encuentra todas las estaciones mencionadas, siempre la más larga en cada
+posición ("RETIRO (LSM)" antes que "RETIRO"), sin capturas perezosas ni
+retroceso: el costo es lineal en la cantidad de tokens.
+
+Las estaciones salen de la clave opcional "estaciones" de
+configs/config_<linea>.json (el mismo archivo que cargar_config):
+
+    "estaciones": [
+        "CONSTITUCION",
+        "JOSE C. PAZ",
+        {"nombre": "RETIRO (LSM)", "variantes": ["RETIRO LSM", "RETIRO SAN MARTIN"]}
+    ]
+
+La comparación ignora tildes y espacios entre tokens ("JOSE C.PAZ" y
+"JOSÉ C. PAZ" reconocen "JOSE C. PAZ"); siempre se devuelve el nombre oficial.
+Sin la clave el nomenclador queda vacío y el validador sigue con la
+extracción por palabras clave de tokenizador.py.
+"""
+
+from itertools import repeat
+
+from tokenizador import MensajeTokenizado
+
+_SIN_TILDES = str.maketrans('ÁÉÍÓÚ', 'AEIOU')
+
+# Clave de nodo terminal: ningún token es vacío
+_FIN = ''
+
+# Palabra previa a la estación según su rol en el recorrido oficial
+_PREVIAS_ORIGEN = ('DE', 'DESDE')
+_PREVIAS_DESTINO = ('HACIA', 'A')
+
+
+def _claves(texto_upper):
+    """Tokens del texto sin tildes, tal como se guardan en el trie"""
+    tokens = MensajeTokenizado(texto_upper).tokens()
+    return list(map(str.translate, tokens, repeat(_SIN_TILDES)))
+
+
+class NomencladorEstaciones:
+    """
+    Trie de estaciones de una línea.
+    estaciones: iterable de nombres o de {"nombre": ..., "variantes": [...]}
+    """
+
+    def __init__(self, estaciones):
+        self._raiz = {}
+        self.nombres = []
+        for estacion in estaciones:
+            if isinstance(estacion, dict):
+                nombre = estacion.get('nombre', '').strip().upper()
+                variantes = [v.strip().upper() for v in estacion.get('variantes', [])]
+            else:
+                nombre = str(estacion).strip().upper()
+                variantes = []
+            if not nombre:
+                continue
+            self.nombres.append(nombre)
+            for forma in [nombre] + variantes:
+                self._agregar(_claves(forma), nombre)
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def _agregar(self, claves, nombre):
+        if not claves:
+            return
+        nodo = self._raiz
+        for clave in claves:
+            nodo = nodo.setdefault(clave, {})
+        # Ante variantes repetidas gana la primera estación declarada
+        nodo.setdefault(_FIN, nombre)
+
+    def _mas_larga(self, claves, inicio):
+        """(fin, nombre) de la estación más larga que empieza en el token 'inicio', o None"""
+        nodo = self._raiz
+        mejor = None
+        for j in range(inicio, len(claves)):
+            nodo = nodo.get(claves[j])
+            if nodo is None:
+                break
+            nombre = nodo.get(_FIN)
+            if nombre is not None:
+                mejor = (j, nombre)
+        return mejor
+
+    def coincidencias(self, lexico):
+        """
+        Estaciones del mensaje tokenizado, de izquierda a derecha y sin solaparse.
+        Retorna lista de (inicio, fin, nombre) con índices de token inclusivos.
+        """
+        tokens = lexico.tokens()
+        claves = list(map(str.translate, tokens, repeat(_SIN_TILDES)))
+        raiz = self._raiz
+        encontradas = []
+        i = 0
+        total = len(claves)
+        while i < total:
+            if claves[i] in raiz:
+                mejor = self._mas_larga(claves, i)
+                if mejor:
+                    fin, nombre = mejor
+                    encontradas.append((i, fin, nombre))
+                    i = fin + 1
+                    continue
+            i += 1
+        return encontradas
+
+    def reconocer(self, texto):
+        """Nombre oficial si el texto completo es una estación conocida (o variante), si no None"""
+        claves = _claves(texto.upper())
+        if not claves:
+            return None
+        mejor = self._mas_larga(claves, 0)
+        if mejor and mejor[0] == len(claves) - 1:
+            return mejor[1]
+        return None
+
+    def recorrido(self, lexico):
+        """
+        (origen, destino) oficiales: la primera estación precedida por DE/DESDE
+        y la primera precedida por HACIA/A (o FINALIZA EN). None donde no haya.
+        """
+        tokens = lexico.tokens()
+        origen = destino = None
+        for inicio, _, nombre in self.coincidencias(lexico):
+            previa = tokens[inicio - 1] if inicio else ''
+            if origen is None and previa in _PREVIAS_ORIGEN:
+                origen = nombre
+            elif destino is None and (
+                previa in _PREVIAS_DESTINO or
+                (previa == 'EN' and inicio >= 2 and tokens[inicio - 2] == 'FINALIZA')
+            ):
+                destino = nombre
+            if origen and destino:
+                break
+        return origen, destino
+
+
+def compilar_nomenclador(config):
+    """Nomenclador de la clave 'estaciones' del config de la línea (vacío si no está)"""
+    return NomencladorEstaciones(config.get('estaciones', []))
+
+
+if __name__ == '__main__':
+    # python estaciones.py "Línea San Martín" "JOSE C.PAZ" "RETIRO LSM" "TIGRE"
+    import argparse
+    import validador_mensajes as vm
+
+    parser = argparse.ArgumentParser(description="Consultar el nomenclador de estaciones de una línea")
+    parser.add_argument('linea', help="Nombre de la línea (se resuelve como configs/config_<linea>.json)")
+    parser.add_argument('estaciones', nargs='+', help="Nombres a reconocer, tal como los escribe el operador")
+    args = parser.parse_args()
+
+    nomenclador = vm.obtener_nomenclador(args.linea)
+    if not nomenclador:
+        print(f"⚠️ Sin nomenclador para {args.linea}: se usa la extracción por palabras clave")
+    else:
+        print(f"🚉 {len(nomenclador)} estaciones en el nomenclador de {args.linea}")
+    for estacion in args.estaciones:
+        oficial = nomenclador.reconocer(estacion)
+        print(f"  ✅ {estacion} -> {oficial}" if oficial else f"  ❌ {estacion}: no reconocida")
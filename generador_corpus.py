@@ -0,0 +1,222 @@
+"""
+Generador de Corpus Sintético SOFSE - Sistema ROCA v3.0
+
+Arma mensajes de contingencia realistas para pruebas de carga y escala:
+  - Todos los estados de MAP_ESTADOS_CODIGO: las frases se derivan de los
+    propios patrones regex, así un estado o patrón nuevo entra solo al corpus.
+  - Todas las formas oficiales y sinónimos de SINONIMOS_CONTINGENCIAS.
+  - Formatos de hora reales ("DE LAS08 59 HS", "10:44HS", "DE LAS 0811HS", ...)
+    y de tren ("EL TREN 3361", "@T3432", ...).
+  - Typos, minúsculas, espacios dobles y "5_ MINUTOS".
+
+Misma semilla -> mismo corpus. Se genera en streaming (no arma la lista en
+memoria), así que sirve de miles a millones de mensajes.
+
+Uso:
+    python generador_corpus.py 100000 corpus.ndjson
+    python generador_corpus.py 5000 corpus.json --semilla 42
+"""
+
+import argparse
+import functools
+import json
+import random
+from datetime import datetime, timedelta
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+import validador_mensajes as vm
+
+# =================================================================
+#                    FRASES DESDE LOS PATRONES
+# =================================================================
+
+_MAX_REPETICION = 1
+
+def _expandir(nodos, rnd):
+    """Texto aleatorio que coincide con el patrón ya parseado (subconjunto usado en las reglas)"""
+    salida = []
+    for op, arg in nodos:
+        nombre = str(op)
+        if nombre == 'LITERAL':
+            salida.append(chr(arg))
+        elif nombre == 'IN':
+            opciones = []
+            for sub_op, sub_arg in arg:
+                if str(sub_op) == 'LITERAL':
+                    opciones.append(chr(sub_arg))
+                elif str(sub_op) == 'RANGE':
+                    opciones.append(chr(rnd.randint(*sub_arg)))
+                elif str(sub_op) == 'CATEGORY':
+                    opciones.append(' ' if 'SPACE' in str(sub_arg) else 'A')
+            salida.append(rnd.choice(opciones) if opciones else '')
+        elif nombre == 'CATEGORY':
+            salida.append(' ' if 'SPACE' in str(arg) else ('1' if 'DIGIT' in str(arg) else 'A'))
+        elif nombre == 'ANY':
+            salida.append('X')
+        elif nombre == 'BRANCH':
+            salida.append(_expandir(rnd.choice(arg[1]), rnd))
+        elif nombre == 'SUBPATTERN':
+            salida.append(_expandir(arg[-1], rnd))
+        elif nombre in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'):
+            minimo, maximo, sub = arg
+            veces = rnd.randint(minimo, min(maximo, minimo + _MAX_REPETICION))
+            salida.extend(_expandir(sub, rnd) for _ in range(veces))
+        # AT (anclas), lookarounds, etc.: no aportan texto
+    return ''.join(salida)
+
+@functools.lru_cache(maxsize=None)
+def _parsear(patron):
+    return sre_parse.parse(patron)
+
+def frase_para_patron(patron, rnd):
+    return _expandir(_parsear(patron), rnd)
+
+# =================================================================
+#                    FRAGMENTOS
+# =================================================================
+
+ESTACIONES = {
+    'ROCA': ['CONSTITUCION', 'LA PLATA', 'TEMPERLEY', 'GLEW', 'KORN', 'EZEIZA', 'BOSQUES', 'QUILMES',
+             'PLAZA C', 'HAEDO', 'ALEJANDRO KORN', 'CAÑUELAS'],
+    'Línea San Martín (Manual)': ['RETIRO (LSM)', 'JOSE C. PAZ', 'PILAR', 'CABRED', 'PALERMO',
+                                  'VILLA DEL PARQUE', 'CASEROS', 'HURLINGHAM', 'SAN MIGUEL'],
+    'MITRE': ['RETIRO', 'TIGRE', 'JOSE LEON SUAREZ', 'BARTOLOME MITRE', 'BELGRANO C', 'SAN ISIDRO'],
+}
+
+RECORRIDOS = [
+    'DE {o} HACIA {d}', 'DESDE {o} HACIA {d}', 'DE {o} A {d}', 'ENTRE {o} Y {d}',
+    'PARTIENDO DE {o} HACIA {d}', 'CON DESTINO A {d}', '{o} - {d}',
+]
+
+def _formatos_hora(h, m, rnd):
+    return rnd.choice([
+        f"DE LAS {h:02d}:{m:02d} HS",
+        f"DE LAS{h:02d} {m:02d}  HS",     # "DE LAS08 59  HS"
+        f"DE LAS {h:02d}{m:02d}HS",       # "DE LAS 0811HS"
+        f"{h:02d}:{m:02d}HS",
+        f"DE LAS {h} {m:02d} HS",
+        f"A LAS {h}.{m:02d}",
+        f"HS {h:02d} {m:02d}",
+        f"DE LAS {h:02d}.{m:02d} HS",
+    ])
+
+def _tren(linea, rnd):
+    numero = rnd.randint(3000, 3999)
+    ramal = rnd.choice(ESTACIONES[linea])
+    return rnd.choice([
+        f"EL TREN {numero}", f"TREN N° {numero}", f"@T{numero}", f"TREN N @T{numero}",
+        f"SERVICIO {numero}", f"EL RAMAL {ramal} - {rnd.choice(ESTACIONES[linea])}",
+        f"LA LINEA {linea.split()[0].upper()}",
+    ])
+
+def _typo(palabra, rnd):
+    if len(palabra) < 4:
+        return palabra
+    i = rnd.randrange(1, len(palabra) - 1)
+    return rnd.choice([
+        palabra[:i] + palabra[i + 1] + palabra[i] + palabra[i + 2:],  # transposición
+        palabra[:i] + palabra[i + 1:],                              # omisión
+        palabra[:i] + palabra[i] + palabra[i:],                     # duplicación
+    ])
+
+CODIGOS_ESTRUCTURA = ['{c}.1.A', '{c}.2.B', '{c}.4.A', '{c}.6.C', '{c}.{e}.A']
+
+# =================================================================
+#                    GENERADOR
+# =================================================================
+
+def reglas_disponibles():
+    """(codigo, nombre, patron) de todos los estados y (forma_oficial, variante) de contingencias"""
+    estados = [(cod, info['nombre'], patron)
+               for cod, info in vm.MAP_ESTADOS_CODIGO.items() for patron in info['patrones']]
+    contingencias = [(oficial, variante)
+                     for oficial, sinonimos in vm.SINONIMOS_CONTINGENCIAS.items()
+                     for variante in [oficial, *sinonimos]]
+    return estados, contingencias
+
+def generar_mensajes(cantidad, semilla=7, prob_typo=0.15, prob_minusculas=0.1,
+                     inicio=datetime(2026, 1, 14, 5, 0)):
+    """
+    Generador de mensajes en el formato de los exports (numero_mensaje, operador,
+    fecha_hora, linea, contenido). Recorre estados y contingencias en ronda para
+    garantizar cobertura completa apenas cantidad >= cantidad de reglas.
+    """
+    rnd = random.Random(semilla)
+    estados, contingencias = reglas_disponibles()
+    lineas = list(ESTACIONES)
+    codigos_cont = sorted(set(vm.CODIGOS_CONTINGENCIA_FALLBACK.values())) + ['01', '11', '12']
+
+    for i in range(cantidad):
+        linea = rnd.choice(lineas)
+        cod_estado, nombre_estado, patron = estados[i % len(estados)]
+        oficial, variante = contingencias[i % len(contingencias)]
+
+        origen, destino = rnd.sample(ESTACIONES[linea], 2)
+        programada = inicio + timedelta(minutes=rnd.randrange(60 * 18))
+        minutos = rnd.choice([3, 5, 7, 10, 12, 15, 16, 20, 25, 40])
+        envio = programada + timedelta(minutes=minutos + rnd.randint(-30, 45), seconds=rnd.randrange(60))
+
+        partes = [
+            rnd.choice(CODIGOS_ESTRUCTURA).format(c=rnd.choice(codigos_cont).lstrip('0'), e=cod_estado),
+            _tren(linea, rnd),
+            _formatos_hora(programada.hour, programada.minute, rnd),
+            rnd.choice(RECORRIDOS).format(o=origen, d=destino),
+            frase_para_patron(patron, rnd),
+        ]
+        if nombre_estado in ('DEMORA', 'DEMORA_PARTIDA'):
+            partes.append(rnd.choice([f"{minutos} MINUTOS APROX", f"{minutos}_ MINUTOS", f"{minutos} MIN.",
+                                      f"DE {minutos} MINUTOS"]))
+        partes.append(f"POR {variante}")
+        if rnd.random() < 0.2:
+            partes.append('SEPA DISCULPAR LAS MOLESTIAS')
+
+        palabras = ' '.join(p for p in partes if p).split(' ')
+        if rnd.random() < prob_typo:
+            j = rnd.randrange(len(palabras))
+            palabras[j] = _typo(palabras[j], rnd)
+        contenido = rnd.choice([' ', ' ', '  ']).join(palabras)
+        if rnd.random() < prob_minusculas:
+            contenido = contenido.lower()
+
+        yield {
+            'numero_mensaje': f"SINT-{semilla}-{i:07d}",
+            'operador': f"Operador {rnd.randint(1, 40):02d}",
+            'fecha_hora': envio.strftime('%d/%m/%Y %H:%M:%S'),
+            'linea': linea,
+            'contenido': contenido,
+        }
+
+def escribir_corpus(mensajes, archivo_salida):
+    """NDJSON si la extensión es .ndjson/.jsonl, si no array JSON. Retorna la cantidad escrita."""
+    ndjson = archivo_salida.lower().endswith(('.ndjson', '.jsonl'))
+    total = 0
+    with open(archivo_salida, 'w', encoding='utf-8') as f:
+        if not ndjson:
+            f.write('[\n')
+        for mensaje in mensajes:
+            if total and not ndjson:
+                f.write(',\n')
+            f.write(json.dumps(mensaje, ensure_ascii=False))
+            if ndjson:
+                f.write('\n')
+            total += 1
+        if not ndjson:
+            f.write('\n]\n')
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Corpus sintético de mensajes SOFSE")
+    parser.add_argument('cantidad', type=int)
+    parser.add_argument('salida', help="Archivo .json (array) o .ndjson/.jsonl")
+    parser.add_argument('--semilla', type=int, default=7)
+    parser.add_argument('--typos', type=float, default=0.15, help="Probabilidad de typo por mensaje")
+    args = parser.parse_args()
+
+    total = escribir_corpus(generar_mensajes(args.cantidad, args.semilla, prob_typo=args.typos), args.salida)
+    estados, contingencias = reglas_disponibles()
+    print(f"✅ {total} mensajes en {args.salida} ({len(estados)} patrones de estado, {len(contingencias)} variantes de contingencia)")
@@ -0,0 +1,206 @@
+"""
+Instrumentación del Validador SOFSE - Tiempos por etapa y por regla
+
+Mide, mensaje a mensaje:
+  - Etapas del pipeline (validar_componentes, validar_tiempo_respuesta,
+    clasificar_mensaje, generar_reporte) y subetapas de validar_componentes
+    (tipo, estado, contingencia, hora, recorrido, ortografía, ...).
+  - Cada regex evaluada: cantidad de evaluaciones, coincidencias, tiempo
+    total y máximo. La clave es (subetapa, patrón), así un mensaje de 200 ms
+    se puede rastrear hasta la regex exacta.
+
+Desactivada no cuesta nada: el validador solo consulta si hay un objeto de
+estadísticas activo (ver validador_mensajes.activar_instrumentacion).
+
+Uso:
+    stats = vm.activar_instrumentacion(umbral_ms=50, callback=print)
+    vm.validar_mensaje_ROCA(mensaje, contingencias)
+    print(stats.tabla())
+    vm.desactivar_instrumentacion()
+
+Las estadísticas son por proceso: con workers > 1 los procesos del pool no
+las comparten. Dentro del proceso, la traza del mensaje en curso es por hilo.
+"""
+
+import re
+import threading
+import time
+
+reloj = time.perf_counter_ns
+
+TOP_REGLAS = 10
+
+
+class EstadisticasValidacion:
+    """
+    Acumulador de tiempos por etapa y por regla.
+    callback: función(traza) llamada al terminar cada mensaje (o solo los que
+              superan umbral_ms). traza = dict con numero_mensaje, total_ms,
+              etapas y reglas más lentas de ese mensaje.
+    """
+
+    def __init__(self, callback=None, umbral_ms=None):
+        self.callback = callback
+        self.umbral_ms = umbral_ms
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.mensajes = 0
+            # nombre -> [llamadas, ns_total, ns_max]
+            self.etapas = {}
+            # (subetapa, patron) -> [evaluaciones, coincidencias, ns_total, ns_max]
+            self.reglas = {}
+        # Estado del mensaje en curso (subetapa abierta, traza) por hilo
+        self._local = threading.local()
+
+    def _estado(self):
+        local = self._local
+        if not hasattr(local, 'traza'):
+            local.subetapa = None
+            local.t_subetapa = 0
+            local.traza = None
+        return local
+
+    # --- Registro (llamado desde el validador) --------------------------
+
+    def _sumar(self, tabla, clave, ns):
+        fila = tabla.get(clave)
+        if fila is None:
+            tabla[clave] = [1, ns, ns]
+        else:
+            fila[0] += 1
+            fila[1] += ns
+            if ns > fila[2]:
+                fila[2] = ns
+
+    def etapa(self, nombre, ns):
+        with self._lock:
+            self._sumar(self.etapas, nombre, ns)
+        traza = self._estado().traza
+        if traza is not None:
+            traza['etapas'][nombre] = traza['etapas'].get(nombre, 0) + ns
+
+    def regla(self, patron, ns, coincidio, subetapa=None):
+        local = self._estado()
+        clave = (subetapa or local.subetapa or '-', patron)
+        with self._lock:
+            fila = self.reglas.get(clave)
+            if fila is None:
+                self.reglas[clave] = [1, int(coincidio), ns, ns]
+            else:
+                fila[0] += 1
+                fila[1] += coincidio
+                fila[2] += ns
+                if ns > fila[3]:
+                    fila[3] = ns
+        if local.traza is not None:
+            local.traza['reglas'].append((clave, ns))
+
+    def marca(self, subetapa):
+        """
+        Cierra la subetapa en curso (si hay) y arranca 'subetapa'.
+        marca(None) cierra la última sin abrir otra.
+        """
+        ahora = reloj()
+        local = self._estado()
+        if local.subetapa is not None:
+            self.etapa(f"validar_componentes.{local.subetapa}", ahora - local.t_subetapa)
+        local.subetapa = subetapa
+        local.t_subetapa = ahora
+
+    def buscar(self, patron, texto, flags=0):
+        """re.search medido (el validador lo usa en lugar de re.search mientras está activo)"""
+        t0 = reloj()
+        match = re.search(patron, texto, flags)
+        self.regla(patron if isinstance(patron, str) else patron.pattern, reloj() - t0, match is not None)
+        return match
+
+    def buscar_motor(self, motor, texto):
+        """MotorReglas.buscar midiendo cada regla compilada evaluada"""
+        for clave, regex in motor.reglas:
+            t0 = reloj()
+            match = regex.search(texto)
+            self.regla(regex.pattern, reloj() - t0, match is not None)
+            if match:
+                return clave, match
+        return None, None
+
+    def iniciar_mensaje(self, mensaje):
+        local = self._estado()
+        local.subetapa = None
+        local.traza = {'numero_mensaje': mensaje.get('numero_mensaje'), 'etapas': {}, 'reglas': []}
+        return reloj()
+
+    def terminar_mensaje(self, t0):
+        total_ns = reloj() - t0
+        local = self._estado()
+        traza, local.traza = local.traza, None
+        self.etapa('validar_mensaje_ROCA', total_ns)
+        with self._lock:
+            self.mensajes += 1
+        if self.callback is None or traza is None:
+            return
+        total_ms = total_ns / 1e6
+        if self.umbral_ms is not None and total_ms < self.umbral_ms:
+            return
+        lentas = sorted(traza['reglas'], key=lambda par: par[1], reverse=True)[:TOP_REGLAS]
+        self.callback({
+            'numero_mensaje': traza['numero_mensaje'],
+            'total_ms': round(total_ms, 3),
+            'etapas': {nombre: round(ns / 1e6, 3) for nombre, ns in traza['etapas'].items()},
+            'reglas_lentas': [
+                {'subetapa': sub, 'patron': patron, 'ms': round(ns / 1e6, 3)}
+                for (sub, patron), ns in lentas
+            ]
+        })
+
+    # --- Consulta -------------------------------------------------------
+
+    def resumen(self, top=TOP_REGLAS):
+        """Totales por etapa y las reglas más costosas (por tiempo total y por peor caso)"""
+        with self._lock:
+            etapas = {
+                nombre: {
+                    'llamadas': n,
+                    'total_ms': round(total / 1e6, 3),
+                    'promedio_us': round(total / n / 1e3, 2),
+                    'max_ms': round(maximo / 1e6, 3)
+                }
+                for nombre, (n, total, maximo) in self.etapas.items()
+            }
+            reglas = [
+                {
+                    'subetapa': sub,
+                    'patron': patron,
+                    'evaluaciones': n,
+                    'coincidencias': coincidencias,
+                    'total_ms': round(total / 1e6, 3),
+                    'promedio_us': round(total / n / 1e3, 2),
+                    'max_ms': round(maximo / 1e6, 3)
+                }
+                for (sub, patron), (n, coincidencias, total, maximo) in self.reglas.items()
+            ]
+        return {
+            'mensajes': self.mensajes,
+            'etapas': dict(sorted(etapas.items(), key=lambda par: par[1]['total_ms'], reverse=True)),
+            'reglas_por_total': sorted(reglas, key=lambda r: r['total_ms'], reverse=True)[:top],
+            'reglas_por_maximo': sorted(reglas, key=lambda r: r['max_ms'], reverse=True)[:top]
+        }
+
+    def tabla(self, top=TOP_REGLAS):
+        """Resumen en texto para consola"""
+        r = self.resumen(top)
+        lineas = [f"📊 Instrumentación: {r['mensajes']} mensajes", "",
+                  f"{'ETAPA':<40}{'llamadas':>10}{'total ms':>12}{'prom µs':>10}{'max ms':>10}"]
+        for nombre, e in r['etapas'].items():
+            lineas.append(f"{nombre:<40}{e['llamadas']:>10}{e['total_ms']:>12.1f}{e['promedio_us']:>10.1f}{e['max_ms']:>10.2f}")
+        lineas += ["", f"{'REGLA (por tiempo total)':<58}{'evals':>8}{'match':>8}{'total ms':>11}{'max ms':>9}"]
+        for regla in r['reglas_por_total']:
+            nombre = f"[{regla['subetapa']}] {regla['patron']}"
+            if len(nombre) > 56:
+                nombre = nombre[:53] + '...'
+            lineas.append(f"{nombre:<58}{regla['evaluaciones']:>8}{regla['coincidencias']:>8}"
+                          f"{regla['total_ms']:>11.1f}{regla['max_ms']:>9.2f}")
+        return '\n'.join(lineas)
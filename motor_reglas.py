@@ -0,0 +1,121 @@
+"""
+Motor de Reglas SOFSE - Patrones precompilados
+
+Compila una sola vez (al importar o al cambiar la configuración) los
+patrones de MAP_ESTADOS_CODIGO y SINONIMOS_CONTINGENCIAS, para que el
+validador no reconstruya ni vuelva a buscar en la caché de `re` en cada
+mensaje.
+
+NOTA: Se evaluó una única alternación combinada con grupos nombrados
+(r0|r1|...). En CPython `re` resultó más lenta que la lista ordenada de
+patrones compilados (se pierde la optimización por prefijo literal de cada
+patrón), así que el motor evalúa las reglas compiladas en orden de prioridad.
+El resultado es idéntico al recorrido original: gana la primera regla (en
+orden de declaración) que aparezca en cualquier parte del texto.
+"""
+
+import re
+
+
+def patron_flexible(literal):
+    """Escapa un literal tolerando espacios múltiples entre palabras"""
+    return re.escape(literal).replace(r'\ ', r'\s+')
+
+
+class MotorReglas:
+    """
+    Lista ordenada de reglas compiladas.
+    reglas: iterable de (clave, patron) en orden de prioridad
+    """
+
+    def __init__(self, reglas):
+        self.reglas = [(clave, re.compile(patron)) for clave, patron in reglas]
+
+    def __len__(self):
+        return len(self.reglas)
+
+    def buscar(self, texto):
+        """
+        Retorna (clave, match) de la primera regla que aparece en el texto,
+        o (None, None) si ninguna coincide.
+        """
+        for clave, regex in self.reglas:
+            match = regex.search(texto)
+            if match:
+                return clave, match
+        return None, None
+
+
+def compilar_estados(map_estados):
+    """
+    Compila MAP_ESTADOS_CODIGO.
+    Clave de cada regla: (codigo_estado, nombre_estado)
+    """
+    return MotorReglas(
+        ((cod_estado, info_estado['nombre']), patron)
+        for cod_estado, info_estado in map_estados.items()
+        for patron in info_estado['patrones']
+    )
+
+
+def compilar_sinonimos(sinonimos_contingencias):
+    """
+    Compila SINONIMOS_CONTINGENCIAS con espacios flexibles.
+    Clave de cada regla: (forma_oficial, sinonimo)
+    """
+    return MotorReglas(
+        ((forma_oficial, sinonimo), patron_flexible(sinonimo))
+        for forma_oficial, sinonimos in sinonimos_contingencias.items()
+        for sinonimo in sinonimos
+    )
+
+
+class ContingencyIndex:
+    """
+    Índice de contingencias construido una sola vez a partir de la matriz Excel.
+
+    - codigo_por_forma: Forma_Comunicacion (upper) -> Código
+    - motor: un único MotorReglas con las formas exactas (en orden de fila)
+      seguidas de los sinónimos que tienen código resoluble.
+
+    Reemplaza el recorrido con iterrows() + regex por fila en cada mensaje;
+    pandas queda fuera del camino caliente.
+    """
+
+    def __init__(self, contingencias_df, motor_sinonimos, codigos_fallback):
+        self.codigo_por_forma = {}
+        reglas = []
+
+        col_comunicacion = None
+        if 'Forma_Comunicacion' in contingencias_df.columns:
+            col_comunicacion = 'Forma_Comunicacion'
+        elif 'Formas_de_comunicación' in contingencias_df.columns:
+            col_comunicacion = 'Formas_de_comunicación'
+
+        # 1. Formas exactas (la que va al pasajero), en orden de fila
+        if col_comunicacion and 'Código' in contingencias_df.columns:
+            formas_vistas = set()
+            for valor, codigo in zip(contingencias_df[col_comunicacion], contingencias_df['Código']):
+                codigo = str(codigo).zfill(2)
+                if isinstance(valor, str):
+                    self.codigo_por_forma.setdefault(valor.upper(), codigo)
+                forma = str(valor).upper()
+                if forma and forma != 'NAN' and forma not in formas_vistas:
+                    formas_vistas.add(forma)
+                    reglas.append(((codigo, forma), patron_flexible(forma)))
+
+        # 2. Sinónimos: el código se resuelve ahora (Excel o fallback manual).
+        # Los que no tienen código nunca podrían devolver resultado y se descartan.
+        for (forma_oficial, sinonimo), regex in motor_sinonimos.reglas:
+            codigo = self.codigo_por_forma.get(forma_oficial) if col_comunicacion else None
+            if not codigo:
+                codigo = codigos_fallback.get(forma_oficial)
+            if codigo:
+                reglas.append(((codigo, sinonimo), regex))
+
+        self.motor = MotorReglas(reglas)
+
+    def buscar(self, contenido_upper):
+        """Retorna (codigo_contingencia, forma_comunicacion) o (None, None)"""
+        clave, _ = self.motor.buscar(contenido_upper)
+        return clave or (None, None)
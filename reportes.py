@@ -0,0 +1,179 @@
+"""
+Reportes SOFSE - Tipos compactos del resultado de validación
+
+En modo lote se retienen cientos de miles de reportes. Cada dict anidado
+(reporte, componentes, scores, timing) cuesta cientos de bytes más que un
+objeto con __slots__, y las listas vacías de advertencias o errores son
+una asignación por mensaje. Estos tipos guardan lo mismo en slots y tuplas
+(la tupla vacía es un único objeto compartido).
+
+Los valores enumerados (nivel_general, tipo_mensaje, clasificaciones de
+scores y timing) se internan al construir: un reporte que vuelve de un
+worker (pickle) no trae su propia copia de 'IMPORTANTE' o 'COMPLETO'.
+
+Compatibilidad: todos se leen como un dict de solo lectura
+(reporte['nivel_general'], reporte['scores']['timing']['clasificacion'],
+.get(), .items()) y to_dict() devuelve exactamente el dict anidado de
+antes, listo para json.dumps.
+"""
+
+import sys
+from collections.abc import Mapping
+
+
+def _interno(valor):
+    return sys.intern(valor) if type(valor) is str else valor
+
+
+def _a_dict(valor):
+    if isinstance(valor, _Compacto):
+        return valor.to_dict()
+    if type(valor) is tuple:
+        return list(valor)
+    if type(valor) is dict:
+        return dict(valor)
+    return valor
+
+
+class _Compacto(Mapping):
+    """
+    Base de los tipos del reporte.
+    _CLAVES: claves visibles como dict, en el orden del dict original
+    (pueden incluir propiedades derivadas que no ocupan slot).
+    """
+
+    __slots__ = ()
+    _CLAVES = ()
+
+    def __getitem__(self, clave):
+        if clave in self._CLAVES:
+            return getattr(self, clave)
+        raise KeyError(clave)
+
+    def __iter__(self):
+        return iter(self._CLAVES)
+
+    def __len__(self):
+        return len(self._CLAVES)
+
+    def __reduce__(self):
+        # Se reconstruye por __init__: al volver de un worker se re-internan los enumerados
+        return type(self), tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __repr__(self):
+        campos = ', '.join(f"{clave}={getattr(self, clave)!r}" for clave in self._CLAVES)
+        return f"{type(self).__name__}({campos})"
+
+    def to_dict(self):
+        """Dict anidado equivalente (listas y dicts nuevos: se puede modificar)"""
+        return {clave: _a_dict(getattr(self, clave)) for clave in self._CLAVES}
+
+
+class Componentes(_Compacto):
+    """Componentes A-F del mensaje y el resultado de ortografía y formato"""
+
+    __slots__ = _CLAVES = ('tipo_mensaje', 'A', 'B', 'C', 'D', 'E', 'F', 'estructura_valida',
+                           'ortografia_valida', 'errores_ortografia', 'advertencias_formato')
+
+    def __init__(self, tipo_mensaje, A, B, C, D, E, F, estructura_valida,
+                 ortografia_valida, errores_ortografia=(), advertencias_formato=()):
+        self.tipo_mensaje = _interno(tipo_mensaje)
+        self.A = A
+        self.B = B
+        self.C = C
+        self.D = D
+        self.E = E
+        self.F = F
+        self.estructura_valida = estructura_valida
+        self.ortografia_valida = ortografia_valida
+        self.errores_ortografia = tuple(errores_ortografia)
+        self.advertencias_formato = tuple(advertencias_formato)
+
+    @classmethod
+    def desde_dict(cls, componentes):
+        """A partir del dict que arma validar_componentes"""
+        return cls(*(componentes.get(clave) for clave in cls._CLAVES[:9]),
+                   componentes.get('errores_ortografia', ()),
+                   componentes.get('advertencias_formato', ()))
+
+
+class Clasificacion(_Compacto):
+    """Observaciones por severidad (sin repetidos, en orden de aparición)"""
+
+    __slots__ = _CLAVES = ('IMPORTANTE', 'OBSERVACIONES', 'SUGERENCIAS')
+
+    def __init__(self, IMPORTANTE=(), OBSERVACIONES=(), SUGERENCIAS=()):
+        self.IMPORTANTE = tuple(IMPORTANTE)
+        self.OBSERVACIONES = tuple(OBSERVACIONES)
+        self.SUGERENCIAS = tuple(SUGERENCIAS)
+
+
+class Timing(_Compacto):
+    """Resultado de validar_tiempo_respuesta"""
+
+    __slots__ = _CLAVES = ('tardanza_minutos', 'clasificacion', 'nivel', 'hora_programada',
+                           'minutos_demora', 'hora_referencia', 'hora_envio', 'es_cancelacion')
+
+    def __init__(self, tardanza_minutos, clasificacion, nivel, hora_programada,
+                 minutos_demora, hora_referencia, hora_envio, es_cancelacion):
+        self.tardanza_minutos = tardanza_minutos
+        self.clasificacion = _interno(clasificacion)
+        self.nivel = _interno(nivel)
+        self.hora_programada = hora_programada
+        self.minutos_demora = minutos_demora
+        self.hora_referencia = hora_referencia
+        self.hora_envio = hora_envio
+        self.es_cancelacion = es_cancelacion
+
+
+class Score(_Compacto):
+    __slots__ = _CLAVES = ('clasificacion', 'detalles')
+
+    def __init__(self, clasificacion, detalles=()):
+        self.clasificacion = _interno(clasificacion)
+        self.detalles = tuple(detalles)
+
+
+class Scores(_Compacto):
+    """Los 3 scores independientes de calcular_scores"""
+
+    __slots__ = _CLAVES = ('componentes', 'timing', 'estructura')
+
+    def __init__(self, componentes, timing, estructura):
+        self.componentes = componentes
+        self.timing = timing
+        self.estructura = estructura
+
+
+class Reporte(_Compacto):
+    """
+    Reporte de un mensaje. tipo_mensaje y requiere_notificacion se derivan
+    (de componentes y nivel_general) en lugar de guardarse.
+    """
+
+    __slots__ = ('numero_mensaje', 'operador', 'fecha_hora', 'linea', 'contenido',
+                 'componentes', 'clasificacion', 'nivel_general', 'timing', 'scores')
+    _CLAVES = ('numero_mensaje', 'operador', 'fecha_hora', 'linea', 'contenido', 'tipo_mensaje',
+               'componentes', 'clasificacion', 'nivel_general', 'timing', 'scores',
+               'requiere_notificacion')
+
+    def __init__(self, numero_mensaje, operador, fecha_hora, linea, contenido,
+                 componentes, clasificacion, nivel_general, timing, scores):
+        self.numero_mensaje = numero_mensaje
+        self.operador = operador
+        self.fecha_hora = fecha_hora
+        self.linea = linea
+        self.contenido = contenido
+        self.componentes = componentes
+        self.clasificacion = clasificacion
+        self.nivel_general = _interno(nivel_general)
+        self.timing = timing
+        self.scores = scores
+
+    @property
+    def tipo_mensaje(self):
+        return self.componentes.tipo_mensaje
+
+    @property
+    def requiere_notificacion(self):
+        return self.nivel_general in ('IMPORTANTE', 'OBSERVACIONES')
@@ -0,0 +1,468 @@
+"""
+Tokenizador SOFSE - Extracción de componentes en una sola pasada
+
+Tokeniza una vez el mensaje normalizado (espacios simples, mayúsculas) y
+extrae desde la lista de tokens los componentes que antes salían de una
+cascada de regex sobre el texto completo:
+  - D: hora programada (DE LAS HHMM HS, DE LAS HH:MM HS, HS HH:MM, LAS HH MM, HH MM HS)
+  - E: recorrido (DESDE/DE ... HACIA/A ..., ENTRE ... Y ..., DE ... A ...)
+  - B: minutos de demora (incluye typos como "5_ MINUTOS" o "_7 MIN")
+  - A: nombre de servicio/ramal (mensajes de servicio general)
+  - D: lugar (mensajes de servicio general)
+
+Cada extractor reproduce exactamente el resultado de la regex que reemplaza
+(incluidas sus rarezas: "DE" o "LAS" como sufijo de otra palabra, palabras de
+corte que son prefijos como FUE/FUERZA, etc.); el patrón original figura en
+el docstring de cada método.
+
+Nada retrocede sobre el texto: cada captura perezosa recorre los tokens hacia
+adelante y memoiza su final, así que varias palabras clave repetidas
+(DE ... DE ... A ... A ...) no vuelven a recorrer los mismos tokens. Las
+regex originales podían tardar segundos en esos casos (DE X A Y repetido
+cientos de veces); acá el costo es lineal en la cantidad de tokens.
+
+Tipos de token:
+  palabra - corrida de letras [A-ZÁÉÍÓÚÑ]
+  número  - corrida de dígitos
+  símbolo - cualquier otro caracter (uno por token)
+
+Los tokens se guardan como columnas paralelas armadas con map/accumulate
+(sin un objeto por token: crearlos costaba más que las regex que reemplaza),
+y solo se tokeniza si algún extractor pasa su chequeo previo sobre el texto.
+"""
+
+import re
+from bisect import bisect_right
+from itertools import accumulate
+from operator import itemgetter, ne
+
+# ( ?) = espacio previo: el texto está normalizado, entre tokens hay a lo sumo uno
+_RE_TOKEN = re.compile(r' ?(?:\d+|[A-ZÁÉÍÓÚÑ]+|\S)')
+_LETRAS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZÁÉÍÓÚÑ')
+_PRIMER_CARACTER = itemgetter(0)
+_ASCII_MAYUS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+# Palabras que terminan en la clave y van seguidas de espacio
+_SUFIJO_DE = re.compile(r'DE ')
+_SUFIJO_A = re.compile(r'A ')
+_SUFIJO_LAS = re.compile(r'LAS ')
+_SUFIJO_EN = re.compile(r'EN ')
+_SUFIJO_ENTRE = re.compile(r'ENTRE ')
+_SUFIJO_SERVICIO = re.compile(r'(?:SERVICIO|RAMAL|L[ÍI]NEA) ')
+
+_CLAVES_MINUTOS = re.compile(r'DEMORA|REGISTRA|ESPERA')
+
+# Clases de caracteres de las capturas originales (además de letras y espacio)
+_SIMB_RECORRIDO = '.'      # [A-ZÁÉÍÓÚÑ0-9\s\.]
+_SIMB_ESTACION = '.()'     # [A-ZÁÉÍÓÚÑ\s\.\(\)]
+_SIMB_LUGAR = '.'          # [A-ZÁÉÍÓÚÑ\s\.]
+_SIMB_SERVICIO = '-.'      # [A-ZÁÉÍÓÚÑ\s\-\.]
+
+# Separadores entre hora y minutos
+_SEP_HORA = (':', '.')            # [\s:\.]
+_SEP_HORA_FLEX = (':', '.', '_')  # [\s:\._]
+
+
+class MensajeTokenizado:
+    """
+    Texto en mayúsculas ya normalizado + sus tokens (calculados al primer uso).
+    textos[i]: contenido del token i
+    esp[i]: True si hay un espacio inmediatamente antes
+    num[i] / pal[i]: True si el token es número / palabra
+    fines[i]: posición en el texto donde termina el token i
+    Los extractores devuelven lo mismo que los grupos de la regex original.
+    """
+
+    def __init__(self, texto_upper):
+        self.texto = texto_upper
+        self.textos = None
+        self._indices_sufijo = {}
+        self._fin_captura = {}
+
+    def _tokenizar(self):
+        if self.textos is not None:
+            return
+        texto = self.texto
+        crudos = _RE_TOKEN.findall(texto)
+        # Todo con map/accumulate: sin bucles Python por token
+        self.textos = textos = list(map(str.lstrip, crudos))
+        self.esp = list(map(ne, crudos, textos))
+        self.num = list(map(str.isdecimal, textos))
+        self.pal = list(map(_LETRAS.__contains__, map(_PRIMER_CARACTER, textos)))
+        self.fines = list(accumulate(map(len, crudos)))
+
+    def tokens(self):
+        """Textos de los tokens, en orden (tokeniza si hace falta)"""
+        self._tokenizar()
+        return self.textos
+
+    # --- Utilidades -------------------------------------------------------
+
+    def _es(self, i, texto):
+        return i < len(self.textos) and self.textos[i] == texto
+
+    def _empieza(self, i, prefijos):
+        return i < len(self.textos) and self.pal[i] and self.textos[i].startswith(prefijos)
+
+    def _espaciado(self, i):
+        """El token i existe y está precedido por espacio"""
+        return i < len(self.esp) and self.esp[i]
+
+    def _numero(self, i, largos=None):
+        """El token i es un número (opcionalmente de alguno de los largos dados)"""
+        return i < len(self.num) and self.num[i] and (largos is None or len(self.textos[i]) in largos)
+
+    def _palabra(self, i):
+        """\\w de re para el token i: alfanuméricos (str.isalnum) y '_'"""
+        texto = self.textos[i]
+        return texto.isalnum() or texto == '_'
+
+    def _frontera(self, i):
+        """\\b antes del token i (que empieza con caracter de palabra)"""
+        return i == 0 or self.esp[i] or not self._palabra(i - 1)
+
+    def _texto(self, i, j):
+        """Texto original de los tokens i..j"""
+        inicio = self.fines[i - 1] + self.esp[i] if i else 0
+        return self.texto[inicio:self.fines[j]]
+
+    def _sufijos(self, patron):
+        """Índices de palabras que terminan en la clave y van seguidas de espacio (cacheado)"""
+        indices = self._indices_sufijo.get(patron)
+        if indices is None:
+            posiciones = [m.start() for m in patron.finditer(self.texto)]
+            if posiciones:
+                self._tokenizar()
+                fines = self.fines
+                indices = [bisect_right(fines, posicion) for posicion in posiciones]
+            else:
+                indices = []
+            self._indices_sufijo[patron] = indices
+        return indices
+
+    def _capturar(self, inicio, simbolos, es_corte, digitos=False, min_largo=1, primera_letra=False):
+        """
+        Captura perezosa [clase]+? desde el token 'inicio': primer token j tal
+        que después de j venga espacio + palabra de corte (es_corte(j + 1)), o None.
+        El final se memoiza por token: todos los inicios recorridos hasta un
+        corte comparten ese corte.
+        """
+        total = len(self.textos)
+        if inicio >= total or (primera_letra and not self.pal[inicio]):
+            return None
+        memo = self._fin_captura.setdefault((simbolos, digitos, es_corte), {})
+        fin = self._fin_memoizado(inicio, memo, simbolos, es_corte, digitos)
+        if fin == inicio and len(self.textos[inicio]) < min_largo:
+            # Un solo token demasiado corto: la captura sigue hasta el próximo corte
+            fin = self._fin_memoizado(inicio + 1, memo, simbolos, es_corte, digitos) if inicio + 1 < total else None
+        return fin
+
+    def _fin_memoizado(self, inicio, memo, simbolos, es_corte, digitos):
+        if inicio in memo:
+            return memo[inicio]
+        textos, esp, num, pal = self.textos, self.esp, self.num, self.pal
+        total = len(textos)
+        recorridos = []
+        fin = None
+        for j in range(inicio, total):
+            if j in memo:
+                fin = memo[j]
+                break
+            recorridos.append(j)
+            # Clase: letras, dígitos ASCII (si 'digitos') y los 'simbolos' dados
+            if not pal[j] and not ((digitos and textos[j].isascii()) if num[j] else textos[j] in simbolos):
+                break
+            if j + 1 < total and esp[j + 1] and es_corte(j + 1):
+                fin = j
+                break
+        for j in recorridos:
+            memo[j] = fin
+        return fin
+
+    def _separadores(self, i, separadores):
+        """Salta tokens separadores desde i; retorna el índice del primer token que no lo es"""
+        while i < len(self.textos) and self.textos[i] in separadores:
+            i += 1
+        return i
+
+    # --- D: Hora programada ---------------------------------------------
+
+    def _de_las(self, i):
+        """i termina en DE, seguido de ' LAS ' y un número: retorna el índice del número"""
+        if self.textos[i + 1] == 'LAS' and self._espaciado(i + 2) and self.num[i + 2]:
+            return i + 2
+        return None
+
+    def hora_4dig(self):
+        """DE\\s+LAS\\s+(\\d{2})(\\d{2})\\s*HS"""
+        if 'DE LAS ' not in self.texto:
+            return None
+        for i in self._sufijos(_SUFIJO_DE):
+            n = self._de_las(i)
+            if n is not None and len(self.textos[n]) == 4 and self._empieza(n + 1, 'HS'):
+                return self.textos[n][:2], self.textos[n][2:]
+        return None
+
+    def hora_separada(self):
+        """
+        DE\\s+LAS\\s+(\\d{1,2})[\\s:\\.]+(\\d{2})\\s*HS
+        Retorna (hh, mm, usa_dos_puntos) o None.
+        """
+        if 'DE LAS ' not in self.texto:
+            return None
+        for i in self._sufijos(_SUFIJO_DE):
+            n = self._de_las(i)
+            if n is None or len(self.textos[n]) > 2:
+                continue
+            m = self._separadores(n + 1, _SEP_HORA)
+            if self._numero(m, (2,)) and self._empieza(m + 1, 'HS'):
+                return self.textos[n], self.textos[m], ':' in self.textos[n + 1:m]
+        return None
+
+    def _hh_mm(self, n, separadores):
+        """(\\d{1,2})[sep]*(\\d{2}) empezando en el número n, sin nada obligatorio después"""
+        texto = self.textos[n]
+        if len(texto) >= 4:
+            return texto[:2], texto[2:4]
+        if len(texto) == 3:
+            return texto[0], texto[1:3]
+        m = self._separadores(n + 1, separadores)
+        if self._numero(m) and len(self.textos[m]) >= 2:
+            return texto, self.textos[m][:2]
+        return None
+
+    def hora_invertida(self):
+        """HS\\.?\\s*(\\d{1,2})[\\s:\\.]*(\\d{2})"""
+        if 'HS' not in self.texto:
+            return None
+        self._tokenizar()
+        for i, texto in enumerate(self.textos):
+            if not texto.endswith('HS'):
+                continue
+            n = i + 1
+            if self._es(n, '.') and not self.esp[n]:
+                n += 1
+            if self._numero(n):
+                hora = self._hh_mm(n, _SEP_HORA)
+                if hora:
+                    return hora
+        return None
+
+    def hora_flexible(self):
+        """
+        (?:(?:A|DE)?\\s+)?LAS\\s+(\\d{1,2})[\\s:\\._]+(\\d{2})
+        y si no aparece: \\b(\\d{1,2})[\\s:\\._]+(\\d{2})\\s*HS
+        """
+        for i in self._sufijos(_SUFIJO_LAS):
+            n = i + 1
+            if not self._numero(n, (1, 2)):
+                continue
+            m = self._separadores(n + 1, _SEP_HORA_FLEX)
+            if self._numero(m) and len(self.textos[m]) >= 2:
+                return self.textos[n], self.textos[m][:2]
+
+        if 'HS' not in self.texto:
+            return None
+        self._tokenizar()
+        textos = self.textos
+        for n, es_numero in enumerate(self.num):
+            if not es_numero or len(textos[n]) > 2 or not self._frontera(n):
+                continue
+            m = self._separadores(n + 1, _SEP_HORA_FLEX)
+            if self._numero(m, (2,)) and self._empieza(m + 1, 'HS'):
+                return textos[n], textos[m]
+        return None
+
+    def tiene_de_las(self):
+        """DE\\s+LAS"""
+        return 'DE LAS' in self.texto
+
+    # --- E: Recorrido -----------------------------------------------------
+
+    def _corte_origen(self, k):
+        # (?=\s+(?:HACIA|A\s+[A-Z]|CON\s+|CIRCULA|HA\s+|FUE|Y\s+|PARTIO|DETENIDO|\(|LLEGA))
+        texto = self.textos[k]
+        if texto == '(':
+            return True
+        if not self.pal[k]:
+            return False
+        if texto.startswith(('HACIA', 'CIRCULA', 'FUE', 'PARTIO', 'DETENIDO', 'LLEGA')):
+            return True
+        if texto == 'A':
+            return self._espaciado(k + 1) and self.textos[k + 1][0] in _ASCII_MAYUS
+        return texto in ('CON', 'HA', 'Y') and self._espaciado(k + 1)
+
+    def _corte_destino(self, k):
+        # (?=\s+(?:CIRCULA|HA\s+|FUE|CON\s+|REGISTRA|SE\s+ENCUENTRA|POR\s+|O\s+TRAS|
+        #          RESTABLECE|PARTIO|Y\s+|\(|EN\s+ESTACION|SE\s+|$))
+        texto = self.textos[k]
+        if texto == '(':
+            return True
+        if not self.pal[k]:
+            return False
+        if texto.startswith(('CIRCULA', 'FUE', 'REGISTRA', 'RESTABLECE', 'PARTIO')):
+            return True
+        if texto in ('HA', 'CON', 'POR', 'Y', 'SE'):
+            return self._espaciado(k + 1)
+        if texto == 'O':
+            return self._espaciado(k + 1) and self._empieza(k + 1, 'TRAS')
+        if texto == 'EN':
+            return self._espaciado(k + 1) and self._empieza(k + 1, 'ESTACION')
+        return False
+
+    def _corte_variante(self, k):
+        # (?=\s+(?:CIRCULA|HA\s+SIDO|FUE|CON\s+DEMORA|$))
+        texto = self.textos[k]
+        if not self.pal[k]:
+            return False
+        if texto.startswith(('CIRCULA', 'FUE')):
+            return True
+        if texto == 'HA':
+            return self._espaciado(k + 1) and self._empieza(k + 1, 'SIDO')
+        if texto == 'CON':
+            return self._espaciado(k + 1) and self._empieza(k + 1, 'DEMORA')
+        return False
+
+    def origen(self):
+        """(?:PARTIENDO\\s+(?:DE|DESDE)|DESDE|DE)\\s+([A-ZÁÉÍÓÚÑ0-9\\s\\.]+?)(?=corte origen)"""
+        # PARTIENDO DE / DESDE / DE capturan lo mismo que el DE final: basta con el sufijo DE
+        for i in self._sufijos(_SUFIJO_DE):
+            j = self._capturar(i + 1, _SIMB_RECORRIDO, self._corte_origen, digitos=True)
+            if j is not None:
+                return self._texto(i + 1, j).strip()
+        return None
+
+    def destino(self):
+        """(?:HACIA|LLEGA\\s+A|FINALIZA\\s+EN|A)\\s+([A-ZÁÉÍÓÚÑ0-9\\s\\.]+?)(?=corte destino)"""
+        for i in self._sufijos(_SUFIJO_A):
+            inicios = []
+            # LLEGA A / FINALIZA EN empiezan antes que la A final de la palabra: van primero
+            palabra = self.textos[i]
+            if palabra.endswith('LLEGA') and self._es(i + 1, 'A') and self._espaciado(i + 2):
+                inicios.append(i + 2)
+            elif palabra.endswith('FINALIZA') and self._es(i + 1, 'EN') and self._espaciado(i + 2):
+                inicios.append(i + 2)
+            # HACIA captura lo mismo que su A final
+            inicios.append(i + 1)
+            for inicio in inicios:
+                j = self._capturar(inicio, _SIMB_RECORRIDO, self._corte_destino, digitos=True)
+                if j is not None:
+                    return self._texto(inicio, j).strip()
+        return None
+
+    def _par_estaciones(self, patron_clave, conector):
+        """patron_clave\\s+(X)\\s+conector\\s+(Y)(?=corte variante), X/Y = [A-ZÁÉÍÓÚÑ][A-ZÁÉÍÓÚÑ\\s\\.\\(\\)]+?"""
+        def es_conector(k):
+            return self.textos[k] == conector and self._espaciado(k + 1)
+
+        # Primer (j1, j2) válido desde cada conector candidato j1: solo depende
+        # de j1, así que los conectores descartados no se vuelven a probar
+        # desde la siguiente palabra clave.
+        pares = {}
+
+        def primer_par(j1):
+            recorridos = []
+            par = None
+            while j1 is not None:
+                if j1 in pares:
+                    par = pares[j1]
+                    break
+                recorridos.append(j1)
+                j2 = self._capturar(j1 + 2, _SIMB_ESTACION, self._corte_variante,
+                                    min_largo=2, primera_letra=True)
+                if j2 is not None:
+                    par = (j1, j2)
+                    break
+                # El conector es parte de la clase: la captura perezosa sigue desde él
+                j1 = self._capturar(j1 + 1, _SIMB_ESTACION, es_conector)
+            for j in recorridos:
+                pares[j] = par
+            return par
+
+        for i in self._sufijos(patron_clave):
+            j1 = self._capturar(i + 1, _SIMB_ESTACION, es_conector, min_largo=2, primera_letra=True)
+            par = primer_par(j1)
+            if par:
+                j1, j2 = par
+                return self._texto(i + 1, j1).strip(), self._texto(j1 + 2, j2).strip()
+        return None
+
+    def entre(self):
+        """ENTRE ... Y ... → (origen, destino) o None"""
+        return self._par_estaciones(_SUFIJO_ENTRE, 'Y')
+
+    def de_a(self):
+        """(?:SALIENDO\\s+|SALE\\s+)?DE ... A ... → (origen, destino) o None"""
+        return self._par_estaciones(_SUFIJO_DE, 'A')
+
+    # --- B: Minutos de demora --------------------------------------------
+
+    def minutos(self):
+        """
+        (?:DEMORAS?|REGISTRA|ESPERA)(?:[\\s\\w]*?)(?:DE\\s*|DE_|OBSERVA\\s+)?([_\\-\\.]?)\\s*(\\d+)\\s*([_\\-\\.]?)\\s*(?:MINUTOS?|MIN\\.?)
+        Retorna (prefijo, minutos, sufijo) o None.
+        """
+        posiciones = [m.start() for m in _CLAVES_MINUTOS.finditer(self.texto)]
+        if not posiciones:
+            return None
+        self._tokenizar()
+        textos, num, fines = self.textos, self.num, self.fines
+        # Las claves anteriores a un corte ya recorrido terminan en ese mismo corte
+        hasta = -1
+        for posicion in posiciones:
+            i = bisect_right(fines, posicion)
+            if i <= hasta:
+                continue
+            # Desde la palabra clave solo se avanza por [\s\w]; un [-.] pegado
+            # (o con un espacio) antes de los dígitos se toma como prefijo.
+            hasta = len(textos)
+            for j in range(i + 1, len(textos)):
+                if num[j]:
+                    resultado = self._minutos_desde(j, '_' if textos[j - 1] == '_' else '')
+                    if resultado:
+                        return resultado
+                elif not self._palabra(j):
+                    if textos[j] in ('-', '.') and self._numero(j + 1):
+                        resultado = self._minutos_desde(j + 1, textos[j])
+                        if resultado:
+                            return resultado
+                    hasta = j
+                    break
+        return None
+
+    def _minutos_desde(self, n, prefijo):
+        k = n + 1
+        sufijo = ''
+        if k < len(self.textos) and self.textos[k] in ('_', '-', '.'):
+            sufijo = self.textos[k]
+            k += 1
+        if self._empieza(k, 'MIN'):
+            return prefijo, self.textos[n], sufijo
+        return None
+
+    # --- Servicio general ------------------------------------------------
+
+    def nombre_servicio(self):
+        """(?:SERVICIO|RAMAL|L[ÍI]NEA)\\s+([A-ZÁÉÍÓÚÑ\\s\\-\\.]+?)(?:\\s+SE\\s+|\\s+CIRCULA|\\s+HA\\s+)"""
+        def es_corte(k):
+            if self._empieza(k, 'CIRCULA'):
+                return True
+            return self.textos[k] in ('SE', 'HA') and self._espaciado(k + 1)
+
+        for i in self._sufijos(_SUFIJO_SERVICIO):
+            j = self._capturar(i + 1, _SIMB_SERVICIO, es_corte)
+            if j is not None:
+                return self._texto(i + 1, j).strip()
+        return None
+
+    def lugar(self):
+        """\\bEN\\s+([A-ZÁÉÍÓÚÑ\\s\\.]+?)(?=\\s+(?:DISCULPA|SEPA|\\.|$))"""
+        def es_corte(k):
+            return self.textos[k] == '.' or self._empieza(k, ('DISCULPA', 'SEPA'))
+
+        for i in self._sufijos(_SUFIJO_EN):
+            if self.textos[i] == 'EN' and self._frontera(i):
+                j = self._capturar(i + 1, _SIMB_LUGAR, es_corte)
+                if j is not None:
+                    return self._texto(i + 1, j).strip()
+        return None
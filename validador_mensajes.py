@@ -29,6 +29,13 @@ import glob
 import os
 import sys
 import io
+import copy
+import time
+import functools
+import threading
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 # Forzar UTF-8 en consola Windows para evitar error con emojis
 # Forzar UTF-8 en consola Windows para evitar error con emojis
@@ -46,43 +53,191 @@ if sys.platform == 'win32':
 
 from datetime import datetime, timedelta
 
+from motor_reglas import ContingencyIndex, compilar_estados, compilar_sinonimos
+from instrumentacion import EstadisticasValidacion, reloj as reloj_ns
+from tokenizador import MensajeTokenizado
+from estaciones import compilar_nomenclador
+from cache_resultados import CacheResultados, clave_contenido
+from reportes import Reporte, Componentes, Clasificacion, Timing, Score, Scores
+
 # Corrector ortográfico liviano (pyspellchecker)
 try:
     from spellchecker import SpellChecker
     CORRECTOR_DISPONIBLE = True
-    # Inicializar corrector (se puede mover a una variable global o lazy load)
-    spell = SpellChecker(language='es')
 except ImportError:
+    SpellChecker = None
     CORRECTOR_DISPONIBLE = False
-    spell = None
 
-def cargar_config(linea="ROCA"):
-    """Carga configuración específica de la línea"""
+# Lazy load: el diccionario de frecuencias se carga en el primer uso
+spell = None
+_SPELL_LOCK = threading.Lock()
+
+# Máximo de palabras distintas cacheadas (por cada caché del corrector)
+CORRECTOR_CACHE_MAX = 20000
+
+def obtener_corrector():
+    """Devuelve el SpellChecker, inicializándolo en el primer uso (o None si no está disponible)"""
+    global spell, CORRECTOR_DISPONIBLE
+    if spell is None and CORRECTOR_DISPONIBLE:
+        with _SPELL_LOCK:
+            if spell is None:
+                try:
+                    spell = SpellChecker(language='es')
+                except Exception as e:
+                    print(f"❌ Error inicializando corrector: {e}")
+                    CORRECTOR_DISPONIBLE = False
+    return spell
+
+@functools.lru_cache(maxsize=CORRECTOR_CACHE_MAX)
+def palabra_conocida(word):
+    """True si el corrector NO reporta la palabra como desconocida (word en minúsculas)"""
+    return not obtener_corrector().unknown([word])
+
+@functools.lru_cache(maxsize=CORRECTOR_CACHE_MAX)
+def corregir_palabra(word):
+    """Corrección más probable para la palabra (o None)"""
+    return obtener_corrector().correction(word)
+
+def estadisticas_corrector():
+    """Hits/misses de las cachés del corrector"""
+    return {
+        'inicializado': spell is not None,
+        'conocida': palabra_conocida.cache_info()._asdict(),
+        'correccion': corregir_palabra.cache_info()._asdict()
+    }
+
+def limpiar_cache_corrector():
+    palabra_conocida.cache_clear()
+    corregir_palabra.cache_clear()
+
+# =================================================================
+#                    INSTRUMENTACIÓN (OPCIONAL)
+# =================================================================
+
+# None = desactivada: el pipeline usa re.search y los motores directamente,
+# sin medir nada. Ver instrumentacion.py.
+_INSTRUMENTACION = None
+
+def activar_instrumentacion(callback=None, umbral_ms=None):
+    """
+    Activa la medición por etapa y por regla en este proceso.
+    callback(traza) se llama por mensaje (solo los que superan umbral_ms, si se indica).
+    Retorna el EstadisticasValidacion para consultar resumen() / tabla().
+    """
+    global _INSTRUMENTACION
+    _INSTRUMENTACION = EstadisticasValidacion(callback=callback, umbral_ms=umbral_ms)
+    return _INSTRUMENTACION
+
+def desactivar_instrumentacion():
+    """Desactiva la medición. Retorna las estadísticas acumuladas (o None)"""
+    global _INSTRUMENTACION
+    stats, _INSTRUMENTACION = _INSTRUMENTACION, None
+    return stats
+
+def obtener_instrumentacion():
+    return _INSTRUMENTACION
+
+# =================================================================
+#                    CONFIGURACIÓN POR LÍNEA (CACHÉ)
+# =================================================================
+
+# Caché de configs por línea normalizada. Cada entrada guarda el archivo
+# usado, su firma (mtime_ns, size), el config parseado y las palabras
+# técnicas ya en mayúsculas. Se revalida contra el disco como máximo una
+# vez cada CONFIG_INTERVALO_REVALIDACION segundos, así que las ediciones
+# en configs/ se toman sin reiniciar.
+CONFIG_INTERVALO_REVALIDACION = 2.0
+_CONFIG_CACHE = {}
+
+_SIN_TILDES_LINEA = str.maketrans('áéíóú', 'aeiou')
+
+def _normalizar_linea(linea):
+    """Normaliza el nombre de línea a la clave de archivo (config_<linea>.json)"""
+    if not linea: linea = "ROCA"
+    # Sin tildes: "Línea San Martín (Manual)" también es san_martin
+    nombre_clean = linea.strip().lower().translate(_SIN_TILDES_LINEA).replace(' ', '_')
+    if 'san_martin' in nombre_clean: nombre_clean = 'san_martin'
+    return nombre_clean
+
+def _resolver_path_config(nombre_clean):
+    """Path del config de la línea, fallback a ROCA, o None si no hay ninguno"""
+    # Buscar path relativo a este script
+    base_path = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(base_path, "configs", f"config_{nombre_clean}.json")
+    if os.path.exists(path):
+        return path
+    # Fallback a ROCA si no existe (para compatibilidad)
+    path_roca = os.path.join(base_path, "configs", "config_roca.json")
+    if os.path.exists(path_roca):
+        return path_roca
+    return None
+
+def _firma_archivo(path):
+    if not path:
+        return None
     try:
-        # Normalizar nombre línea
-        if not linea: linea = "ROCA"
-        nombre_clean = linea.strip().lower().replace(' ', '_')
-        if 'san_martin' in nombre_clean: nombre_clean = 'san_martin'
-        
-        # Buscar path relativo a este script
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        path = os.path.join(base_path, "configs", f"config_{nombre_clean}.json")
-        
-        if os.path.exists(path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def obtener_config(linea="ROCA"):
+    """
+    Config memoizada de la línea.
+    Retorna: (config, palabras_tecnicas) con palabras_tecnicas como frozenset en mayúsculas.
+    El dict devuelto es compartido: no modificarlo.
+    """
+    nombre_clean = _normalizar_linea(linea)
+    ahora = time.monotonic()
+    entrada = _CONFIG_CACHE.get(nombre_clean)
+    if entrada and ahora - entrada['verificado'] < CONFIG_INTERVALO_REVALIDACION:
+        return entrada['config'], entrada['palabras_tecnicas']
+
+    path, firma = None, None
+    try:
+        path = _resolver_path_config(nombre_clean)
+        firma = _firma_archivo(path)
+        if entrada and entrada['path'] == path and entrada['firma'] == firma:
+            entrada['verificado'] = ahora
+            return entrada['config'], entrada['palabras_tecnicas']
+
+        config = {"palabras_tecnicas": []}
+        if path:
             with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        else:
-            # Fallback a ROCA si no existe (para compatibilidad)
-            # print(f"⚠️ Config no encontrada para {linea}, usando ROCA por defecto")
-            path_roca = os.path.join(base_path, "configs", "config_roca.json")
-            if os.path.exists(path_roca):
-                with open(path_roca, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {"palabras_tecnicas": []}
-            
+                config = json.load(f)
     except Exception as e:
+        # Se cachea el default con la firma actual: un archivo roto no se
+        # re-parsea en cada mensaje, pero se relee apenas lo corrijan.
         print(f"❌ Error cargando config: {e}")
-        return {"palabras_tecnicas": []}
+        config = {"palabras_tecnicas": []}
+
+    palabras_tecnicas = frozenset(word.upper() for word in config.get('palabras_tecnicas', []))
+    _CONFIG_CACHE[nombre_clean] = {
+        'path': path,
+        'firma': firma,
+        'config': config,
+        'palabras_tecnicas': palabras_tecnicas,
+        'verificado': ahora
+    }
+    return config, palabras_tecnicas
+
+def cargar_config(linea="ROCA"):
+    """Carga configuración específica de la línea (copia del config cacheado)"""
+    config, _ = obtener_config(linea)
+    return copy.deepcopy(config)
+
+def obtener_nomenclador(linea="ROCA"):
+    """
+    Nomenclador de estaciones de la línea (clave 'estaciones' del config).
+    Se compila una vez por versión del archivo: vive en la misma entrada de
+    _CONFIG_CACHE, que se reemplaza cuando el config cambia en disco.
+    """
+    config, _ = obtener_config(linea)
+    entrada = _CONFIG_CACHE[_normalizar_linea(linea)]
+    nomenclador = entrada.get('nomenclador')
+    if nomenclador is None:
+        nomenclador = entrada['nomenclador'] = compilar_nomenclador(config)
+    return nomenclador
 
 # =================================================================
 #                    MAPEOS DE ESTADOS
@@ -195,6 +350,26 @@ SINONIMOS_CONTINGENCIAS = {
     ]
 }
 
+# Reglas precompiladas (ver motor_reglas.py)
+MOTOR_ESTADOS = compilar_estados(MAP_ESTADOS_CODIGO)
+MOTOR_SINONIMOS = compilar_sinonimos(SINONIMOS_CONTINGENCIAS)
+
+# Versión del conjunto de reglas: subirla al agregar o cambiar una MEJORA en código.
+# Forma parte de la clave de la caché de resultados (procesar_mensaje) y del
+# log de auditoría (regla_sistema). La re-validación no depende de ella: el
+# grupo 'nucleo' de versiones_reglas.py sale de una huella del código.
+VERSION_REGLAS = "R-DETECTADA-V3"
+
+# Se incrementa con cada recompilar_reglas(): invalida los resultados cacheados
+_GENERACION_REGLAS = 0
+
+def recompilar_reglas():
+    """Recompila los motores si se modifican MAP_ESTADOS_CODIGO o SINONIMOS_CONTINGENCIAS en caliente"""
+    global MOTOR_ESTADOS, MOTOR_SINONIMOS, _GENERACION_REGLAS
+    MOTOR_ESTADOS = compilar_estados(MAP_ESTADOS_CODIGO)
+    MOTOR_SINONIMOS = compilar_sinonimos(SINONIMOS_CONTINGENCIAS)
+    _GENERACION_REGLAS += 1
+
 # Estados que no requieren validación de tiempo (o tienen lógica especial)
 ESTADOS_SIN_TARDANZA = ['REDUCIDO', 'INTERRUMPIDO', 'CONDICIONAL', 'REANUDACIÓN']
 
@@ -202,7 +377,10 @@ ESTADOS_SIN_TARDANZA = ['REDUCIDO', 'INTERRUMPIDO', 'CONDICIONAL', 'REANUDACIÓN
 #                    CARGAR CONTINGENCIAS
 # =================================================================
 
-def cargar_contingencias(archivo_excel="Contingencias.xlsx"):
+# Matriz junto a este script (no depende del directorio desde el que se corre)
+ARCHIVO_CONTINGENCIAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Contingencias.xlsx")
+
+def cargar_contingencias(archivo_excel=ARCHIVO_CONTINGENCIAS):
     """Carga matriz de contingencias desde Excel"""
     try:
         # Check if file exists to assume safe loading
@@ -251,52 +429,54 @@ def cargar_contingencias(archivo_excel="Contingencias.xlsx"):
         print(f"❌ Error cargando contingencias: {e}")
         return None
 
+# Fallback manual si la forma oficial no está en el Excel (por seguridad)
+# Actualizado según imagen del usuario:
+# 03 = PROBLEMAS TÉCNICOS
+# 05 = PROBLEMAS OPERATIVOS
+# 17 = OTRAS CONTINGENCIAS
+CODIGOS_CONTINGENCIA_FALLBACK = {
+    'PROBLEMAS TÉCNICOS': '03',
+    'PROBLEMAS OPERATIVOS': '05',
+    'OTRAS CONTINGENCIAS': '17'
+}
+
+def indexar_contingencias(contingencias_df):
+    """Construye el ContingencyIndex (una vez por matriz cargada)"""
+    if contingencias_df is None:
+        return None
+    if isinstance(contingencias_df, ContingencyIndex):
+        return contingencias_df
+    return ContingencyIndex(contingencias_df, MOTOR_SINONIMOS, CODIGOS_CONTINGENCIA_FALLBACK)
+
+def cargar_indice_contingencias(archivo_excel=ARCHIVO_CONTINGENCIAS):
+    """Carga la matriz de contingencias y la devuelve ya indexada (o None)"""
+    return indexar_contingencias(cargar_contingencias(archivo_excel))
+
+# Último índice construido para un DataFrame recibido directamente
+# (callers externos que siguen pasando el DataFrame de cargar_contingencias)
+_INDICE_CACHE = (None, None, None)
+
+def obtener_indice_contingencias(contingencias):
+    """Devuelve el índice para un ContingencyIndex o DataFrame, reutilizando el último construido"""
+    global _INDICE_CACHE
+    if isinstance(contingencias, ContingencyIndex):
+        return contingencias
+    df_cache, motor_cache, indice = _INDICE_CACHE
+    if df_cache is not contingencias or motor_cache is not MOTOR_SINONIMOS:
+        indice = indexar_contingencias(contingencias)
+        _INDICE_CACHE = (contingencias, MOTOR_SINONIMOS, indice)
+    return indice
+
 def buscar_contingencia_con_sinonimos(contenido_upper, contingencias_df):
     """
     MEJORA #9: Busca contingencia en texto considerando sinónimos y estructura real
+    Acepta el DataFrame de cargar_contingencias o un ContingencyIndex.
     Retorna: (codigo_contingencia, forma_comunicacion) o (None, None)
     """
     # 1. Búsqueda exacta en columna 'Forma_Comunicacion' (la que va al pasajero)
-    col_comunicacion = None
-    if 'Forma_Comunicacion' in contingencias_df.columns:
-        col_comunicacion = 'Forma_Comunicacion'
-    elif 'Formas_de_comunicación' in contingencias_df.columns:
-        col_comunicacion = 'Formas_de_comunicación' # fallback por si acaso
-
-    if col_comunicacion:
-        for idx, row in contingencias_df.iterrows():
-            forma = str(row[col_comunicacion]).upper()
-            if forma and forma != 'NAN':
-                # Regex flexible
-                patron = re.escape(forma).replace(r'\ ', r'\s+')
-                if re.search(patron, contenido_upper):
-                    codigo = str(row['Código']).zfill(2)
-                    return (codigo, forma)
-    
     # 2. Búsqueda por sinónimos (si falla la exacta)
-    # Actualizado según imagen del usuario:
-    # 03 = PROBLEMAS TÉCNICOS
-    # 05 = PROBLEMAS OPERATIVOS
-    # 17 = OTRAS CONTINGENCIAS
-    
-    for forma_oficial, sinonimos in SINONIMOS_CONTINGENCIAS.items():
-        for sinonimo in sinonimos:
-            patron = re.escape(sinonimo).replace(r'\ ', r'\s+')
-            if re.search(patron, contenido_upper):
-                
-                # Buscar el código que corresponde a esa forma oficial en el Excel
-                if col_comunicacion:
-                    match = contingencias_df[contingencias_df[col_comunicacion].str.upper() == forma_oficial]
-                    if not match.empty:
-                        codigo = str(match.iloc[0]['Código']).zfill(2)
-                        return (codigo, sinonimo)
-                
-                # Fallback manual si no está en Excel (por seguridad)
-                if forma_oficial == 'PROBLEMAS TÉCNICOS': return ('03', sinonimo)
-                if forma_oficial == 'PROBLEMAS OPERATIVOS': return ('05', sinonimo)
-                if forma_oficial == 'OTRAS CONTINGENCIAS': return ('17', sinonimo)
-
-    return (None, None)
+    # Ambas están precompiladas en el índice, en ese orden de prioridad.
+    return obtener_indice_contingencias(contingencias_df).buscar(contenido_upper)
 
 # =================================================================
 #                    DETECCIÓN TIPO MENSAJE
@@ -311,12 +491,13 @@ def detectar_tipo_mensaje(contenido):
     REANUDACIÓN: MEJORA #2 - Mensaje de restablecimiento de servicio
     """
     contenido_upper = contenido.upper()
+    buscar = re.search if _INSTRUMENTACION is None else _INSTRUMENTACION.buscar
     
     # MEJORA #2: Detectar reanudación/restablecimiento
-    if re.search(r'SE\s+RESTABLECE|RESTABLECE\s+(?:EL\s+)?SERVICIO', contenido_upper):
+    if buscar(r'SE\s+RESTABLECE|RESTABLECE\s+(?:EL\s+)?SERVICIO', contenido_upper):
         # Buscar si menciona ramal/línea
         # MEJORA #13: Permitir guiones en nombres de ramales (ej: Retiro-Cabred)
-        match_servicio = re.search(
+        match_servicio = buscar(
             r'(?:RAMAL|L[ÍI]NEA)\s+([A-ZÁÉÍÓÚÑ\s\-\.]+?)(?:\s+SE\s+|\s+RESTABLECE)',
             contenido_upper
         )
@@ -329,24 +510,24 @@ def detectar_tipo_mensaje(contenido):
             return {'tipo': 'REANUDACION'}
 
     # MEJORA #15: Detectar Rectificación
-    if re.search(r'SE\s+RECTIFICA|RECTIFICACI[OÓ]N', contenido_upper):
+    if buscar(r'SE\s+RECTIFICA|RECTIFICACI[OÓ]N', contenido_upper):
         return {'tipo': 'RECTIFICACION'}
     
     # Buscar número de tren
     # CORRECCIÓN DEFINITIVA: Regex que tolera "TREN N @T3432" sin usar replace que duplique palabras
-    match_tren = re.search(
+    match_tren = buscar(
         r'(?:TREN\s+(?:N[°º]?\s*)?(?:@?T)?|@T)\s*(\d{3,4})',
         contenido_upper
     )
     
     # Si falla, intento de rescate (buscando cualquier número de 3-4 cifras después de la palabra TREN)
     if not match_tren:
-         match_tren = re.search(r'TREN.*?(\d{3,4})', contenido_upper)
+         match_tren = buscar(r'TREN.*?(\d{3,4})', contenido_upper)
 
     # MEJORA: Detectar si usaron "SERVICIO 3328" en lugar de "TREN"
     usado_servicio_como_tren = False
     if not match_tren:
-        match_servicio_numerico = re.search(r'SERVICIO\s+(?:N[°º]?\s*)?(\d{3,4})', contenido_upper)
+        match_servicio_numerico = buscar(r'SERVICIO\s+(?:N[°º]?\s*)?(\d{3,4})', contenido_upper)
         if match_servicio_numerico:
             match_tren = match_servicio_numerico
             usado_servicio_como_tren = True
@@ -363,7 +544,7 @@ def detectar_tipo_mensaje(contenido):
         return resultado
     
     # Buscar servicio/ramal/línea
-    match_servicio = re.search(r'(RAMAL|SERVICIO|L[IÍ]NEA)\s+([A-ZÁÉÍÓÚÑ\s-]+?)(?=\s+(?:SE\s+|INTERRUMPIDO|REDUCIDO|CON\s+|DEMORAS|CANCELADO))', contenido_upper)
+    match_servicio = buscar(r'(RAMAL|SERVICIO|L[IÍ]NEA)\s+([A-ZÁÉÍÓÚÑ\s-]+?)(?=\s+(?:SE\s+|INTERRUMPIDO|REDUCIDO|CON\s+|DEMORAS|CANCELADO))', contenido_upper)
     
     if match_servicio:
         return {
@@ -439,6 +620,10 @@ def validar_componentes(mensaje, contingencias_df):
     """
     global CORRECTOR_DISPONIBLE
     
+    # Instrumentación: None (desactivada) o EstadisticasValidacion
+    stats = _INSTRUMENTACION
+    buscar = re.search if stats is None else stats.buscar
+    
     contenido = mensaje.get('contenido', '')
     
     # MEJORA #12: Normalizar espacios múltiples
@@ -446,6 +631,10 @@ def validar_componentes(mensaje, contingencias_df):
     
     contenido_upper = contenido.upper()
     
+    # Una sola tokenización (al primer uso) para hora, recorrido, minutos, servicio y lugar
+    lexico = MensajeTokenizado(contenido_upper)
+    
+    if stats: stats.marca('tipo')
     tipo_info = detectar_tipo_mensaje(contenido)
     tipo = tipo_info['tipo']
     
@@ -470,6 +659,7 @@ def validar_componentes(mensaje, contingencias_df):
         )
     
     # Componente F: Código de estructura
+    if stats: stats.marca('estructura')
     codigo_estructura = detectar_codigo_estructura(contenido)
     if codigo_estructura:
         if isinstance(codigo_estructura, dict): # Si devuelve dict
@@ -487,45 +677,43 @@ def validar_componentes(mensaje, contingencias_df):
             )
     
     # Componente A: Número de tren o servicio
+    if stats: stats.marca('tren_servicio')
     if tipo == 'TREN_ESPECIFICO':
         if tipo_info.get('numero_tren'):
             componentes['A'] = tipo_info.get('numero_tren')
         else:
             # Fallback (por si acaso) con la regex robusta nueva
-            match_tren = re.search(r'(?:TREN.*?|@T)\s*(\d{3,4})', contenido_upper)
+            match_tren = buscar(r'(?:TREN.*?|@T)\s*(\d{3,4})', contenido_upper)
             if match_tren:
                 componentes['A'] = match_tren.group(1)
     elif tipo == 'SERVICIO_GENERAL':
         # MEJORA #13: Permitir guiones en servicio
-        match_servicio = re.search(
-            r'(?:SERVICIO|RAMAL|L[ÍI]NEA)\s+([A-ZÁÉÍÓÚÑ\s\-\.]+?)(?:\s+SE\s+|\s+CIRCULA|\s+HA\s+)',
-            contenido_upper
-        )
-        if match_servicio:
-            componentes['A'] = match_servicio.group(1).strip()
+        nombre_servicio = lexico.nombre_servicio()
+        if nombre_servicio:
+            componentes['A'] = nombre_servicio
     
     # Componente B: Estado (MEJORA #3: regex flexible)
     estado_detectado = None
     usa_estructura_formal = False
     
-    for cod_estado, info_estado in MAP_ESTADOS_CODIGO.items():
-        for patron in info_estado['patrones']:
-            if re.search(patron, contenido_upper):
-                estado_detectado = info_estado['nombre']
-                usa_estructura_formal = True
-                componentes['B'] = {
-                    'estado': estado_detectado,
-                    'codigo': cod_estado,
-                    'estructura_formal': True
-                }
-                break
-        if estado_detectado:
-            break
+    if stats:
+        stats.marca('estado')
+        clave_estado, _ = stats.buscar_motor(MOTOR_ESTADOS, contenido_upper)
+    else:
+        clave_estado, _ = MOTOR_ESTADOS.buscar(contenido_upper)
+    if clave_estado:
+        cod_estado, estado_detectado = clave_estado
+        usa_estructura_formal = True
+        componentes['B'] = {
+            'estado': estado_detectado,
+            'codigo': cod_estado,
+            'estructura_formal': True
+        }
     
     # Si no encontró estado formal, buscar menciones informales
     if not estado_detectado:
         # Buscar "DEMORA" sin estructura formal
-        if re.search(r'\bDEMORAS?\b', contenido_upper):
+        if buscar(r'\bDEMORAS?\b', contenido_upper):
             estado_detectado = 'DEMORA'
             componentes['B'] = {
                 'estado': estado_detectado,
@@ -533,7 +721,7 @@ def validar_componentes(mensaje, contingencias_df):
                 'estructura_formal': False
             }
         # Buscar "CANCELADO/A" sin estructura formal
-        elif re.search(r'\bCANCELAD[OA]S?\b', contenido_upper):
+        elif buscar(r'\bCANCELAD[OA]S?\b', contenido_upper):
             estado_detectado = 'CANCELACIÓN'
             componentes['B'] = {
                 'estado': estado_detectado,
@@ -544,14 +732,9 @@ def validar_componentes(mensaje, contingencias_df):
     # Si es DEMORA, buscar minutos (MEJORA #1: acepta MIN., MIN, singular DEMORA)
     # MEJORA #14: Robusteza ante typos numéricos (ej: "5_" o "10.")
     if estado_detectado in ['DEMORA', 'DEMORA_PARTIDA']:
-        match_minutos = re.search(
-            r'(?:DEMORAS?|REGISTRA|ESPERA)(?:[\s\w]*?)(?:DE\s*|DE_|OBSERVA\s+)?([_\-\.]?)\s*(\d+)\s*([_\-\.]?)\s*(?:MINUTOS?|MIN\.?)',
-            contenido_upper
-        )
+        match_minutos = lexico.minutos()
         if match_minutos:
-            prefix = match_minutos.group(1)
-            minutos = match_minutos.group(2)
-            suffix = match_minutos.group(3)
+            prefix, minutos, suffix = match_minutos
             
             if componentes['B']:
                 componentes['B']['minutos'] = minutos
@@ -566,11 +749,16 @@ def validar_componentes(mensaje, contingencias_df):
     codigo_contingencia = None
     forma_comunicacion = None
     
+    if stats: stats.marca('contingencia')
     if contingencias_df is not None:
         # MEJORA #9: Buscar con sinónimos
-        codigo_contingencia, forma_comunicacion = buscar_contingencia_con_sinonimos(
-            contenido_upper, contingencias_df
-        )
+        if stats:
+            clave, _ = stats.buscar_motor(obtener_indice_contingencias(contingencias_df).motor, contenido_upper)
+            codigo_contingencia, forma_comunicacion = clave or (None, None)
+        else:
+            codigo_contingencia, forma_comunicacion = buscar_contingencia_con_sinonimos(
+                contenido_upper, contingencias_df
+            )
         if codigo_contingencia:
             componentes['C'] = {
                 'codigo': codigo_contingencia,
@@ -581,97 +769,107 @@ def validar_componentes(mensaje, contingencias_df):
     
     if tipo == 'TREN_ESPECIFICO':
         # --- D - HORA (Oficial: DE LAS XX:XX HS) ---
-        match_hora_4dig = re.search(r'DE\s+LAS\s+(\d{2})(\d{2})\s*HS', contenido_upper)
-        if match_hora_4dig:
-            hour_str = match_hora_4dig.group(1)
-            min_str = match_hora_4dig.group(2)
+        if stats: stats.marca('hora')
+        hora_4dig = lexico.hora_4dig()
+        if hora_4dig:
+            hour_str, min_str = hora_4dig
             componentes['D'] = f"{hour_str}:{min_str}"
             componentes.setdefault('advertencias_formato', []).append(
                 "SUGERENCIA: Se recomienda usar 'DE LAS HH:MM HS' (con dos puntos) en lugar de sin separador. IMPORTANTE: SIEMPRE SEGUIR EL PROCEDIMIENTO."
             )
         else:
             # Patrón normal con separadores
-            match_hora = re.search(r'DE\s+LAS\s+(\d{1,2})[\s:\.]+(\d{2})\s*HS', contenido_upper)
-            if match_hora:
-                hour_str = match_hora.group(1)
-                min_str = match_hora.group(2)
+            hora_separada = lexico.hora_separada()
+            if hora_separada:
+                hour_str, min_str, usa_dos_puntos = hora_separada
                 componentes['D'] = f"{hour_str}:{min_str}"
                 
                 # Detectar el separador usado
-                texto_hora = match_hora.group(0)
-                if ':' not in texto_hora:
+                if not usa_dos_puntos:
                     componentes.setdefault('advertencias_formato', []).append(
                         f"SUGERENCIA: Se recomienda usar 'DE LAS HH:MM HS' (con dos puntos). IMPORTANTE: SIEMPRE SEGUIR EL PROCEDIMIENTO."
                     )
             else:
                 # Intentar Flexible (DE LAS sin HS, A LAS, SALIDA...)
-                match_hora_invertida = re.search(r'HS\.?\s*(\d{1,2})[\s:\.]*(\d{2})', contenido_upper)
+                hora_invertida = lexico.hora_invertida()
                 
-                if match_hora_invertida:
-                     componentes['D'] = f"{match_hora_invertida.group(1)}:{match_hora_invertida.group(2)}"
+                if hora_invertida:
+                     componentes['D'] = f"{hora_invertida[0]}:{hora_invertida[1]}"
                      componentes.setdefault('advertencias_formato', []).append(
                          "Orden incorrecto: Escribiste 'HS Hora'. Lo correcto es 'DE LAS HH:MM HS'. IMPORTANTE: SIEMPRE SEGUIR EL PROCEDIMIENTO."
                      )
                 else:
-                    match_hora_flex = re.search(r'(?:(?:A|DE)?\s+)?LAS\s+(\d{1,2})[\s:\._]+(\d{2})', contenido_upper)
-                    
-                    if not match_hora_flex:
-                        match_hora_flex = re.search(r'\b(\d{1,2})[\s:\._]+(\d{2})\s*HS', contenido_upper)
-
-                    if match_hora_flex:
-                         componentes['D'] = f"{match_hora_flex.group(1)}:{match_hora_flex.group(2)}"
-                         if not re.search(r'DE\s+LAS', contenido_upper):
+                    # LAS HH MM, y si no aparece: HH MM HS
+                    hora_flex = lexico.hora_flexible()
+
+                    if hora_flex:
+                         componentes['D'] = f"{hora_flex[0]}:{hora_flex[1]}"
+                         if not lexico.tiene_de_las():
                              componentes.setdefault('advertencias_formato', []).append(
                                  "Falta preposición: Escribiste mal la hora. Lo correcto es 'DE LAS HH:MM HS'. IMPORTANTE: SIEMPRE SEGUIR EL PROCEDIMIENTO."
                              )
 
         # --- E - RECORRIDO (Oficial: DESDE [A] HACIA [B]) ---
-        stop_words_recorrido = r'(?=\s+(?:HACIA|A\s+[A-Z]|CON\s+|CIRCULA|HA\s+|FUE|Y\s+|PARTIO|DETENIDO|\(|LLEGA))'
-        
-        match_origen = re.search(r'(?:PARTIENDO\s+(?:DE|DESDE)|DESDE|DE)\s+([A-ZÁÉÍÓÚÑ0-9\s\.]+?)' + stop_words_recorrido, contenido_upper)
-        
-        stop_words_destino = r'(?=\s+(?:CIRCULA|HA\s+|FUE|CON\s+|REGISTRA|SE\s+ENCUENTRA|POR\s+|O\s+TRAS|RESTABLECE|PARTIO|Y\s+|\(|EN\s+ESTACION|SE\s+|$))'
-        match_destino = re.search(r'(?:HACIA|LLEGA\s+A|FINALIZA\s+EN|A)\s+([A-ZÁÉÍÓÚÑ0-9\s\.]+?)' + stop_words_destino, contenido_upper)
+        if stats: stats.marca('recorrido')
+        # Con nomenclador de la línea: estaciones conocidas tras DE/DESDE y HACIA/A,
+        # en un solo recorrido. Si falta alguna, extracción por palabras clave.
+        nomenclador = obtener_nomenclador(mensaje.get('linea', 'ROCA'))
+        origen, destino = nomenclador.recorrido(lexico) if nomenclador else (None, None)
+        if not origen or not destino:
+            origen = lexico.origen()
+            destino = lexico.destino()
         
         # Lógica Flexible: Si no encuentra oficial, buscar variantes
-        if not match_origen or not match_destino:
+        if not origen or not destino:
             # Variante 1: "ENTRE [A] Y [B]"
-            match_entre = re.search(r'ENTRE\s+([A-ZÁÉÍÓÚÑ][A-ZÁÉÍÓÚÑ\s\.\(\)]+?)\s+Y\s+([A-ZÁÉÍÓÚÑ][A-ZÁÉÍÓÚÑ\s\.\(\)]+?)(?=\s+(?:CIRCULA|HA\s+SIDO|FUE|CON\s+DEMORA|$))', contenido_upper)
-            if match_entre:
+            par_entre = lexico.entre()
+            if par_entre:
                 componentes['E'] = {
-                    'origen': match_entre.group(1).strip(),
-                    'destino': match_entre.group(2).strip()
+                    'origen': par_entre[0],
+                    'destino': par_entre[1]
                 }
                 componentes.setdefault('advertencias_formato', []).append(
                     "Según Matriz de Mensajes: Usa 'DESDE [Origen] HACIA [Destino]'"
                 )
-                match_origen = True 
-                match_destino = True
             
             # Variante 2: "DE [A] A [B]" (Solo si no encontró ENTRE)
             if not componentes.get('E'):
-                match_de_a = re.search(r'(?:SALIENDO\s+|SALE\s+)?DE\s+([A-ZÁÉÍÓÚÑ][A-ZÁÉÍÓÚÑ\s\.\(\)]+?)\s+A\s+([A-ZÁÉÍÓÚÑ][A-ZÁÉÍÓÚÑ\s\.\(\)]+?)(?=\s+(?:CIRCULA|HA\s+SIDO|FUE|CON\s+DEMORA|$))', contenido_upper)
-                if match_de_a:
+                par_de_a = lexico.de_a()
+                if par_de_a:
                     componentes['E'] = {
-                        'origen': match_de_a.group(1).strip(),
-                        'destino': match_de_a.group(2).strip()
+                        'origen': par_de_a[0],
+                        'destino': par_de_a[1]
                     }
                     componentes.setdefault('advertencias_formato', []).append(
                         "Según Matriz de Mensajes: Usa 'HACIA [Estacion]' en lugar de 'A'"
                     )
         
-        if (match_origen and match_destino) or componentes.get('E'):
-            if not componentes.get('E'): # Si encontró oficial
-                 componentes['E'] = {
-                    'origen': match_origen.group(1).strip() if match_origen else None,
-                    'destino': match_destino.group(1).strip() if match_destino else None
-                }
+        if origen and destino and not componentes.get('E'):
+            componentes['E'] = {
+                'origen': origen,
+                'destino': destino
+            }
+
+        # Estaciones fuera del nomenclador (solo si la línea tiene uno cargado)
+        recorrido = componentes.get('E')
+        if nomenclador and isinstance(recorrido, dict):
+            for extremo in ('origen', 'destino'):
+                estacion = recorrido.get(extremo)
+                if not estacion:
+                    continue
+                oficial = nomenclador.reconocer(estacion)
+                if oficial:
+                    recorrido[extremo] = oficial
+                else:
+                    componentes.setdefault('advertencias_formato', []).append(
+                        f"Estación no reconocida para la línea: '{estacion}'. Verificar nombre oficial."
+                    )
 
     elif tipo == 'SERVICIO_GENERAL':
         # --- D - LUGAR (Contextual: "EN ...") ---
-        match_lugar = re.search(r'\bEN\s+([A-ZÁÉÍÓÚÑ\s\.]+?)(?=\s+(?:DISCULPA|SEPA|\.|$))', contenido_upper)
-        if match_lugar:
-             lugar = match_lugar.group(1).strip()
+        if stats: stats.marca('lugar')
+        lugar = lexico.lugar()
+        if lugar:
              if lugar not in ["EL DIA", "LA TARDE", "LA NOCHE", "EL TRANSCURSO"]:
                 componentes['D'] = lugar
 
@@ -680,29 +878,31 @@ def validar_componentes(mensaje, contingencias_df):
             componentes['E'] = "Se piden disculpas"
             
     elif tipo == 'RECTIFICACION':
-        match_tren = re.search(r'(?:TREN|SERVICIO|FORMACI[OÓ]N)\s+(?:N[°º]?\s*)?(\d+)', contenido_upper)
+        if stats: stats.marca('rectificacion')
+        match_tren = buscar(r'(?:TREN|SERVICIO|FORMACI[OÓ]N)\s+(?:N[°º]?\s*)?(\d+)', contenido_upper)
         if match_tren:
              componentes['A'] = match_tren.group(1)
         else:
-             match_servicio = re.search(r'(?:RAMAL|L[ÍI]NEA)\s+([A-ZÁÉÍÓÚÑ\s\-\.]+)', contenido_upper)
+             match_servicio = buscar(r'(?:RAMAL|L[ÍI]NEA)\s+([A-ZÁÉÍÓÚÑ\s\-\.]+)', contenido_upper)
              if match_servicio:
                  componentes['A'] = match_servicio.group(1).strip()
     
     # Validar ortografía con LanguageTool (si está disponible)
+    if stats: stats.marca('ortografia')
     errores_detectados = []
-    config = cargar_config(mensaje.get('linea', 'ROCA'))
-    palabras_tecnicas = set(word.upper() for word in config.get('palabras_tecnicas', []))
+    _, palabras_tecnicas = obtener_config(mensaje.get('linea', 'ROCA'))
 
-    if CORRECTOR_DISPONIBLE and spell:
+    if CORRECTOR_DISPONIBLE and obtener_corrector():
         try:
             palabras = re.findall(r'\b[A-Za-záéíóúñÁÉÍÓÚÑ]+\b', contenido)
-            desconocidas = spell.unknown(palabras)
+            # Mismo resultado (y orden) que spell.unknown(palabras), pero cacheado por palabra
+            desconocidas = {word for word in (p.lower() for p in palabras) if not palabra_conocida(word)}
             for word in desconocidas:
                 word_upper = word.upper()
                 if (word_upper in palabras_tecnicas or len(word) < 3 or 
                     word_upper in ['LSM', 'PK', 'KM', 'NRO', 'PDA', 'JCP', 'PC', 'S/E']):
                     continue
-                sugerencia = spell.correction(word)
+                sugerencia = corregir_palabra(word)
                 if sugerencia and sugerencia.upper() != word_upper:
                     errores_detectados.append(f"{word} → {sugerencia}")
         except Exception:
@@ -725,11 +925,11 @@ def validar_componentes(mensaje, contingencias_df):
         ]
         count_errors = 0
         for patron, correcto in patrones_error:
-            if re.search(patron, contenido_upper):
-                palabra_error = re.search(patron, contenido_upper).group()
+            if buscar(patron, contenido_upper):
+                palabra_error = buscar(patron, contenido_upper).group()
                 errores_detectados.append(f"{palabra_error} → {correcto}")
     
-        if re.search(r'([A-Z])\1{2,}', contenido_upper):
+        if buscar(r'([A-Z])\1{2,}', contenido_upper):
             errores_detectados.append("Letras repetidas excesivamente")
     
     # 3. Detectar espacios múltiples
@@ -744,6 +944,7 @@ def validar_componentes(mensaje, contingencias_df):
         componentes['errores_ortografia'].extend(errores_detectados)
     
     # Advertencia específica para @T
+    if stats: stats.marca('advertencias')
     if '@T' in contenido_upper:
         componentes.setdefault('advertencias_formato', []).append(
             "Formato no estándar: Se detectó el prefijo interno '@T'. P/ comunicación externa usar 'TREN N° ...'."
@@ -761,6 +962,7 @@ def validar_componentes(mensaje, contingencias_df):
     if 'advertencias_formato' in componentes:
         componentes['advertencias_formato'] = list(dict.fromkeys(componentes['advertencias_formato']))
 
+    if stats: stats.marca(None)
     return componentes, codigo_estructura, codigo_contingencia, estado_detectado
 
 # =================================================================
@@ -841,16 +1043,16 @@ def validar_tiempo_respuesta(mensaje, componentes):
                 clasificacion = "CRITICO"
                 nivel = "IMPORTANTE"
         
-        return {
-            'tardanza_minutos': round(tardanza_minutos, 1),
-            'clasificacion': clasificacion,
-            'nivel': nivel,
-            'hora_programada': hora_programada,
-            'minutos_demora': minutos_demora if not es_cancelacion_o_suspension else 0,
-            'hora_referencia': hora_referencia.strftime("%H:%M"),
-            'hora_envio': hora_envio.strftime("%H:%M:%S"),
-            'es_cancelacion': es_cancelacion_o_suspension
-        }
+        return Timing(
+            tardanza_minutos=round(tardanza_minutos, 1),
+            clasificacion=clasificacion,
+            nivel=nivel,
+            hora_programada=hora_programada,
+            minutos_demora=minutos_demora if not es_cancelacion_o_suspension else 0,
+            hora_referencia=hora_referencia.strftime("%H:%M"),
+            hora_envio=hora_envio.strftime("%H:%M:%S"),
+            es_cancelacion=es_cancelacion_o_suspension
+        )
     except Exception as e:
         return None
 
@@ -992,11 +1194,13 @@ def clasificar_mensaje(mensaje, componentes, codigo_estructura, codigo_contingen
         nivel_general = 'SUGERENCIAS'
     else:
         nivel_general = 'COMPLETO'
-        
-    for key in clasificacion:
-        clasificacion[key] = list(dict.fromkeys(clasificacion[key]))
     
-    return clasificacion, nivel_general
+    # Sin repetidos, en orden de aparición
+    return Clasificacion(
+        dict.fromkeys(clasificacion['IMPORTANTE']),
+        dict.fromkeys(clasificacion['OBSERVACIONES']),
+        dict.fromkeys(clasificacion['SUGERENCIAS'])
+    ), nivel_general
 
 # =================================================================
 #                    GENERAR REPORTE
@@ -1006,42 +1210,38 @@ def calcular_scores(componentes, timing, mensaje):
     """
     Calcula los 3 scores independientes
     """
-    scores = {
-        'componentes': {'clasificacion': '', 'detalles': []},
-        'timing': {'clasificacion': '', 'detalles': []},
-        'estructura': {'clasificacion': '', 'detalles': []}
-    }
+    detalles = []
     
     # 1. Componentes
     componentes_puntos = 0
     if componentes.get('A'): componentes_puntos += 20
-    else: scores['componentes']['detalles'].append("Falta número de tren")
+    else: detalles.append("Falta número de tren")
     
     if componentes.get('B'): componentes_puntos += 20
-    else: scores['componentes']['detalles'].append("Falta estado/demora")
+    else: detalles.append("Falta estado/demora")
     
     if componentes.get('C'): componentes_puntos += 15
     elif componentes.get('tipo_mensaje') == 'INFORMATIVO': componentes_puntos += 15
-    else: scores['componentes']['detalles'].append("Falta causa específica")
+    else: detalles.append("Falta causa específica")
     
     if componentes.get('D'): componentes_puntos += 15
     elif componentes.get('tipo_mensaje') == 'SERVICIO_GENERAL': componentes_puntos += 15
-    else: scores['componentes']['detalles'].append("Falta horario")
+    else: detalles.append("Falta horario")
     
     if componentes.get('E'):
         if isinstance(componentes['E'], dict):
             if componentes['E'].get('origen') and componentes['E'].get('destino'): componentes_puntos += 20
-            else: scores['componentes']['detalles'].append("Falta origen y/o destino")
+            else: detalles.append("Falta origen y/o destino")
         elif componentes.get('tipo_mensaje') == 'SERVICIO_GENERAL': componentes_puntos += 20
     elif componentes.get('tipo_mensaje') == 'SERVICIO_GENERAL': componentes_puntos += 20
-    else: scores['componentes']['detalles'].append("Falta origen y/o destino")
+    else: detalles.append("Falta origen y/o destino")
     
     if componentes.get('estructura_valida'): componentes_puntos += 10
-    else: scores['componentes']['detalles'].append("Falta código formal")
+    else: detalles.append("Falta código formal")
     
-    if componentes_puntos >= 90: scores['componentes']['clasificacion'] = 'COMPLETO'
-    elif componentes_puntos >= 70: scores['componentes']['clasificacion'] = 'ACEPTABLE'
-    else: scores['componentes']['clasificacion'] = 'INCOMPLETO'
+    if componentes_puntos >= 90: score_componentes = Score('COMPLETO', detalles)
+    elif componentes_puntos >= 70: score_componentes = Score('ACEPTABLE', detalles)
+    else: score_componentes = Score('INCOMPLETO', detalles)
     
     # 2. Timing
     if timing and timing.get('tardanza_minutos') is not None:
@@ -1052,15 +1252,15 @@ def calcular_scores(componentes, timing, mensaje):
         es_cancel = estado_nombre in ['CANCELACIÓN', 'SUSPENDIDO']
         
         if -5 <= tardanza <= 0:
-            scores['timing']['clasificacion'] = 'EXCELENTE'
+            score_timing = Score('EXCELENTE')
         elif tardanza < -5 and es_cancel:
-            scores['timing']['clasificacion'] = 'EXCELENTE'
+            score_timing = Score('EXCELENTE')
         elif 0 < tardanza <= 11:
-            scores['timing']['clasificacion'] = 'BUENO'
+            score_timing = Score('BUENO')
         else:
-            scores['timing']['clasificacion'] = 'DEFICIENTE'
+            score_timing = Score('DEFICIENTE')
     else:
-        scores['timing']['clasificacion'] = 'N/A'
+        score_timing = Score('N/A')
     
     # 3. Estructura
     estructura_puntos = 0
@@ -1078,31 +1278,32 @@ def calcular_scores(componentes, timing, mensaje):
     elif len(contenido) > 30: estructura_puntos += 20
     else: estructura_puntos += 10
     
-    if estructura_puntos >= 95: scores['estructura']['clasificacion'] = 'IMPECABLE'
-    elif estructura_puntos >= 75: scores['estructura']['clasificacion'] = 'CORRECTO'
-    elif estructura_puntos >= 55: scores['estructura']['clasificacion'] = 'MEJORABLE'
-    else: scores['estructura']['clasificacion'] = 'DEFICIENTE'
+    if estructura_puntos >= 95: score_estructura = Score('IMPECABLE')
+    elif estructura_puntos >= 75: score_estructura = Score('CORRECTO')
+    elif estructura_puntos >= 55: score_estructura = Score('MEJORABLE')
+    else: score_estructura = Score('DEFICIENTE')
     
-    return scores
+    return Scores(score_componentes, score_timing, score_estructura)
 
 def generar_reporte(mensaje, componentes, clasificacion, nivel_general, timing):
+    """Reporte compacto (ver reportes.py); to_dict() da el dict anidado para JSON"""
     scores = calcular_scores(componentes, timing, mensaje)
-    return {
-        'numero_mensaje': mensaje.get('numero_mensaje'),
-        'operador': mensaje.get('operador'),
-        'fecha_hora': mensaje.get('fecha_hora'),
-        'linea': mensaje.get('linea'),
-        'contenido': mensaje.get('contenido'),
-        'tipo_mensaje': componentes.get('tipo_mensaje'),
-        'componentes': componentes,
-        'clasificacion': clasificacion,
-        'nivel_general': nivel_general,
-        'timing': timing,
-        'scores': scores,
-        'requiere_notificacion': nivel_general in ['IMPORTANTE', 'OBSERVACIONES']
-    }
+    return Reporte(
+        numero_mensaje=mensaje.get('numero_mensaje'),
+        operador=mensaje.get('operador'),
+        fecha_hora=mensaje.get('fecha_hora'),
+        linea=mensaje.get('linea'),
+        contenido=mensaje.get('contenido'),
+        componentes=Componentes.desde_dict(componentes),
+        clasificacion=clasificacion,
+        nivel_general=nivel_general,
+        timing=timing,
+        scores=scores
+    )
 
 def validar_mensaje_ROCA(mensaje, contingencias_df):
+    if _INSTRUMENTACION is not None:
+        return _validar_mensaje_instrumentado(mensaje, contingencias_df, _INSTRUMENTACION)
     componentes, codigo_estructura, codigo_contingencia, estado_detectado = validar_componentes(
         mensaje, contingencias_df
     )
@@ -1113,49 +1314,358 @@ def validar_mensaje_ROCA(mensaje, contingencias_df):
     reporte = generar_reporte(mensaje, componentes, clasificacion, nivel_general, timing)
     return reporte
 
-def validar_mensajes_desde_json(archivo_json=None, contingencias_df=None):
+def _validar_mensaje_instrumentado(mensaje, contingencias_df, stats):
+    """Mismo pipeline que validar_mensaje_ROCA, midiendo cada etapa"""
+    t_mensaje = stats.iniciar_mensaje(mensaje)
+    try:
+        t0 = reloj_ns()
+        componentes, codigo_estructura, codigo_contingencia, estado_detectado = validar_componentes(
+            mensaje, contingencias_df
+        )
+        t1 = reloj_ns()
+        stats.etapa('validar_componentes', t1 - t0)
+        timing = validar_tiempo_respuesta(mensaje, componentes)
+        t0 = reloj_ns()
+        stats.etapa('validar_tiempo_respuesta', t0 - t1)
+        clasificacion, nivel_general = clasificar_mensaje(
+            mensaje, componentes, codigo_estructura, codigo_contingencia, estado_detectado, timing
+        )
+        t1 = reloj_ns()
+        stats.etapa('clasificar_mensaje', t1 - t0)
+        reporte = generar_reporte(mensaje, componentes, clasificacion, nivel_general, timing)
+        stats.etapa('generar_reporte', reloj_ns() - t1)
+    finally:
+        # Si validar_componentes falló a mitad, la subetapa abierta queda cerrada
+        stats.marca(None)
+        stats.terminar_mensaje(t_mensaje)
+    return reporte
+
+# =================================================================
+#                    LECTURA / ESCRITURA EN STREAMING
+# =================================================================
+
+def _iterar_array_json(f, tam_bloque=1 << 16):
+    """
+    Parser incremental de un array JSON ([{...}, {...}]).
+    Lee el archivo por bloques y devuelve un elemento a la vez, sin cargar el export entero.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def _rellenar():
+        nonlocal buffer, pos, eof
+        bloque = f.read(tam_bloque)
+        if not bloque:
+            eof = True
+        buffer = buffer[pos:] + bloque
+        pos = 0
+
+    def _siguiente_no_blanco():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos] if pos < len(buffer) else ''
+            _rellenar()
+
+    if _siguiente_no_blanco() != '[':
+        raise ValueError("Se esperaba un array JSON ('[')")
+    pos += 1
+
+    if _siguiente_no_blanco() == ']':
+        return
+
+    while True:
+        if not _siguiente_no_blanco():
+            raise ValueError("Array JSON incompleto")
+        try:
+            obj, fin = decoder.raw_decode(buffer, pos)
+            # Un valor que toca el final del buffer podría estar truncado (ej: números)
+            if fin >= len(buffer) and not eof:
+                raise json.JSONDecodeError("bloque incompleto", buffer, fin)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            _rellenar()
+            continue
+        pos = fin
+        yield obj
+
+        separador = _siguiente_no_blanco()
+        if separador == ']':
+            return
+        if separador != ',':
+            raise ValueError(f"Array JSON mal formado cerca de: {buffer[pos:pos + 30]!r}")
+        pos += 1
+
+def _iterar_ndjson(f):
+    for linea in f:
+        linea = linea.strip()
+        if linea:
+            yield json.loads(linea)
+
+def leer_mensajes(archivo_json):
+    """
+    Generador de mensajes desde un export: array JSON (streaming incremental)
+    o NDJSON (un mensaje por línea). Se detecta por extensión o primer caracter.
+    """
+    with open(archivo_json, 'r', encoding='utf-8') as f:
+        es_ndjson = archivo_json.lower().endswith(('.ndjson', '.jsonl'))
+        if not es_ndjson:
+            inicio = f.read(1024).lstrip()
+            es_ndjson = inicio.startswith('{')
+            f.seek(0)
+        if es_ndjson:
+            yield from _iterar_ndjson(f)
+        else:
+            yield from _iterar_array_json(f)
+
+def escribir_reportes_ndjson(reportes, archivo_salida):
+    """Escribe cada reporte en una línea a medida que se produce. Retorna la cantidad escrita."""
+    total = 0
+    with open(archivo_salida, 'w', encoding='utf-8') as f:
+        for reporte in reportes:
+            f.write(json.dumps(reporte.to_dict(), ensure_ascii=False))
+            f.write('\n')
+            total += 1
+    return total
+
+# =================================================================
+#                    VALIDACIÓN EN LOTE
+# =================================================================
+
+def _validar_aislado(mensaje, contingencias_df):
+    """Valida un mensaje; si falla se informa y devuelve None (no corta el lote)"""
+    try:
+        return validar_mensaje_ROCA(mensaje, contingencias_df)
+    except Exception as e:
+        print(f"⚠️ Error validando #{mensaje.get('numero_mensaje', 'N/A')}: {e}")
+        return None
+
+def _validar_secuencial(mensajes, contingencias_df):
+    reportes = []
+    for mensaje in mensajes:
+        reporte = _validar_aislado(mensaje, contingencias_df)
+        if reporte is not None:
+            reportes.append(reporte)
+    return reportes
+
+# Estado por proceso worker (se carga una sola vez en el initializer)
+_CONTINGENCIAS_WORKER = None
+
+def _inicializar_worker(contingencias):
+    global _CONTINGENCIAS_WORKER
+    _CONTINGENCIAS_WORKER = contingencias
+
+def _validar_chunk(mensajes):
+    return _validar_secuencial(mensajes, _CONTINGENCIAS_WORKER)
+
+def _agrupar(iterable, tam):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= tam:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def validar_mensajes_stream(mensajes, contingencias_df=None, workers=1, chunk_size=500):
+    """
+    Generador de reportes en el orden de entrada, a partir de cualquier iterable de mensajes.
+    workers: 1 = secuencial, None = todos los núcleos, N = N procesos.
+    En paralelo se mantienen como máximo 2 chunks por worker en vuelo, así la
+    memoria no depende del tamaño del export.
+    """
+    contingencias_df = indexar_contingencias(contingencias_df)
+    chunk_size = max(1, chunk_size)
+
+    if workers == 1:
+        for mensaje in mensajes:
+            reporte = _validar_aislado(mensaje, contingencias_df)
+            if reporte is not None:
+                yield reporte
+        return
+
+    max_en_vuelo = 2 * (workers or os.cpu_count() or 1)
+    # Cada worker recibe el índice de contingencias una vez; los configs de línea
+    # se cachean por proceso en el primer mensaje de cada línea.
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_inicializar_worker,
+        initargs=(contingencias_df,)
+    ) as executor:
+        pendientes = deque()
+        for chunk in _agrupar(mensajes, chunk_size):
+            pendientes.append(executor.submit(_validar_chunk, chunk))
+            if len(pendientes) >= max_en_vuelo:
+                yield from pendientes.popleft().result()
+        while pendientes:
+            yield from pendientes.popleft().result()
+
+def validar_mensajes_lote(mensajes, contingencias_df=None, workers=None, chunk_size=500):
+    """
+    Valida una lista de mensajes repartiéndola en chunks sobre un ProcessPoolExecutor.
+    workers: cantidad de procesos (None = todos los núcleos, 1 = secuencial)
+    Los reportes vuelven en el orden de entrada; los mensajes que fallan se omiten
+    igual que en el modo secuencial.
+    """
+    if len(mensajes) <= chunk_size:
+        workers = 1
+    return list(validar_mensajes_stream(mensajes, contingencias_df, workers=workers, chunk_size=chunk_size))
+
+def _resolver_archivo_json(archivo_json):
     if not archivo_json:
         archivos_json = glob.glob("mensajes_sofse_*.json")
-        if not archivos_json: return []
+        if not archivos_json: return None
         archivo_json = max(archivos_json, key=os.path.getmtime)
+    return archivo_json
+
+def validar_mensajes_desde_json(archivo_json=None, contingencias_df=None, workers=1, chunk_size=500):
+    archivo_json = _resolver_archivo_json(archivo_json)
+    if not archivo_json: return []
     
     print(f"📖 Leyendo: {archivo_json}")
-    with open(archivo_json, 'r', encoding='utf-8') as f:
-        mensajes = json.load(f)
+    mensajes = list(leer_mensajes(archivo_json))
     print(f"📊 Total mensajes: {len(mensajes)}")
     
-    if contingencias_df is None: contingencias_df = cargar_contingencias()
+    if contingencias_df is None: contingencias_df = cargar_indice_contingencias()
     
-    reportes = []
-    for mensaje in mensajes:
-        try:
-            reporte = validar_mensaje_ROCA(mensaje, contingencias_df)
-            reportes.append(reporte)
-        except Exception as e:
-            print(f"⚠️ Error validando #{mensaje.get('numero_mensaje', 'N/A')}: {e}")
-    return reportes
+    return validar_mensajes_lote(mensajes, contingencias_df, workers=workers, chunk_size=chunk_size)
+
+def validar_archivo_a_ndjson(archivo_salida, archivo_json=None, contingencias_df=None, workers=1, chunk_size=500):
+    """
+    Pipeline en streaming: export (JSON/NDJSON) -> validación -> reportes NDJSON.
+    La memoria se mantiene plana sin importar el tamaño del export. Retorna la cantidad de reportes.
+    """
+    archivo_json = _resolver_archivo_json(archivo_json)
+    if not archivo_json: return 0
+    
+    print(f"📖 Leyendo (streaming): {archivo_json}")
+    if contingencias_df is None: contingencias_df = cargar_indice_contingencias()
+    
+    reportes = validar_mensajes_stream(
+        leer_mensajes(archivo_json), contingencias_df, workers=workers, chunk_size=chunk_size
+    )
+    return escribir_reportes_ndjson(reportes, archivo_salida)
 
 _CONTINGENCIAS_CACHE = None
 
+# =================================================================
+#                    CACHÉ DE RESULTADOS (procesar_mensaje)
+# =================================================================
+
+# Resultado de validar_componentes por contenido (ver cache_resultados.py).
+# Solo validar_tiempo_respuesta depende de fecha_hora: clasificación y reporte
+# se rearman en cada llamada a partir de los componentes cacheados.
+CACHE_RESULTADOS_ACTIVA = True
+CACHE_RESULTADOS_MAX_ENTRADAS = 20000
+CACHE_RESULTADOS_TTL = 6 * 3600  # segundos
+_CACHE_RESULTADOS = CacheResultados(CACHE_RESULTADOS_MAX_ENTRADAS, CACHE_RESULTADOS_TTL)
+
+def _clave_resultado(mensaje):
+    """
+    Hash del contenido normalizado + línea + versión de reglas.
+    También entran la firma del config de la línea (palabras técnicas,
+    nomenclador) y la disponibilidad del corrector, que cambian el resultado.
+    """
+    contenido = re.sub(r'\s+', ' ', mensaje.get('contenido', '')).strip()
+    linea = mensaje.get('linea', 'ROCA')
+    obtener_config(linea)  # revalida el config contra el disco
+    nombre_linea = _normalizar_linea(linea)
+    return clave_contenido(
+        contenido, nombre_linea, VERSION_REGLAS, _GENERACION_REGLAS,
+        _CONFIG_CACHE[nombre_linea]['firma'], CORRECTOR_DISPONIBLE
+    )
+
+def obtener_contingencias(archivo_excel=None):
+    """
+    Índice de contingencias de procesar_mensaje (se carga una sola vez).
+    archivo_excel: cargar (y usar de ahí en más) esta matriz en lugar de la default.
+    """
+    global _CONTINGENCIAS_CACHE
+    if archivo_excel is not None:
+        _CONTINGENCIAS_CACHE = cargar_indice_contingencias(archivo_excel)
+        limpiar_cache_resultados()
+    elif _CONTINGENCIAS_CACHE is None:
+        _CONTINGENCIAS_CACHE = cargar_indice_contingencias()
+    return _CONTINGENCIAS_CACHE
+
+def estadisticas_cache_resultados():
+    return _CACHE_RESULTADOS.estadisticas()
+
+def limpiar_cache_resultados():
+    _CACHE_RESULTADOS.limpiar()
+
 def procesar_mensaje(mensaje):
     """
     Wrapper para validar un solo mensaje desde una app externa.
     Maneja la carga y cacheo de contingencias automáticamente.
+    Los mensajes con el mismo contenido reutilizan los componentes ya validados.
+    Retorna el reporte como dict (to_dict), listo para serializar.
     """
-    global _CONTINGENCIAS_CACHE
-    if _CONTINGENCIAS_CACHE is None:
-        _CONTINGENCIAS_CACHE = cargar_contingencias()
-    return validar_mensaje_ROCA(mensaje, _CONTINGENCIAS_CACHE)
+    contingencias = obtener_contingencias()
+    # Con instrumentación activa se mide el pipeline completo, sin caché
+    if not CACHE_RESULTADOS_ACTIVA or _INSTRUMENTACION is not None:
+        return validar_mensaje_ROCA(mensaje, contingencias).to_dict()
+
+    clave = _clave_resultado(mensaje)
+    resultado = _CACHE_RESULTADOS.obtener(clave)
+    if resultado is None:
+        resultado = validar_componentes(mensaje, contingencias)
+        _CACHE_RESULTADOS.guardar(clave, resultado)
+    componentes, codigo_estructura, codigo_contingencia, estado_detectado = resultado
+
+    timing = validar_tiempo_respuesta(mensaje, componentes)
+    clasificacion, nivel_general = clasificar_mensaje(
+        mensaje, componentes, codigo_estructura, codigo_contingencia, estado_detectado, timing
+    )
+    # to_dict() copia listas y dicts anidados: la entrada cacheada no se modifica
+    return generar_reporte(mensaje, componentes, clasificacion, nivel_general, timing).to_dict()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validador de mensajes SOFSE - Sistema ROCA v3.0")
+    parser.add_argument('archivo_json', nargs='?', default=None,
+                        help="Export a validar (default: el mensajes_sofse_*.json más reciente)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Procesos en paralelo (1 = secuencial, 0 = todos los núcleos)")
+    parser.add_argument('--chunk', type=int, default=500,
+                        help="Mensajes por chunk en modo paralelo")
+    parser.add_argument('--salida', default=None,
+                        help="Escribir reportes en NDJSON a este archivo (modo streaming)")
+    parser.add_argument('--instrumentar', action='store_true',
+                        help="Medir tiempos por etapa y por regla (solo en este proceso: usar con --workers 1)")
+    args = parser.parse_args()
+    if args.instrumentar:
+        activar_instrumentacion()
+
     print("="*80)
     print("🔍 VALIDADOR MENSAJES SOFSE - SISTEMA ROCA v3.0")
     print("="*80)
-    contingencias_df = cargar_contingencias()
+    contingencias_df = cargar_indice_contingencias()
     if contingencias_df is None:
         print("❌ No se pudo cargar Contingencias.xlsx")
         exit(1)
-    reportes = validar_mensajes_desde_json(contingencias_df=contingencias_df)
+    if args.salida:
+        total = validar_archivo_a_ndjson(
+            args.salida,
+            args.archivo_json,
+            contingencias_df=contingencias_df,
+            workers=args.workers or None,
+            chunk_size=args.chunk
+        )
+    else:
+        total = len(validar_mensajes_desde_json(
+            args.archivo_json,
+            contingencias_df=contingencias_df,
+            workers=args.workers or None,
+            chunk_size=args.chunk
+        ))
     print(f"\n{'='*80}")
-    print(f"✅ Validación completada: {len(reportes)} mensajes procesados")
+    print(f"✅ Validación completada: {total} mensajes procesados")
     print("="*80)
+    if args.instrumentar:
+        print(desactivar_instrumentacion().tabla())
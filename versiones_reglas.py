@@ -0,0 +1,250 @@
+"""
+Versiones de Reglas SOFSE - Huellas por regla y re-validación incremental
+
+Cada regla del validador tiene una huella (hash corto de su definición) y
+las reglas se agrupan según qué parte del resultado pueden cambiar:
+
+    nucleo         Código de los módulos del validador (MODULOS_NUCLEO) +
+                   disponibilidad del corrector. Cubre la lógica en código
+                   (extractores, clasificación, scores). Se hashea el AST sin
+                   docstrings ni las tablas de reglas, que tienen huella propia:
+                   comentarios, formato y cambios de patrones no lo mueven.
+    estados        Cada estado de MAP_ESTADOS_CODIGO (código, nombre, patrones).
+    contingencias  Cada forma de la matriz Excel y cada sinónimo, con su código.
+    config         configs/config_<linea>.json (palabras técnicas, estaciones).
+
+Cada registro del log de auditoría guarda la versión de cada grupo con la que
+se calculó ('versiones_reglas') y de qué partes de cada grupo dependió
+('huella_reglas'): la regla que ganó en cada motor de primera coincidencia y,
+para 'estados', el estado que MAP_ESTADOS_CODIGO asigna a la Y del código de
+estructura (validar_codigo_estructura lo busca por código, gane la regla que
+gane). Si un grupo cambió pero esas partes siguen iguales para el mensaje, el
+resultado no puede cambiar: alcanza con re-correr el motor (unas pocas regex)
+en lugar del pipeline completo.
+
+Un mensaje se valida de nuevo solo si cambió el núcleo, el config de su línea,
+o alguna de las partes de las que dependió en un grupo modificado.
+"""
+
+import ast
+import importlib
+import json
+import re
+
+import validador_mensajes as vm
+from cache_resultados import clave_contenido
+
+# nivel_general del reporte -> resultado_sistema del log de auditoría
+RESULTADO_POR_NIVEL = {
+    'IMPORTANTE': 'INCORRECTO',
+    'OBSERVACIONES': 'OBSERVACION',
+    'SUGERENCIAS': 'OBSERVACION',
+    'COMPLETO': 'CORRECTO'
+}
+
+
+def huella(*partes):
+    """Hash corto (12 hex) de las partes"""
+    return clave_contenido(*partes)[:12]
+
+
+def _id_regla(clave):
+    return '|'.join(clave) if clave else ''
+
+
+def huellas_motor(motor):
+    """{regla: huella} de un MotorReglas, en orden de prioridad"""
+    if motor is None:
+        return {}
+    huellas = {}
+    for clave, regex in motor.reglas:
+        regla = _id_regla(clave)
+        # Una clave con varios patrones (ej: un estado) es una sola regla
+        huellas[regla] = huella(huellas.get(regla), regex.pattern)
+    return huellas
+
+
+# Módulos cuyo código decide el resultado de procesar_mensaje
+MODULOS_NUCLEO = ('validador_mensajes', 'tokenizador', 'estaciones', 'motor_reglas', 'reportes')
+
+# Tablas del validador cubiertas por los grupos 'estados' y 'contingencias'
+TABLAS_CON_HUELLA = ('MAP_ESTADOS_CODIGO', 'SINONIMOS_CONTINGENCIAS', 'CODIGOS_CONTINGENCIA_FALLBACK')
+
+
+def _es_tabla(nodo):
+    return isinstance(nodo, ast.Assign) and any(
+        isinstance(destino, ast.Name) and destino.id in TABLAS_CON_HUELLA for destino in nodo.targets)
+
+
+def _es_docstring(nodo):
+    return isinstance(nodo, ast.Expr) and isinstance(nodo.value, ast.Constant) and isinstance(nodo.value.value, str)
+
+
+def huella_codigo(modulos=MODULOS_NUCLEO):
+    """Huella del código de los módulos (AST sin docstrings ni tablas de reglas)"""
+    partes = []
+    for nombre in modulos:
+        with open(importlib.import_module(nombre).__file__, encoding='utf-8') as f:
+            arbol = ast.parse(f.read())
+        arbol.body = [nodo for nodo in arbol.body if not _es_tabla(nodo)]
+        for nodo in ast.walk(arbol):
+            cuerpo = getattr(nodo, 'body', None)
+            if isinstance(cuerpo, list) and len(cuerpo) > 1 and _es_docstring(cuerpo[0]):
+                nodo.body = cuerpo[1:]
+        partes.append(f"{nombre}:{ast.dump(arbol)}")
+    return huella(*partes)
+
+
+# Claves de 'huella_reglas' que dependen de cada grupo de reglas
+DEPENDENCIAS = {
+    'estados': ('estados', 'estado_codigo'),
+    'contingencias': ('contingencias',)
+}
+
+
+def _version_grupo(huellas):
+    return huella(*(f"{regla}={valor}" for regla, valor in huellas.items()))
+
+
+def motores_vigentes(archivo_excel=None):
+    """
+    {grupo: MotorReglas} que usa procesar_mensaje (None si no hay matriz de contingencias).
+    archivo_excel: matriz a cargar (default: la de procesar_mensaje)
+    """
+    indice = vm.indexar_contingencias(vm.obtener_contingencias(archivo_excel))
+    return {'estados': vm.MOTOR_ESTADOS, 'contingencias': indice.motor if indice else None}
+
+
+def catalogo_reglas():
+    """{grupo: {regla: huella}} de los motores vigentes"""
+    return {grupo: huellas_motor(motor) for grupo, motor in motores_vigentes().items()}
+
+
+def version_config(linea):
+    config, _ = vm.obtener_config(linea)
+    return huella(json.dumps(config, sort_keys=True, ensure_ascii=False))
+
+
+class VersionesVigentes:
+    """
+    Versiones de las reglas cargadas en este proceso (se calculan una vez).
+    archivo_excel: matriz de contingencias (default: la de procesar_mensaje)
+    """
+
+    def __init__(self, archivo_excel=None):
+        self.archivo_excel = archivo_excel or vm.ARCHIVO_CONTINGENCIAS
+        self.motores = motores_vigentes(archivo_excel)
+        self.catalogo = {grupo: huellas_motor(motor) for grupo, motor in self.motores.items()}
+        self.base = {
+            'nucleo': huella(huella_codigo(), vm.CORRECTOR_DISPONIBLE),
+            **{grupo: _version_grupo(huellas) for grupo, huellas in self.catalogo.items()}
+        }
+        self._configs = {}
+
+    def de_linea(self, linea):
+        """Versiones que aplican a un mensaje de la línea"""
+        nombre = vm._normalizar_linea(linea)
+        versiones = self._configs.get(nombre)
+        if versiones is None:
+            versiones = self._configs[nombre] = {**self.base, 'config': version_config(linea)}
+        return versiones
+
+    def coincidencias(self, texto):
+        """
+        {grupo: regla ganadora} para el texto ('' si ninguna coincide), más
+        'estado_codigo': "Y|nombre" del estado que indica el código de estructura.
+        """
+        contenido = re.sub(r'\s+', ' ', texto or '').strip()
+        contenido_upper = contenido.upper()
+        coincidencias = {
+            grupo: _id_regla(motor.buscar(contenido_upper)[0]) if motor else ''
+            for grupo, motor in self.motores.items()
+        }
+        codigo = vm.detectar_codigo_estructura(contenido)
+        estado = vm.MAP_ESTADOS_CODIGO.get(codigo['Y'], {}).get('nombre', '') if codigo else ''
+        coincidencias['estado_codigo'] = f"{codigo['Y']}|{estado}" if codigo else ''
+        return coincidencias
+
+
+def campos_registro(reporte, versiones, coincidencias):
+    """Campos del log de auditoría que salen de un reporte del validador"""
+    clasificacion = reporte['clasificacion']
+    detalle = clasificacion['IMPORTANTE'] + clasificacion['OBSERVACIONES'] + clasificacion['SUGERENCIAS']
+    return {
+        'resultado_sistema': RESULTADO_POR_NIVEL[reporte['nivel_general']],
+        'detalle_sistema': ' | '.join(detalle),
+        'regla_sistema': vm.VERSION_REGLAS,
+        'versiones_reglas': versiones,
+        'huella_reglas': coincidencias
+    }
+
+
+def mensaje_de_registro(registro):
+    """Mensaje en el formato del validador a partir de un registro del log"""
+    return {
+        'numero_mensaje': registro.get('id'),
+        'operador': registro.get('operador'),
+        'fecha_hora': registro.get('timestamp'),
+        'linea': registro.get('linea'),
+        'contenido': registro.get('texto') or ''
+    }
+
+
+def planificar(registro, vigentes):
+    """
+    Qué hacer con un registro ante las reglas vigentes.
+    Retorna (accion, versiones, coincidencias), accion en:
+      AL_DIA      ya calculado con estas versiones
+      SELLAR      cambiaron reglas que no lo afectan: solo se actualizan las versiones
+      REVALIDAR   el resultado puede cambiar: se corre el validador completo
+    """
+    versiones = vigentes.de_linea(registro.get('linea'))
+    previas = registro.get('versiones_reglas')
+    if previas == versiones:
+        return 'AL_DIA', versiones, registro.get('huella_reglas')
+    coincidencias = vigentes.coincidencias(registro.get('texto'))
+    if not previas or previas.get('nucleo') != versiones['nucleo'] or previas.get('config') != versiones['config']:
+        return 'REVALIDAR', versiones, coincidencias
+    anteriores = registro.get('huella_reglas') or {}
+    for grupo, claves in DEPENDENCIAS.items():
+        if previas.get(grupo) != versiones[grupo] and any(
+                anteriores.get(clave) != coincidencias[clave] for clave in claves):
+            return 'REVALIDAR', versiones, coincidencias
+    return 'SELLAR', versiones, coincidencias
+
+
+def revalidar(db, simular=False, vigentes=None):
+    """
+    Re-validación incremental del log de auditoría.
+    db: store de utils/db_store.get_db (read / update_record)
+    simular: solo contar, sin escribir
+    Retorna contadores por acción y cuántos registros cambiaron de resultado.
+    Sin matriz de contingencias no se toca nada: todos los mensajes saldrían
+    "Falta motivo de la contingencia" y quedarían sellados como al día.
+    """
+    vigentes = vigentes or VersionesVigentes()
+    if vigentes.motores['contingencias'] is None:
+        raise FileNotFoundError(
+            f"No se pudo cargar la matriz de contingencias ({vigentes.archivo_excel}): "
+            "re-validación cancelada"
+        )
+    resumen = {'AL_DIA': 0, 'SELLAR': 0, 'REVALIDAR': 0, 'cambiaron': 0, 'errores': 0}
+    for registro in db.read():
+        accion, versiones, coincidencias = planificar(registro, vigentes)
+        resumen[accion] += 1
+        if accion == 'AL_DIA':
+            continue
+        if accion == 'SELLAR':
+            campos = {'versiones_reglas': versiones, 'huella_reglas': coincidencias}
+        else:
+            reporte = vm.procesar_mensaje(mensaje_de_registro(registro))
+            campos = campos_registro(reporte, versiones, coincidencias)
+            if (campos['resultado_sistema'], campos['detalle_sistema']) != (
+                    registro.get('resultado_sistema'), registro.get('detalle_sistema')):
+                resumen['cambiaron'] += 1
+        if simular:
+            continue
+        if not db.update_record(registro.get('id'), lambda item, campos=campos: item.update(campos),
+                                accion='REVALIDACION'):
+            resumen['errores'] += 1
+    return resumen